@@ -1,28 +1,28 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
+import os
 from datetime import datetime
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import openai
-from groq import Groq
-import requests
-import json
-import PyPDF2
-import io
-from PIL import Image
-import pytesseract
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as RLImage, PageBreak, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_LEFT
-import base64
-import wikipedia
+
+from diagnostic_urbain.caching import get_llm_cache
+from diagnostic_urbain.charts import create_report_charts
+from diagnostic_urbain.chat import (
+    CHAT_GREETING, CHAT_OFF_TOPIC, SUGGESTED_PROMPTS, SUGGESTED_QUESTIONS, classify_question,
+    get_chat_answer_cache, new_chat_memory, stream_chat_answer
+)
+from diagnostic_urbain.config import CACHE_DIR, LLM_POOL_DEFAULTS, LLM_ROUTER_DEFAULTS
+from diagnostic_urbain.documents import extract_documents, get_document_index
+from diagnostic_urbain.llm import FailedGeneration, build_ai_clients
+from diagnostic_urbain.pdf import generate_professional_pdf_report
+from diagnostic_urbain.projections import current_density
+from diagnostic_urbain.prompts import DEFAULT_FORM, SECTION_TITLES, fingerprint, plan_incremental_regeneration
+from diagnostic_urbain.report import REPORT_JOB_ACTIVE, REPORT_SECTION_FINISHED, ReportJobQueue, build_report_data
+from diagnostic_urbain.web import format_web_info_for_prompt, get_web_urban_data
+
+# Le moteur (LLM, documents, prompts, rapport, chatbot) vit dans le paquet diagnostic_urbain,
+# importable sans Streamlit ; ce fichier ne contient que l'interface. Les modules lourds
+# restent importés à la première utilisation. Voir import_time.py pour la mesure.
+
+# Rafraîchissement de la progression d'un rapport généré en arrière-plan
+REPORT_JOB_POLL_INTERVAL = 1  # secondes entre deux rafraîchissements de la progression
 
 # Configuration de la page
 st.set_page_config(
@@ -122,8 +122,6 @@ st.markdown("""
     .toc-item {
         padding: 0.3rem 0;
         border-bottom: 1px dotted #ccc;
-        display: flex;
-        justify-content: space-between;
     }
     
     .professional-text {
@@ -175,463 +173,86 @@ def create_header():
     </div>
     """, unsafe_allow_html=True)
 
+def get_llm_settings():
+    """Paramètres des connexions et du routage LLM, surchargeables dans st.secrets"""
+    defaults = {**LLM_POOL_DEFAULTS, **LLM_ROUTER_DEFAULTS}
+    return {name: st.secrets.get(name, default) for name, default in defaults.items()}
 
-def initialize_ai_clients():
-    """Initialise les clients IA"""
-    clients = {}
-    
-    # OpenAI
-    if st.secrets.get("OPENAI_API_KEY"):
-        openai.api_key = st.secrets["OPENAI_API_KEY"]
-        clients['openai'] = True
-    
-    # Groq
-    if st.secrets.get("GROQ_API_KEY"):
-        clients['groq'] = Groq(api_key=st.secrets["GROQ_API_KEY"])
-    
-    return clients
-
-def search_web_info(query, max_results=3):
-    """Recherche d'informations sur le web avec gestion d'erreurs"""
-    try:
-        # Simulation d'une recherche web (remplacez par une vraie API)
-        search_results = [
-            {
-                "title": f"Résultat pour: {query}",
-                "url": "https://example.com",
-                "snippet": "Information trouvée sur le web..."
-            }
-        ]
-        return search_results
-    except Exception as e:
-        return []
-
-def get_wikipedia_info(city_name, country_name, lang="fr"):
-    """Récupère des informations sur la ville depuis Wikipedia"""
-    try:
-        wikipedia.set_lang(lang)
-        
-        # Essayer différentes variantes du nom de la ville
-        search_terms = [
-            f"{city_name}",
-            f"{city_name} {country_name}",
-            f"{city_name}, {country_name}"
-        ]
-        
-        for term in search_terms:
-            try:
-                # Rechercher la page
-                page_title = wikipedia.search(term, results=1)
-                if page_title:
-                    page = wikipedia.page(page_title[0])
-                    summary = wikipedia.summary(term, sentences=5)
-                    
-                    return {
-                        'title': page.title,
-                        'summary': summary,
-                        'url': page.url,
-                        'found': True
-                    }
-            except wikipedia.exceptions.DisambiguationError as e:
-                # Prendre la première option en cas d'ambiguïté
-                try:
-                    page = wikipedia.page(e.options[0])
-                    summary = wikipedia.summary(e.options[0], sentences=5)
-                    return {
-                        'title': page.title,
-                        'summary': summary,
-                        'url': page.url,
-                        'found': True
-                    }
-                except:
-                    continue
-            except:
-                continue
-        
-        # Si aucune information trouvée en français, essayer en anglais
-        if lang == "fr":
-            return get_wikipedia_info(city_name, country_name, lang="en")
-        
-        return {
-            'title': f"{city_name}",
-            'summary': f"Aucune information Wikipedia trouvée pour {city_name}, {country_name}.",
-            'url': None,
-            'found': False
-        }
-        
-    except Exception as e:
-        return {
-            'title': f"{city_name}",
-            'summary': f"Erreur lors de la recherche d'informations sur {city_name}: {str(e)}",
-            'url': None,
-            'found': False
-        }
+@st.cache_resource
+def cached_ai_clients(openai_api_key, groq_api_key, pool_settings):
+    """Clients IA construits une seule fois par processus et partagés par toutes les sessions"""
+    return build_ai_clients(openai_api_key, groq_api_key, pool_settings)
 
-def get_web_urban_data(city_name, country_name):
-    """Collecte des données urbaines depuis différentes sources web"""
-    web_data = {
-        'wikipedia_info': get_wikipedia_info(city_name, country_name),
-        'additional_context': f"Recherche web effectuée pour {city_name}, {country_name}"
-    }
-    
-    # Ici, tu peux ajouter d'autres sources de données web
-    # Par exemple : World Bank API, UN Data, etc.
-    
-    return web_data
+def initialize_ai_clients():
+    """Initialise les clients IA (réutilisés d'un rerun et d'une session à l'autre)"""
+    return cached_ai_clients(st.secrets.get("OPENAI_API_KEY"), st.secrets.get("GROQ_API_KEY"), get_llm_settings())
 
-def format_web_info_for_prompt(web_data):
-    """Formate les informations web pour inclusion dans le prompt"""
-    if not web_data:
+def report_extraction_result(result):
+    """Affiche les avertissements d'extraction et renvoie le texte extrait"""
+    if result['error']:
+        st.error(f"Erreur lors de l'extraction du texte: {result['error']}")
         return ""
     
-    formatted_info = "\n\n=== INFORMATIONS WEB COLLECTÉES ===\n"
+    if result['ocr_pages']:
+        st.info(f"🔎 {result['ocr_pages']} page(s) scannée(s) reconnue(s) par OCR")
     
-    # Informations Wikipedia
-    wiki_info = web_data.get('wikipedia_info', {})
-    if wiki_info.get('found', False):
-        formatted_info += f"\n--- Wikipedia: {wiki_info.get('title', 'N/A')} ---\n"
-        formatted_info += wiki_info.get('summary', 'Aucun résumé disponible')
-        if wiki_info.get('url'):
-            formatted_info += f"\nSource: {wiki_info.get('url')}"
-    else:
-        formatted_info += f"\n--- Wikipedia ---\n{wiki_info.get('summary', 'Aucune information trouvée')}"
-    
-    formatted_info += "\n\n=== FIN DES INFORMATIONS WEB ===\n"
-    
-    return formatted_info
-
-def extract_text_from_pdf(pdf_file):
-    """Extrait le texte d'un fichier PDF avec OCR si nécessaire"""
-    try:
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        text = ""
-        for page in pdf_reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
-        
-        if len(text.strip()) < 100:
+    if len(result['text']) < 100:
+        if result['ocr_error']:
+            st.warning(f"Peu de texte détecté dans ce PDF et l'OCR a échoué: {result['ocr_error']}")
+        else:
             st.warning("Peu de texte détecté dans ce PDF. Le document pourrait être scanné ou contenir principalement des images.")
-        
-        return text.strip()
-    except Exception as e:
-        st.error(f"Erreur lors de l'extraction du texte: {str(e)}")
-        return ""
+    
+    return result['text']
 
 def process_uploaded_documents(uploaded_files):
-    """Traite tous les documents uploadés et extrait leur contenu"""
+    """Traite tous les documents uploadés et extrait leur contenu (moteur : extract_documents)"""
     documents_content = []
     
-    if uploaded_files:
-        for uploaded_file in uploaded_files:
-            st.info(f"Traitement du document: {uploaded_file.name}")
-            
-            if uploaded_file.type == "application/pdf":
-                # Réinitialiser le pointeur du fichier
-                uploaded_file.seek(0)
-                text_content = extract_text_from_pdf(uploaded_file)
-                
-                if text_content:
-                    documents_content.append({
-                        'filename': uploaded_file.name,
-                        'content': text_content[:5000]  # Limiter à 5000 caractères par document
-                    })
-                    st.success(f"✅ Document {uploaded_file.name} traité avec succès")
-                else:
-                    st.warning(f"⚠️ Aucun texte extrait de {uploaded_file.name}")
+    pdf_files = [uploaded_file for uploaded_file in uploaded_files or [] if uploaded_file.type == "application/pdf"]
+    if not pdf_files:
+        return documents_content
     
-    return documents_content
-
-def generate_enhanced_content_with_docs_and_web(prompt, clients, documents_content=None, web_data=None, max_tokens=800, include_Web_Search=False):
-    """Génère du contenu enrichi en incluant les documents uploadés ET les données web"""
-    try:
-        # Construire le prompt avec les documents et les données web
-        enhanced_prompt = prompt
-        
-        # Ajouter les informations web
-        if web_data:
-            web_info = format_web_info_for_prompt(web_data)
-            enhanced_prompt = prompt + web_info
-        
-        # Recherche web si nécessaire
-        if include_Web_Search:
-            search_query = prompt.split(":")[-1].strip() if ":" in prompt else prompt
-            web_results = search_web_info(search_query)
-            
-            if web_results:
-                web_context = "\n".join([f"- {result['snippet']} (Source: {result['url']})" for result in web_results])
-                enhanced_prompt += f"\n\nInformations web récentes:\n{web_context}"
-        
-        # Ajouter les documents si disponibles
-        if documents_content and len(documents_content) > 0:
-            docs_text = "\n\nDOCUMENTS TECHNIQUES FOURNIS :\n"
-            for i, doc in enumerate(documents_content, 1):
-                docs_text += f"\n--- Document {i}: {doc['filename']} ---\n"
-                docs_text += doc['content'][:2000]  # Limiter chaque document à 2000 caractères
-                docs_text += "\n"
-            
-            enhanced_prompt += docs_text + "\n\nVeuillez intégrer les informations de ces documents techniques ET les données web dans votre analyse."
-        elif web_data:
-            enhanced_prompt += "\n\nVeuillez intégrer les informations web collectées dans votre analyse."
-        
-        if 'groq' in clients:
-            response = clients['groq'].chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "Vous êtes un expert en urbanisme et développement urbain en Afrique. Analysez les documents fournis et les informations web collectées, puis intégrez-les dans vos réponses. Rédigez du contenu professionnel, détaillé et précis sans emojis. Citez vos sources quand vous utilisez des informations externes. Si vous ne connaissez pas une information précise, dites 'Je ne connais pas cette information spécifique'. Gardez vos réponses courtes et précises (max 150 mots pour le chatbot)."
-                    },
-                    {
-                        "role": "user",
-                        "content": enhanced_prompt
-                    }
-                ],
-                model="llama-3.1-8b-instant",
-                max_tokens=max_tokens,
-                temperature=0.7
-            )
-            content = response.choices[0].message.content
-            
-            # Ajouter la source si recherche web
-            if include_Web_Search and web_results:
-                content += f"\n\n📍 *Sources web consultées: {', '.join([r['url'] for r in web_results])}"
-            
-            return content
-        
-        elif 'openai' in clients:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "Vous êtes un expert en urbanisme et développement urbain en Afrique. Analysez les documents fournis et les informations web collectées, puis intégrez-les dans vos réponses. Rédigez du contenu professionnel, détaillé et précis sans emojis. Citez vos sources quand vous utilisez des informations externes. Si vous ne connaissez pas une information précise, dites 'Je ne connais pas cette information spécifique'. Gardez vos réponses courtes et précises (max 150 mots pour le chatbot)."},
-                    {"role": "user", "content": enhanced_prompt}
-                ],
-                max_tokens=max_tokens,
-                temperature=0.7
-            )
-            content = response.choices[0].message.content
-            
-            if include_Web_Search and web_results:
-                content += f"\n\n📍 *Sources web consultées: {', '.join([r['url'] for r in web_results])}"
-            
-            return content
-        
-        else:
-            return "Contenu générique - Aucun client IA disponible"
-            
-    except Exception as e:
-        st.error(f"Erreur lors de la génération de contenu: {str(e)}")
-        return f"Erreur de génération pour: {prompt[:50]}..."
-
-def generate_enhanced_content_with_docs(prompt, clients, documents_content=None, max_tokens=800):
-    """Génère du contenu enrichi avec gestion des limites (fonction de compatibilité)"""
-    return generate_enhanced_content_with_docs_and_web(prompt, clients, documents_content, None, max_tokens)
-
-def generate_enhanced_content(prompt, clients, max_tokens=800):
-    """Génère du contenu enrichi avec gestion des limites (fonction de compatibilité)"""
-    return generate_enhanced_content_with_docs_and_web(prompt, clients, None, None, max_tokens)
-
-def create_demographic_chart(city_data):
-    """Crée un graphique démographique"""
-    fig = make_subplots(
-        rows=2, cols=2,
-        subplot_titles=('Répartition par âge', 'Croissance démographique', 
-                       'Densité urbaine', 'Migration urbaine'),
-        specs=[[{"type": "pie"}, {"type": "bar"}],
-               [{"type": "scatter"}, {"type": "bar"}]]
+    entries = extract_documents(
+        [(uploaded_file.name, uploaded_file.getvalue()) for uploaded_file in pdf_files],
+        on_extract=lambda names: st.info(f"Traitement de {len(names)} document(s): {', '.join(names)}")
     )
     
-    # Graphique en secteurs pour les groupes d'âge
-    age_groups = ['0-14 ans', '15-64 ans', '65+ ans']
-    age_values = [42.5, 54.3, 3.2]
-    
-    fig.add_trace(
-        go.Pie(labels=age_groups, values=age_values, name="Âge"),
-        row=1, col=1
-    )
-    
-    # Graphique de croissance
-    years = ['2018', '2019', '2020', '2021', '2022']
-    population = [1050000, 1087500, 1126250, 1165656, 1206428]
-    
-    fig.add_trace(
-        go.Bar(x=years, y=population, name="Population"),
-        row=1, col=2
-    )
-    
-    # Densité urbaine
-    districts = ['Centre', 'Nord', 'Sud', 'Est', 'Ouest']
-    density = [8500, 6200, 4800, 5500, 7200]
-    
-    fig.add_trace(
-        go.Scatter(x=districts, y=density, mode='markers+lines', name="Densité"),
-        row=2, col=1
-    )
-    
-    # Migration
-    migration_data = ['Arrivées', 'Départs', 'Solde migratoire']
-    migration_values = [45000, 28000, 17000]
-    
-    fig.add_trace(
-        go.Bar(x=migration_data, y=migration_values, name="Migration"),
-        row=2, col=2
-    )
+    for entry in entries:
+        filename, result = entry['filename'], entry['result']
+        text_content = report_extraction_result(result)
+        
+        if text_content:
+            documents_content.append({
+                'filename': filename,
+                'content': text_content,
+                'sha256': entry['sha256'],
+                'cache_status': entry['cache_status'],
+                'elapsed': entry['elapsed']
+            })
+            if entry['cache_status'] == "extrait":
+                st.success(f"✅ Document {filename} traité avec succès ({result['pages_read']}/{result['page_count']} pages lues)")
+        else:
+            st.warning(f"⚠️ Aucun texte extrait de {filename}")
     
-    fig.update_layout(height=600, showlegend=False, title_text="Analyse Démographique Complète")
-    return fig
+    return documents_content
 
-def create_infrastructure_chart():
-    """Crée un graphique d'infrastructure"""
-    categories = ['Eau potable', 'Électricité', 'Assainissement', 'Routes', 'Télécommunications']
-    current_access = [45, 42, 25, 60, 78]
-    target_access = [80, 75, 60, 85, 90]
-    
-    fig = go.Figure()
-    
-    fig.add_trace(go.Bar(
-        name='Accès actuel (%)',
-        x=categories,
-        y=current_access,
-        marker_color='lightcoral'
-    ))
-    
-    fig.add_trace(go.Bar(
-        name='Objectif 2030 (%)',
-        x=categories,
-        y=target_access,
-        marker_color='lightblue'
-    ))
-    
-    fig.update_layout(
-        title='État des Infrastructures de Base',
-        xaxis_title='Services',
-        yaxis_title='Taux d\'accès (%)',
-        barmode='group',
-        height=400
-    )
-    
-    return fig
+@st.cache_resource
+def get_report_job_queue(_clients):
+    """Instance unique de la file des rapports pour le processus
+    
+    `_clients` ne sert qu'à la création (reprise des rapports interrompus) : l'appelant
+    remplace ensuite job_queue.clients pour suivre un changement de clés API.
+    """
+    return ReportJobQueue(os.path.join(CACHE_DIR, "report_jobs.sqlite"), _clients)
 
-def create_housing_analysis_chart():
-    """Crée un graphique d'analyse du logement"""
-    fig = make_subplots(
-        rows=1, cols=2,
-        subplot_titles=('Types de logement', 'Qualité du logement'),
-        specs=[[{"type": "pie"}, {"type": "bar"}]]
-    )
-    
-    # Types de logement
-    housing_types = ['Béton/Dur', 'Semi-dur', 'Traditionnel', 'Précaire']
-    housing_values = [35, 25, 25, 15]
-    
-    fig.add_trace(
-        go.Pie(labels=housing_types, values=housing_values, name="Types"),
-        row=1, col=1
-    )
-    
-    # Qualité du logement
-    quality_aspects = ['Eau courante', 'Électricité', 'Toilettes', 'Cuisine équipée']
-    quality_percentages = [45, 42, 12, 28]
-    
-    fig.add_trace(
-        go.Bar(x=quality_aspects, y=quality_percentages, name="Qualité"),
-        row=1, col=2
-    )
-    
-    fig.update_layout(height=400, showlegend=False)
-    return fig
+def ask_suggested_question(question):
+    """Programme une question suggérée, traitée au prochain rendu de la conversation"""
+    st.session_state.pending_question = question
 
-def generate_professional_pdf_report(city_name, report_data, charts_data):
-    """Génère un rapport PDF professionnel"""
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
-    
-    # Styles
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        textColor=colors.HexColor('#1f4e79')
-    )
-    
-    section_style = ParagraphStyle(
-        'SectionHeader',
-        parent=styles['Heading2'],
-        fontSize=16,
-        spaceAfter=12,
-        spaceBefore=20,
-        textColor=colors.HexColor('#2c5aa0')
-    )
-    
-    body_style = ParagraphStyle(
-        'BodyText',
-        parent=styles['Normal'],
-        fontSize=11,
-        spaceAfter=12,
-        alignment=TA_JUSTIFY,
-        leading=14
-    )
-    
-    story = []
-    
-    # Page de titre
-    story.append(Paragraph(f"DIAGNOSTIC URBAIN INTELLIGENT", title_style))
-    story.append(Paragraph(f"Ville de {city_name}", title_style))
-    story.append(Spacer(1, 50))
-    story.append(Paragraph(f"Rapport généré le {datetime.now().strftime('%d/%m/%Y à %H:%M')}", body_style))
-    story.append(Paragraph("UrbanAI Diagnostic Platform", body_style))
-    story.append(PageBreak())
-    
-    # Table des matières
-    story.append(Paragraph("TABLE DES MATIÈRES", section_style))
-    toc_data = [
-        ["Section", "Page"],
-        ["1. Résumé exécutif", "3"],
-        ["2. Contexte démographique et social", "5"],
-        ["3. Analyse de l'habitat et des infrastructures", "8"],
-        ["4. Défis et opportunités identifiés", "11"],
-        ["5. Recommandations stratégiques", "14"],
-        ["6. Graphiques et visualisations", "17"],
-        ["7. Conclusion prospective", "19"],
-        ["Annexes et références", "21"]
-    ]
-    
-    toc_table = Table(toc_data, colWidths=[4*inch, 1*inch])
-    toc_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    story.append(toc_table)
-    story.append(PageBreak())
-    
-    # Contenu des sections
-    sections = [
-        ("1. RÉSUMÉ EXÉCUTIF", report_data.get('executive_summary', '')),
-        ("2. CONTEXTE DÉMOGRAPHIQUE ET SOCIAL", report_data.get('demographic_context', '')),
-        ("3. ANALYSE DE L'HABITAT ET DES INFRASTRUCTURES", report_data.get('housing_analysis', '')),
-        ("4. DÉFIS ET OPPORTUNITÉS IDENTIFIÉS", report_data.get('challenges', '')),
-        ("5. RECOMMANDATIONS STRATÉGIQUES", report_data.get('recommendations', '')),
-        ("6. GRAPHIQUES ET VISUALISATIONS", "Les graphiques détaillés sont présentés dans l'interface web interactive."),
-        ("7. CONCLUSION PROSPECTIVE", report_data.get('conclusion', ''))
-    ]
-    
-    for section_title, content in sections:
-        story.append(Paragraph(section_title, section_style))
-        story.append(Paragraph(content, body_style))
-        story.append(Spacer(1, 20))
-    
-    doc.build(story)
-    buffer.seek(0)
-    return buffer
+def reset_chat():
+    """Efface la conversation et sa mémoire"""
+    st.session_state.messages = [{"role": "assistant", "content": CHAT_GREETING}]
+    st.session_state.chat_memory = new_chat_memory()
 
 def chatbot_tab():
     """Onglet Chatbot pour assistance IA"""
@@ -654,20 +275,23 @@ def chatbot_tab():
     
     # Historique des conversations
     if "messages" not in st.session_state:
-        st.session_state.messages = [
-            {
-                "role": "assistant", 
-                "content": "Bonjour ! Je suis votre assistant IA spécialisé en développement urbain. Comment puis-je vous aider aujourd'hui ?"
-            }
-        ]
+        reset_chat()
+    if "chat_memory" not in st.session_state:
+        st.session_state.chat_memory = new_chat_memory()
     
+    chat_conversation(clients)
+
+@st.fragment
+def chat_conversation(clients):
+    """Conversation du chatbot ; un nouveau message ne réexécute que ce fragment"""
     # Affichage des messages
     for message in st.session_state.messages:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
     
-    # Zone de saisie
-    if prompt := st.chat_input("Tapez votre question ici..."):
+    # Zone de saisie (ou question suggérée choisie au rendu précédent)
+    prompt = st.chat_input("Tapez votre question ici...") or st.session_state.pop("pending_question", None)
+    if prompt:
         # Ajout du message utilisateur
         st.session_state.messages.append({"role": "user", "content": prompt})
         with st.chat_message("user"):
@@ -675,120 +299,245 @@ def chatbot_tab():
         
         # Génération de la réponse
         with st.chat_message("assistant"):
-            with st.spinner("Réflexion en cours..."):
-                
-                # Contexte spécialisé pour l'urbanisme
-                system_prompt = """
-                Vous êtes un expert en développement urbain et planification urbaine, spécialisé dans les villes africaines.
-                Vous aidez les urbanistes, décideurs et chercheurs avec des analyses précises et des recommandations pratiques.
-                
-                RÈGLES IMPORTANTES:
-                - Répondez UNIQUEMENT aux questions liées à l'urbanisme et au développement urbain
-                - Si vous ne connaissez pas une information précise, dites "Je ne connais pas cette information spécifique"
-                - Si vous trouvez des informations sur le web, indiquez clairement la source
-                - Gardez vos réponses courtes et précises (max 150 mots)
-                - Concentrez-vous sur les villes africaines quand c'est pertinent
-                
-                Vos domaines d'expertise incluent :
-                - Planification urbaine et aménagement du territoire
-                - Infrastructures urbaines (eau, électricité, transport, assainissement)
-                - Habitat et logement social
-                - Économie urbaine et développement local
-                - Gouvernance urbaine et participation citoyenne
-                - Résilience climatique et développement durable
-                - Démographie urbaine et migration
-                - Services urbains de base
-                """
-                
-                # Vérifier si la question est liée à l'urbanisme
-                urban_keywords = ['ville', 'urbain', 'infrastructure', 'transport', 'logement', 'eau', 'électricité', 
-                                'gouvernance', 'planification', 'développement', 'population', 'habitat', 'assainissement',
-                                'smart city', 'municipalité', 'maire', 'conseil', 'citoyen', 'service public']
-                
-                is_urban_related = any(keyword in prompt.lower() for keyword in urban_keywords)
-                
-                if not is_urban_related:
-                    response = "Je suis spécialisé uniquement dans les questions de développement urbain et de planification urbaine. Pouvez-vous reformuler votre question en lien avec ces domaines ?"
-                else:
-                    # Recherche web si nécessaire
-                    needs_Web_Search = any(word in prompt.lower() for word in ['récent', 'dernier', 'nouveau', 'actuel', '2024', '2025'])
-                    
-                    full_prompt = f"""
-                    {system_prompt}
-                    
-                    Question de l'utilisateur : {prompt}
-                    
-                    Contexte : Nous travaillons sur un diagnostic urbain pour des villes africaines, notamment Nouakchott en Mauritanie.
-                    
-                    Répondez de manière concise et pratique. Si vous ne connaissez pas une information précise, dites-le clairement.
-                    """
-                    
-                    response = generate_enhanced_content_with_docs_and_web(full_prompt, clients, None, None, 200, include_Web_Search=needs_Web_Search)
-                
+            # Vérifier si la question est liée à l'urbanisme et si elle demande des données récentes
+            is_urban_related, needs_Web_Search = classify_question(prompt)
+            
+            if not is_urban_related:
+                response = CHAT_OFF_TOPIC
                 st.markdown(response)
+            else:
+                # Seules les questions indépendantes du fil de la conversation sont mises en cache :
+                # questions suggérées et première question, sans recherche web
+                answer_cache = get_chat_answer_cache()
+                is_first_question = sum(1 for message in st.session_state.messages if message["role"] == "user") == 1
+                cacheable = not needs_Web_Search and (prompt in SUGGESTED_PROMPTS or is_first_question)
+                cached = answer_cache.get(prompt) if cacheable else None
                 
-                # Ajout de la réponse à l'historique
-                st.session_state.messages.append({"role": "assistant", "content": response})
+                if cached is not None:
+                    response, cached_question, similarity = cached
+                    st.markdown(response)
+                    if similarity < 1.0:
+                        st.caption(f"⚡ Réponse reprise d'une question proche : « {cached_question} »")
+                else:
+                    # Affichage progressif des fragments au fur et à mesure de leur arrivée
+                    placeholder = st.empty()
+                    placeholder.markdown("*Réflexion en cours...*")
+                    response = ""
+                    failed = False
+                    for chunk in stream_chat_answer(st.session_state.messages, st.session_state.chat_memory, clients, include_Web_Search=needs_Web_Search):
+                        if isinstance(chunk, FailedGeneration):
+                            # Réponse interrompue : le texte partiel est remplacé par le message d'erreur
+                            response, failed = chunk, True
+                            break
+                        response += chunk
+                        placeholder.markdown(response + "▌")
+                    placeholder.markdown(response)
+                    if cacheable and not failed:
+                        answer_cache.set(prompt, response)
+            
+            # Ajout de la réponse à l'historique
+            st.session_state.messages.append({"role": "assistant", "content": response})
     
     # Suggestions de questions
     st.markdown("---")
     st.markdown("### 💡 Questions suggérées")
     
-    col1, col2 = st.columns(2)
+    columns = st.columns(2)
+    for index, (label, question) in enumerate(SUGGESTED_QUESTIONS):
+        with columns[index // 3]:
+            st.button(label, on_click=ask_suggested_question, args=(question,))
     
-    with col1:
-        if st.button("🏠 Comment améliorer l'accès au logement décent ?"):
-            st.session_state.messages.append({
-                "role": "user", 
-                "content": "Comment améliorer l'accès au logement décent ?"
-            })
-            st.rerun()
-        
-        if st.button("💧 Stratégies pour l'accès à l'eau potable"):
-            st.session_state.messages.append({
-                "role": "user", 
-                "content": "Quelles sont les meilleures stratégies pour améliorer l'accès à l'eau potable en milieu urbain africain ?"
-            })
-            st.rerun()
-        
-        if st.button("🚌 Développer le transport public"):
-            st.session_state.messages.append({
-                "role": "user", 
-                "content": "Comment développer un système de transport public efficace dans une ville en croissance rapide ?"
-            })
-            st.rerun()
+    # Bouton pour effacer l'historique
+    st.button("🗑️ Effacer la conversation", type="secondary", on_click=reset_chat)
+
+def render_report(job):
+    """Affiche le rapport d'un job : sections terminées, partielles ou en attente"""
+    form = job["form"]
+    
+    # Table des matières dynamique
+    st.markdown('<div class="section-header">📋 TABLE DES MATIÈRES</div>', unsafe_allow_html=True)
+    
+    # Pas de numéros de page : la mise en page du PDF ne les fixe pas à l'avance
+    toc_items = [
+        "1. Résumé exécutif",
+        "2. Contexte démographique et social",
+        "3. Analyse de l'habitat et des infrastructures",
+        "4. Défis et opportunités identifiés",
+        "5. Recommandations stratégiques",
+        "6. Graphiques et visualisations",
+        "7. Conclusion prospective"
+    ]
+    
+    for item in toc_items:
+        st.markdown(f'<div class="toc-item"><span>{item}</span></div>', unsafe_allow_html=True)
+    
+    st.markdown("---")
     
+    def render_section(key):
+        section = job["sections"].get(key, {"status": "en attente", "content": ""})
+        if section["status"] in REPORT_SECTION_FINISHED:
+            st.markdown(f'<div class="professional-text">{section["content"]}</div>', unsafe_allow_html=True)
+        elif section["content"]:
+            st.markdown(f'<div class="professional-text">{section["content"]}▌</div>', unsafe_allow_html=True)
+        else:
+            st.caption("⏳ Section en cours de génération...")
+    
+    charts_data = create_report_charts(form)
+    
+    # 1. RÉSUMÉ EXÉCUTIF
+    st.markdown('<div class="section-header">1. RÉSUMÉ EXÉCUTIF</div>', unsafe_allow_html=True)
+    render_section("executive_summary")
+    
+    # 2. CONTEXTE DÉMOGRAPHIQUE ET SOCIAL
+    st.markdown('<div class="section-header">2. CONTEXTE DÉMOGRAPHIQUE ET SOCIAL</div>', unsafe_allow_html=True)
+    
+    # 2.1 Profil démographique
+    st.markdown('<div class="subsection-header">2.1 Profil démographique</div>', unsafe_allow_html=True)
+    render_section("demographic_analysis")
+    
+    # Graphique démographique
+    st.plotly_chart(charts_data["demographic_chart"], use_container_width=True)
+    
+    # 2.2 Contexte socio-économique
+    st.markdown('<div class="subsection-header">2.2 Contexte socio-économique</div>', unsafe_allow_html=True)
+    render_section("socio_analysis")
+    
+    # Métriques socio-économiques
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Taux de chômage", f"{form['unemployment_rate']}%", "-2.1%")
     with col2:
-        if st.button("📊 Interpréter les indicateurs urbains"):
-            st.session_state.messages.append({
-                "role": "user", 
-                "content": "Comment interpréter et utiliser les indicateurs urbains pour la prise de décision ?"
-            })
-            st.rerun()
-        
-        if st.button("🌱 Résilience climatique urbaine"):
-            st.session_state.messages.append({
-                "role": "user", 
-                "content": "Quelles mesures prendre pour renforcer la résilience climatique d'une ville sahélienne ?"
-            })
-            st.rerun()
-        
-        if st.button("💼 Créer des emplois urbains"):
-            st.session_state.messages.append({
-                "role": "user", 
-                "content": "Quelles stratégies pour créer des emplois durables en milieu urbain africain ?"
-            })
-            st.rerun()
+        st.metric("PIB par habitant", f"{form['gdp_per_capita']} USD", "+4.2%")
+    with col3:
+        st.metric("Taux d'alphabétisation", f"{form['literacy_rate']}%", "+3.5%")
+    with col4:
+        st.metric("Économie informelle", f"{form['informal_economy']}%", "-1.8%")
     
-    # Bouton pour effacer l'historique
-    if st.button("🗑️ Effacer la conversation", type="secondary"):
-        st.session_state.messages = [
-            {
-                "role": "assistant", 
-                "content": "Bonjour ! Je suis votre assistant IA spécialisé en développement urbain. Comment puis-je vous aider aujourd'hui ?"
-            }
-        ]
+    # 3. ANALYSE DE L'HABITAT ET DES INFRASTRUCTURES
+    st.markdown('<div class="section-header">3. ANALYSE DE L\'HABITAT ET DES INFRASTRUCTURES</div>', unsafe_allow_html=True)
+    
+    # 3.1 État du parc de logements
+    st.markdown('<div class="subsection-header">3.1 État du parc de logements</div>', unsafe_allow_html=True)
+    render_section("housing_analysis")
+    
+    # Graphique logement
+    st.plotly_chart(charts_data["housing_chart"], use_container_width=True)
+    
+    # 3.2 Infrastructures de base
+    st.markdown('<div class="subsection-header">3.2 Infrastructures de base</div>', unsafe_allow_html=True)
+    render_section("infrastructure_analysis")
+    
+    # Graphique infrastructures
+    st.plotly_chart(charts_data["infra_chart"], use_container_width=True)
+    
+    # 4. DÉFIS ET OPPORTUNITÉS IDENTIFIÉS
+    st.markdown('<div class="section-header">4. DÉFIS ET OPPORTUNITÉS IDENTIFIÉS</div>', unsafe_allow_html=True)
+    
+    # 4.1 Défis majeurs
+    st.markdown('<div class="subsection-header">4.1 Défis majeurs</div>', unsafe_allow_html=True)
+    render_section("challenges_analysis")
+    
+    # 4.2 Opportunités de développement
+    st.markdown('<div class="subsection-header">4.2 Opportunités de développement</div>', unsafe_allow_html=True)
+    render_section("opportunities_analysis")
+    
+    # 5. RECOMMANDATIONS STRATÉGIQUES
+    st.markdown('<div class="section-header">5. RECOMMANDATIONS STRATÉGIQUES</div>', unsafe_allow_html=True)
+    
+    # 5.1 Priorités à court terme (1-3 ans)
+    st.markdown('<div class="subsection-header">5.1 Priorités à court terme (1-3 ans)</div>', unsafe_allow_html=True)
+    render_section("short_term_reco")
+    
+    # 5.2 Stratégies à moyen terme (3-7 ans)
+    st.markdown('<div class="subsection-header">5.2 Stratégies à moyen terme (3-7 ans)</div>', unsafe_allow_html=True)
+    render_section("medium_term_reco")
+    
+    # 5.3 Vision à long terme (7-15 ans)
+    st.markdown('<div class="subsection-header">5.3 Vision à long terme (7-15 ans)</div>', unsafe_allow_html=True)
+    render_section("long_term_reco")
+    
+    # 6. GRAPHIQUES ET VISUALISATIONS
+    st.markdown('<div class="section-header">6. GRAPHIQUES ET VISUALISATIONS</div>', unsafe_allow_html=True)
+    st.info("Les graphiques interactifs sont présentés ci-dessus dans chaque section thématique. Vous pouvez les exporter au format image ou PDF.")
+    
+    # 7. CONCLUSION PROSPECTIVE
+    st.markdown('<div class="section-header">7. CONCLUSION PROSPECTIVE</div>', unsafe_allow_html=True)
+    render_section("conclusion")
+    return charts_data
+
+@st.fragment(run_every=REPORT_JOB_POLL_INTERVAL)
+def report_job_progress(job_queue, job_id):
+    """Suit un rapport en arrière-plan ; seul ce fragment est réexécuté à chaque rafraîchissement"""
+    job = job_queue.get(job_id)
+    if job is None or job["status"] not in REPORT_JOB_ACTIVE:
+        # Rapport terminé : un rerun complet affiche la version finale et arrête le suivi
         st.rerun()
+    
+    done = sum(1 for section in job["sections"].values() if section["status"] in REPORT_SECTION_FINISHED)
+    total = len(job["sections"])
+    st.progress(done / total if total else 1.0, text=f"⏳ Génération en arrière-plan : {done}/{total} section(s) terminée(s)")
+    render_report(job)
+
+def render_finished_report(job):
+    """Affiche un rapport terminé, ses statistiques et le téléchargement PDF"""
+    import pandas as pd
+    
+    if job["status"] == "échec":
+        st.error(f"Erreur lors de la génération du rapport: {job['error']}")
+    charts_data = render_report(job)
+    if job["status"] == "échec":
+        return
+    
+    # Conserver le rapport pour la prochaine régénération incrémentale
+    sections = {key: section["content"] for key, section in job["sections"].items()}
+    st.session_state["last_report"] = {
+        "form": job["form"],
+        "documents_fp": job["documents_fp"],
+        "web_fp": job["web_fp"],
+        "sections": sections,
+        "failed_sections": [key for key, section in job["sections"].items() if section["status"] == "échec"]
+    }
+    
+    # Efficacité du cache LLM
+    cache_stats = get_llm_cache().stats()
+    lookups = cache_stats["hits"] + cache_stats["misses"]
+    hit_rate = 100 * cache_stats["hits"] / lookups if lookups else 0
+    st.caption(
+        f"💾 Cache LLM : {cache_stats['hits']} réponse(s) servie(s) depuis le cache, "
+        f"{cache_stats['misses']} appel(s) API ({hit_rate:.0f}% de succès) · "
+        f"{cache_stats['entries']} entrée(s) stockée(s)"
+    )
+    
+    # Consommation de tokens par section
+    usage_log = job["usage"]
+    if usage_log:
+        usage_df = pd.DataFrame(usage_log)
+        usage_df["section"] = usage_df["section"].map(lambda key: SECTION_TITLES.get(key, key))
+        billed = usage_df[usage_df["source"] != "cache"]
+        with st.expander(
+            f"📊 Consommation de tokens : {int(billed['tokens prompt'].sum()):,} en entrée, "
+            f"{int(billed['tokens réponse'].sum()):,} en sortie ({len(billed)} appel(s) facturé(s))"
+        ):
+            st.dataframe(usage_df, hide_index=True)
+            st.caption("Source « estimé » : comptage local lorsque l'API ne renvoie pas la consommation ; « cache » : aucun appel facturé.")
+    
+    # Génération du rapport PDF, une seule fois par rapport et par session
+    st.markdown("---")
+    st.subheader("📥 Télécharger le rapport PDF professionnel")
+    city_name = job["form"]["city_name"]
+    cached_pdf = st.session_state.get("report_pdf")
+    if cached_pdf and cached_pdf[0] == job["id"]:
+        pdf_data = cached_pdf[1]
+    else:
+        pdf_data = generate_professional_pdf_report(city_name, build_report_data(sections), charts_data).getvalue()
+        st.session_state["report_pdf"] = (job["id"], pdf_data)
+    st.download_button(
+        label="📄 Télécharger le rapport PDF",
+        data=pdf_data,
+        file_name=f"Diagnostic_{city_name.replace(' ', '_')}.pdf",
+        mime="application/pdf"
+    )
+    st.success("✅ Rapport généré avec succès !")
 
 def diagnostic_tab():
     """Onglet Diagnostic avec formulaire détaillé"""
@@ -804,9 +553,9 @@ def diagnostic_tab():
         # Informations générales
         st.markdown('<div class="form-section">', unsafe_allow_html=True)
         st.subheader("🌍 Informations Générales")
-        city_name = st.text_input("Nom de la ville", value="Nouakchott")
-        country = st.text_input("Pays", value="Mauritanie")
-        region = st.text_input("Région/Province", value="Nouakchott")
+        city_name = st.text_input("Nom de la ville", value=DEFAULT_FORM["city_name"])
+        country = st.text_input("Pays", value=DEFAULT_FORM["country"])
+        region = st.text_input("Région/Province", value=DEFAULT_FORM["region"])
         diagnostic_date = st.date_input("Date du diagnostic", value=datetime.now())
         
         # Option pour activer la recherche web
@@ -816,57 +565,58 @@ def diagnostic_tab():
         # Données démographiques
         st.markdown('<div class="form-section">', unsafe_allow_html=True)
         st.subheader("👥 Données Démographiques")
-        population = st.number_input("Population totale (habitants)", value=1200000, step=10000)
-        growth_rate = st.number_input("Taux de croissance annuel (%)", value=3.5, step=0.1)
-        urban_area = st.number_input("Superficie urbaine (km²)", value=1000, step=10)
-        density = st.number_input("Densité urbaine (hab/km²)", value=int(population/urban_area), step=100)
-        youth_percentage = st.slider("Pourcentage de jeunes (0-25 ans) (%)", 0, 100, 60)
+        population = st.number_input("Population totale (habitants)", value=DEFAULT_FORM["population"], step=10000)
+        growth_rate = st.number_input("Taux de croissance annuel (%)", value=DEFAULT_FORM["growth_rate"], step=0.1)
+        urban_area = st.number_input("Superficie urbaine (km²)", value=DEFAULT_FORM["urban_area"], step=10)
+        # Densité déduite de la population et de la superficie, comme dans les projections et les prompts
+        st.caption(f"Densité urbaine : {current_density({'population': population, 'urban_area': urban_area}):,} hab/km²")
+        youth_percentage = st.slider("Pourcentage de jeunes (0-25 ans) (%)", 0, 100, DEFAULT_FORM["youth_percentage"])
         st.markdown('</div>', unsafe_allow_html=True)
         
         # Infrastructures de base
         st.markdown('<div class="form-section">', unsafe_allow_html=True)
         st.subheader("🏗️ Infrastructures de Base")
-        water_access = st.slider("Accès à l'eau potable (%)", 0, 100, 45)
-        electricity_access = st.slider("Accès à l'électricité (%)", 0, 100, 42)
-        sanitation_access = st.slider("Accès à l'assainissement (%)", 0, 100, 25)
+        water_access = st.slider("Accès à l'eau potable (%)", 0, 100, DEFAULT_FORM["water_access"])
+        electricity_access = st.slider("Accès à l'électricité (%)", 0, 100, DEFAULT_FORM["electricity_access"])
+        sanitation_access = st.slider("Accès à l'assainissement (%)", 0, 100, DEFAULT_FORM["sanitation_access"])
         road_quality = st.selectbox("Qualité du réseau routier", ["Très mauvaise", "Mauvaise", "Moyenne", "Bonne", "Très bonne"])
-        internet_access = st.slider("Accès à Internet (%)", 0, 100, 35)
+        internet_access = st.slider("Accès à Internet (%)", 0, 100, DEFAULT_FORM["internet_access"])
         st.markdown('</div>', unsafe_allow_html=True)
         
         # Logement et habitat
         st.markdown('<div class="form-section">', unsafe_allow_html=True)
         st.subheader("🏠 Logement et Habitat")
-        housing_deficit = st.number_input("Déficit en logements", value=50000, step=1000)
-        informal_settlements = st.slider("Population en habitat informel (%)", 0, 100, 40)
-        housing_cost = st.number_input("Coût moyen du logement (USD/m²)", value=200, step=10)
+        housing_deficit = st.number_input("Déficit en logements", value=DEFAULT_FORM["housing_deficit"], step=1000)
+        informal_settlements = st.slider("Population en habitat informel (%)", 0, 100, DEFAULT_FORM["informal_settlements"])
+        housing_cost = st.number_input("Coût moyen du logement (USD/m²)", value=DEFAULT_FORM["housing_cost"], step=10)
         construction_materials = st.multiselect(
             "Matériaux de construction dominants",
             ["Béton", "Brique", "Terre", "Tôle", "Bois", "Autres"],
-            default=["Béton", "Tôle"]
+            default=DEFAULT_FORM["construction_materials"]
         )
         st.markdown('</div>', unsafe_allow_html=True)
         
         # Économie et emploi
         st.markdown('<div class="form-section">', unsafe_allow_html=True)
         st.subheader("💼 Économie et Emploi")
-        unemployment_rate = st.slider("Taux de chômage (%)", 0, 100, 25)
-        informal_economy = st.slider("Économie informelle (%)", 0, 100, 70)
+        unemployment_rate = st.slider("Taux de chômage (%)", 0, 100, DEFAULT_FORM["unemployment_rate"])
+        informal_economy = st.slider("Économie informelle (%)", 0, 100, DEFAULT_FORM["informal_economy"])
         main_sectors = st.multiselect(
             "Secteurs économiques principaux",
             ["Agriculture", "Pêche", "Commerce", "Services", "Industrie", "Tourisme", "Mines", "Autres"],
-            default=["Commerce", "Services", "Pêche"]
+            default=DEFAULT_FORM["main_sectors"]
         )
-        gdp_per_capita = st.number_input("PIB par habitant (USD)", value=1500, step=100)
+        gdp_per_capita = st.number_input("PIB par habitant (USD)", value=DEFAULT_FORM["gdp_per_capita"], step=100)
         st.markdown('</div>', unsafe_allow_html=True)
         
         # Services sociaux
         st.markdown('<div class="form-section">', unsafe_allow_html=True)
         st.subheader("🏥 Services Sociaux")
-        health_facilities = st.number_input("Nombre d'établissements de santé", value=15, step=1)
-        schools = st.number_input("Nombre d'écoles", value=120, step=5)
-        literacy_rate = st.slider("Taux d'alphabétisation (%)", 0, 100, 65)
-        infant_mortality = st.number_input("Mortalité infantile (pour 1000)", value=45, step=1)
-        life_expectancy = st.number_input("Espérance de vie (années)", value=65, step=1)
+        health_facilities = st.number_input("Nombre d'établissements de santé", value=DEFAULT_FORM["health_facilities"], step=1)
+        schools = st.number_input("Nombre d'écoles", value=DEFAULT_FORM["schools"], step=5)
+        literacy_rate = st.slider("Taux d'alphabétisation (%)", 0, 100, DEFAULT_FORM["literacy_rate"])
+        infant_mortality = st.number_input("Mortalité infantile (pour 1000)", value=DEFAULT_FORM["infant_mortality"], step=1)
+        life_expectancy = st.number_input("Espérance de vie (années)", value=DEFAULT_FORM["life_expectancy"], step=1)
         st.markdown('</div>', unsafe_allow_html=True)
         
         # Environnement et climat
@@ -875,10 +625,10 @@ def diagnostic_tab():
         climate_risks = st.multiselect(
             "Risques climatiques principaux",
             ["Inondations", "Sécheresse", "Érosion côtière", "Tempêtes de sable", "Canicules", "Autres"],
-            default=["Inondations", "Sécheresse"]
+            default=DEFAULT_FORM["climate_risks"]
         )
         waste_management = st.selectbox("Gestion des déchets", ["Très mauvaise", "Mauvaise", "Moyenne", "Bonne", "Très bonne"])
-        green_spaces = st.slider("Espaces verts par habitant (m²)", 0, 50, 5)
+        green_spaces = st.slider("Espaces verts par habitant (m²)", 0, 50, DEFAULT_FORM["green_spaces"])
         air_quality = st.selectbox("Qualité de l'air", ["Très mauvaise", "Mauvaise", "Moyenne", "Bonne", "Très bonne"])
         st.markdown('</div>', unsafe_allow_html=True)
         
@@ -886,7 +636,7 @@ def diagnostic_tab():
         st.markdown('<div class="form-section">', unsafe_allow_html=True)
         st.subheader("🚌 Transport et Mobilité")
         public_transport = st.selectbox("Transport public", ["Inexistant", "Très limité", "Limité", "Développé", "Très développé"])
-        vehicle_ownership = st.slider("Taux de motorisation (véhicules/1000 hab)", 0, 500, 80)
+        vehicle_ownership = st.slider("Taux de motorisation (véhicules/1000 hab)", 0, 500, DEFAULT_FORM["vehicle_ownership"])
         traffic_congestion = st.selectbox("Congestion routière", ["Très faible", "Faible", "Modérée", "Forte", "Très forte"])
         st.markdown('</div>', unsafe_allow_html=True)
         
@@ -912,14 +662,14 @@ def diagnostic_tab():
         
         diagnostic_objective = st.text_area(
             "Objectif spécifique du diagnostic",
-            value="Évaluer l'état actuel du développement urbain et identifier les priorités d'intervention pour améliorer les conditions de vie des habitants.",
+            value=DEFAULT_FORM["diagnostic_objective"],
             height=100
         )
         
         target_audience = st.multiselect(
             "Public cible du rapport",
             ["Autorités locales", "Gouvernement national", "Bailleurs de fonds", "ONG", "Secteur privé", "Citoyens", "Chercheurs"],
-            default=["Autorités locales", "Bailleurs de fonds"]
+            default=DEFAULT_FORM["target_audience"]
         )
         st.markdown('</div>', unsafe_allow_html=True)
         
@@ -933,11 +683,59 @@ def diagnostic_tab():
         )
         st.markdown('</div>', unsafe_allow_html=True)
         
+        incremental_mode = st.checkbox(
+            "♻️ Régénération incrémentale",
+            value=True,
+            help="Ne recalcule que les sections dont les données d'entrée, les documents ou le contexte web ont changé depuis le dernier rapport"
+        )
         generate_report = st.button("🚀 Générer le rapport complet", type="primary", use_container_width=True)
     
+    # Données du formulaire utilisées par les prompts des sections
+    form = {
+        "city_name": city_name,
+        "country": country,
+        "region": region,
+        "population": population,
+        "growth_rate": growth_rate,
+        "urban_area": urban_area,
+        "youth_percentage": youth_percentage,
+        "water_access": water_access,
+        "electricity_access": electricity_access,
+        "sanitation_access": sanitation_access,
+        "road_quality": road_quality,
+        "internet_access": internet_access,
+        "housing_deficit": housing_deficit,
+        "informal_settlements": informal_settlements,
+        "housing_cost": housing_cost,
+        "construction_materials": construction_materials,
+        "unemployment_rate": unemployment_rate,
+        "informal_economy": informal_economy,
+        "main_sectors": main_sectors,
+        "gdp_per_capita": gdp_per_capita,
+        "health_facilities": health_facilities,
+        "schools": schools,
+        "literacy_rate": literacy_rate,
+        "infant_mortality": infant_mortality,
+        "life_expectancy": life_expectancy,
+        "climate_risks": climate_risks,
+        "waste_management": waste_management,
+        "green_spaces": green_spaces,
+        "air_quality": air_quality,
+        "public_transport": public_transport,
+        "vehicle_ownership": vehicle_ownership,
+        "traffic_congestion": traffic_congestion,
+        "diagnostic_type": diagnostic_type,
+        "diagnostic_objective": diagnostic_objective,
+        "target_audience": target_audience,
+        "additional_comments": additional_comments
+    }
+    
     # Interface principale pour le rapport
+    job_queue = get_report_job_queue(clients)
+    # Clients courants (clés éventuellement modifiées depuis la création de la file)
+    job_queue.clients = clients
     if generate_report:
-        with st.spinner("Génération du rapport en cours..."):
+        with st.spinner("Préparation du rapport..."):
             
             # Collecte des données web si activée
             web_data = None
@@ -963,12 +761,15 @@ def diagnostic_tab():
             documents_content = process_uploaded_documents(uploaded_files)
             
             if documents_content:
-                st.success(f"📄 {len(documents_content)} document(s) analysé(s) et intégré(s) dans le rapport")
+                # Construire l'index une seule fois avant la génération parallèle des sections
+                document_index = get_document_index(documents_content)
+                st.success(f"📄 {len(documents_content)} document(s) analysé(s) et intégré(s) dans le rapport ({len(document_index.chunks)} passages indexés)")
                 
                 # Afficher un aperçu des documents traités
                 with st.expander("📋 Aperçu des documents traités"):
                     for doc in documents_content:
-                        st.write(f"**{doc['filename']}**")
+                        cache_label = "extrait" if doc['cache_status'] == "extrait" else f"cache {doc['cache_status']}"
+                        st.write(f"**{doc['filename']}** — {doc['elapsed'] * 1000:.0f} ms ({cache_label})")
                         st.write(f"Extrait: {doc['content'][:200]}...")
                         st.write("---")
             
@@ -983,266 +784,45 @@ def diagnostic_tab():
             **Documents analysés:** {len(documents_content) if documents_content else 0}
             """)
             
-            # Table des matières dynamique
-            st.markdown('<div class="section-header">📋 TABLE DES MATIÈRES</div>', unsafe_allow_html=True)
-            
-            toc_items = [
-                ("1. Résumé exécutif", "3"),
-                ("2. Contexte démographique et social", "5"),
-                ("3. Analyse de l'habitat et des infrastructures", "8"),
-                ("4. Défis et opportunités identifiés", "11"),
-                ("5. Recommandations stratégiques", "14"),
-                ("6. Graphiques et visualisations", "17"),
-                ("7. Conclusion prospective", "19")
-            ]
-            
-            for item, page in toc_items:
-                st.markdown(f'<div class="toc-item"><span>{item}</span><span>Page {page}</span></div>', unsafe_allow_html=True)
-            
-            st.markdown("---")
-            
-            # 1. RÉSUMÉ EXÉCUTIF
-            st.markdown('<div class="section-header">1. RÉSUMÉ EXÉCUTIF</div>', unsafe_allow_html=True)
-            
-            executive_prompt = f"""
-            Rédigez un résumé exécutif professionnel de 400 mots pour le diagnostic urbain de {city_name}, {country}.
-            Type de diagnostic: {diagnostic_type}
-            Objectif: {diagnostic_objective}
-            Population: {population:,} habitants, croissance: {growth_rate}%.
-            Accès eau: {water_access}%, électricité: {electricity_access}%, assainissement: {sanitation_access}%.
-            Chômage: {unemployment_rate}%, habitat informel: {informal_settlements}%.
-            Risques climatiques: {', '.join(climate_risks) if climate_risks else 'Non spécifiés'}.
-            Contexte particulier: {additional_comments if additional_comments else 'Aucun commentaire spécifique'}.
-            Incluez: situation actuelle, défis principaux, opportunités, recommandations clés.
-            Style: professionnel, sans emojis, paragraphes structurés.
-            """
-            
-            executive_summary = generate_enhanced_content_with_docs_and_web(executive_prompt, clients, documents_content, web_data, 600)
-            st.markdown(f'<div class="professional-text">{executive_summary}</div>', unsafe_allow_html=True)
-            
-            # 2. CONTEXTE DÉMOGRAPHIQUE ET SOCIAL
-            st.markdown('<div class="section-header">2. CONTEXTE DÉMOGRAPHIQUE ET SOCIAL</div>', unsafe_allow_html=True)
-            
-            # 2.1 Profil démographique
-            st.markdown('<div class="subsection-header">2.1 Profil démographique</div>', unsafe_allow_html=True)
-            
-            demo_prompt = f"""
-            Analysez le profil démographique de {city_name} avec {population:,} habitants et {growth_rate}% de croissance.
-            Densité: {density} hab/km², jeunes (0-25 ans): {youth_percentage}%.
-            Détaillez: structure par âge, migration, densité urbaine, projections 2030.
-            Comparaisons régionales avec autres capitales sahéliennes.
-            300 mots, style analytique professionnel.
-            """
-            
-            demographic_analysis = generate_enhanced_content_with_docs_and_web(demo_prompt, clients, documents_content, web_data, 500)
-            st.markdown(f'<div class="professional-text">{demographic_analysis}</div>', unsafe_allow_html=True)
-            
-            # Graphique démographique
-            demo_chart = create_demographic_chart({"population": population, "growth": growth_rate})
-            st.plotly_chart(demo_chart, use_container_width=True)
-            
-            # 2.2 Contexte socio-économique
-            st.markdown('<div class="subsection-header">2.2 Contexte socio-économique</div>', unsafe_allow_html=True)
-            
-            socio_prompt = f"""
-            Analysez le contexte socio-économique de {city_name}:
-            - Secteurs économiques dominants: {', '.join(main_sectors) if main_sectors else 'Non spécifiés'}
-            - Chômage: {unemployment_rate}%, économie informelle: {informal_economy}%
-            - PIB par habitant: {gdp_per_capita} USD
-            - Taux d'alphabétisation: {literacy_rate}%
-            - Mortalité infantile: {infant_mortality}‰, espérance de vie: {life_expectancy} ans
-            - Établissements de santé: {health_facilities}, écoles: {schools}
-            350 mots, données chiffrées, analyse approfondie.
-            """
-            
-            socio_analysis = generate_enhanced_content_with_docs_and_web(socio_prompt, clients, documents_content, web_data, 600)
-            st.markdown(f'<div class="professional-text">{socio_analysis}</div>', unsafe_allow_html=True)
-            
-            # Métriques socio-économiques
-            col1, col2, col3, col4 = st.columns(4)
-            with col1:
-                st.metric("Taux de chômage", f"{unemployment_rate}%", "-2.1%")
-            with col2:
-                st.metric("PIB par habitant", f"{gdp_per_capita} USD", "+4.2%")
-            with col3:
-                st.metric("Taux d'alphabétisation", f"{literacy_rate}%", "+3.5%")
-            with col4:
-                st.metric("Économie informelle", f"{informal_economy}%", "-1.8%")
-            
-            # 3. ANALYSE DE L'HABITAT ET DES INFRASTRUCTURES
-            st.markdown('<div class="section-header">3. ANALYSE DE L\'HABITAT ET DES INFRASTRUCTURES</div>', unsafe_allow_html=True)
-            
-            # 3.1 État du parc de logements
-            st.markdown('<div class="subsection-header">3.1 État du parc de logements</div>', unsafe_allow_html=True)
-            
-            housing_prompt = f"""
-            Analysez l'état du parc de logements à {city_name}:
-            - Déficit en logements: {housing_deficit:,} unités
-            - Population en habitat informel: {informal_settlements}%
-            - Coût du logement: {housing_cost} USD/m²
-            - Matériaux dominants: {', '.join(construction_materials) if construction_materials else 'Non spécifiés'}
-            - Accès eau: {water_access}%, électricité: {electricity_access}%
-            Détaillez: types de logements, qualité du bâti, surpeuplement, marché immobilier, quartiers informels.
-            400 mots, analyse technique détaillée.
-            """
-            
-            housing_analysis = generate_enhanced_content_with_docs_and_web(housing_prompt, clients, documents_content, web_data, 700)
-            st.markdown(f'<div class="professional-text">{housing_analysis}</div>', unsafe_allow_html=True)
-            
-            # Graphique logement
-            housing_chart = create_housing_analysis_chart()
-            st.plotly_chart(housing_chart, use_container_width=True)
-            
-            # 3.2 Infrastructures de base
-            st.markdown('<div class="subsection-header">3.2 Infrastructures de base</div>', unsafe_allow_html=True)
-            
-            infra_prompt = f"""
-            Évaluez les infrastructures de base de {city_name}:
-            - Eau potable: {water_access}% de couverture
-            - Électricité: {electricity_access}% de couverture
-            - Assainissement: {sanitation_access}% de couverture
-            - Qualité des routes: {road_quality}
-            - Accès Internet: {internet_access}%
-            - Gestion des déchets: {waste_management}
-            - Transport public: {public_transport}
-            450 mots, évaluation technique approfondie.
-            """
-            
-            infrastructure_analysis = generate_enhanced_content_with_docs_and_web(infra_prompt, clients, documents_content, web_data, 700)
-            st.markdown(f'<div class="professional-text">{infrastructure_analysis}</div>', unsafe_allow_html=True)
-            
-            # Graphique infrastructures
-            infra_chart = create_infrastructure_chart()
-            st.plotly_chart(infra_chart, use_container_width=True)
-            
-            # 4. DÉFIS ET OPPORTUNITÉS IDENTIFIÉS
-            st.markdown('<div class="section-header">4. DÉFIS ET OPPORTUNITÉS IDENTIFIÉS</div>', unsafe_allow_html=True)
-            
-            # 4.1 Défis majeurs
-            st.markdown('<div class="subsection-header">4.1 Défis majeurs</div>', unsafe_allow_html=True)
-            
-            challenges_prompt = f"""
-            Identifiez et analysez les défis majeurs de {city_name}:
-            - Croissance démographique rapide ({growth_rate}%) et planification urbaine
-            - Déficit en logements ({housing_deficit:,} unités) et habitat informel ({informal_settlements}%)
-            - Insuffisance des services de base (eau: {water_access}%, électricité: {electricity_access}%)
-            - Chômage élevé ({unemployment_rate}%) et économie informelle ({informal_economy}%)
-            - Risques climatiques: {', '.join(climate_risks) if climate_risks else 'Non spécifiés'}
-            - Qualité de l'air: {air_quality}, gestion des déchets: {waste_management}
-            400 mots, analyse critique et factuelle.
-            """
-            
-            challenges_analysis = generate_enhanced_content_with_docs_and_web(challenges_prompt, clients, documents_content, web_data, 700)
-            st.markdown(f'<div class="professional-text">{challenges_analysis}</div>', unsafe_allow_html=True)
-            
-            # 4.2 Opportunités de développement
-            st.markdown('<div class="subsection-header">4.2 Opportunités de développement</div>', unsafe_allow_html=True)
-            
-            opportunities_prompt = f"""
-            Analysez les opportunités de développement pour {city_name}:
-            - Secteurs économiques porteurs: {', '.join(main_sectors) if main_sectors else 'À identifier'}
-            - Population jeune ({youth_percentage}% de moins de 25 ans)
-            - Potentiel de développement urbain sur {urban_area} km²
-            - Coopération internationale et financement
-            - Innovation technologique et villes intelligentes
-            - Partenariats public-privé
-            350 mots, vision prospective et réaliste.
-            """
-            
-            opportunities_analysis = generate_enhanced_content_with_docs_and_web(opportunities_prompt, clients, documents_content, web_data, 600)
-            st.markdown(f'<div class="professional-text">{opportunities_analysis}</div>', unsafe_allow_html=True)
-            
-            # 5. RECOMMANDATIONS STRATÉGIQUES
-            st.markdown('<div class="section-header">5. RECOMMANDATIONS STRATÉGIQUES</div>', unsafe_allow_html=True)
-            
-            # 5.1 Priorités à court terme (1-3 ans)
-            st.markdown('<div class="subsection-header">5.1 Priorités à court terme (1-3 ans)</div>', unsafe_allow_html=True)
-            
-            short_term_prompt = f"""
-            Formulez des recommandations prioritaires à court terme pour {city_name}:
-            - Amélioration urgente de l'accès à l'eau potable (actuellement {water_access}%)
-            - Extension du réseau électrique (actuellement {electricity_access}%)
-            - Programmes d'urgence pour l'habitat précaire ({informal_settlements}% de la population)
-            - Création d'emplois face au chômage de {unemployment_rate}%
-            - Renforcement des capacités institutionnelles
-            - Gestion des risques climatiques: {', '.join(climate_risks) if climate_risks else 'À définir'}
-            300 mots, recommandations concrètes et réalisables.
-            """
-            
-            short_term_reco = generate_enhanced_content_with_docs_and_web(short_term_prompt, clients, documents_content, web_data, 500)
-            st.markdown(f'<div class="professional-text">{short_term_reco}</div>', unsafe_allow_html=True)
-            
-            # 5.2 Stratégies à moyen terme (3-7 ans)
-            st.markdown('<div class="subsection-header">5.2 Stratégies à moyen terme (3-7 ans)</div>', unsafe_allow_html=True)
-            
-            medium_term_prompt = f"""
-            Développez des stratégies à moyen terme pour {city_name}:
-            - Planification urbaine intégrée pour gérer la croissance de {growth_rate}%
-            - Développement de nouveaux quartiers planifiés
-            - Modernisation des infrastructures existantes
-            - Diversification économique (secteurs actuels: {', '.join(main_sectors) if main_sectors else 'À développer'})
-            - Renforcement de la résilience climatique
-            - Amélioration du transport public (actuellement: {public_transport})
-            350 mots, approche stratégique et intégrée.
-            """
-            
-            medium_term_reco = generate_enhanced_content_with_docs_and_web(medium_term_prompt, clients, documents_content, web_data, 600)
-            st.markdown(f'<div class="professional-text">{medium_term_reco}</div>', unsafe_allow_html=True)
-            
-            # 5.3 Vision à long terme (7-15 ans)
-            st.markdown('<div class="subsection-header">5.3 Vision à long terme (7-15 ans)</div>', unsafe_allow_html=True)
-            
-            long_term_prompt = f"""
-            Esquissez une vision à long terme pour {city_name}:
-            - Transformation en ville intelligente et durable
-            - Hub économique régional basé sur {', '.join(main_sectors) if main_sectors else 'les secteurs porteurs'}
-            - Inclusion sociale et égalité d'accès aux services
-            - Adaptation au changement climatique et neutralité carbone
-            - Gouvernance participative et innovation numérique
-            300 mots, style prospectif et inspirant.
-            """
-            
-            long_term_reco = generate_enhanced_content_with_docs_and_web(long_term_prompt, clients, documents_content, web_data, 500)
-            st.markdown(f'<div class="professional-text">{long_term_reco}</div>', unsafe_allow_html=True)
-            
-            # 6. GRAPHIQUES ET VISUALISATIONS
-            st.markdown('<div class="section-header">6. GRAPHIQUES ET VISUALISATIONS</div>', unsafe_allow_html=True)
-            st.info("Les graphiques interactifs sont présentés ci-dessus dans chaque section thématique. Vous pouvez les exporter au format image ou PDF.")
-            
-            # 7. CONCLUSION PROSPECTIVE
-            st.markdown('<div class="section-header">7. CONCLUSION PROSPECTIVE</div>', unsafe_allow_html=True)
-            conclusion_prompt = f"""
-            Rédigez une conclusion prospective pour le diagnostic urbain de {city_name}, en insistant sur l'importance d'une approche intégrée, la mobilisation des acteurs locaux, et l'innovation pour relever les défis urbains du XXIe siècle. 200 mots, ton mobilisateur.
-            """
-            conclusion = generate_enhanced_content_with_docs_and_web(conclusion_prompt, clients, documents_content, web_data, 350)
-            st.markdown(f'<div class="professional-text">{conclusion}</div>', unsafe_allow_html=True)
-            
-            # Génération du rapport PDF
-            st.markdown("---")
-            st.subheader("📥 Télécharger le rapport PDF professionnel")
-            report_data = {
-                "executive_summary": executive_summary,
-                "demographic_context": demographic_analysis + "\n\n" + socio_analysis,
-                "housing_analysis": housing_analysis + "\n\n" + infrastructure_analysis,
-                "challenges": challenges_analysis + "\n\n" + opportunities_analysis,
-                "recommendations": short_term_reco + "\n\n" + medium_term_reco + "\n\n" + long_term_reco,
-                "conclusion": conclusion
-            }
-            charts_data = {
-                "demographic_chart": demo_chart,
-                "housing_chart": housing_chart,
-                "infra_chart": infra_chart
-            }
-            pdf_buffer = generate_professional_pdf_report(city_name, report_data, charts_data)
-            st.download_button(
-                label="📄 Télécharger le rapport PDF",
-                data=pdf_buffer,
-                file_name=f"Diagnostic_{city_name.replace(' ', '_')}.pdf",
-                mime="application/pdf"
-            )
-        st.success("✅ Rapport généré avec succès !")
-    else:
+            # Sections à (re)calculer : graphe de dépendances entrées -> sections
+            documents_fp = fingerprint([[doc['filename'], doc['sha256']] for doc in documents_content])
+            web_fp = fingerprint(format_web_info_for_prompt(web_data))
+            previous = st.session_state.get("last_report") if incremental_mode else None
+            dirty_sections, changed_inputs = plan_incremental_regeneration(previous, form, documents_fp, web_fp)
+            reused_sections = {
+                key: previous["sections"][key] for key in SECTION_TITLES if key not in dirty_sections
+            } if previous else {}
+            
+            if previous:
+                with st.expander(f"🔁 Régénération incrémentale : {len(dirty_sections)} section(s) recalculée(s) sur {len(SECTION_TITLES)}"):
+                    if changed_inputs:
+                        st.write("**Champs modifiés :**")
+                        for name in changed_inputs:
+                            st.write(f"- `{name}` : {previous['form'].get(name)} → {form[name]}")
+                    if previous["documents_fp"] != documents_fp:
+                        st.write("- Documents techniques modifiés")
+                    if previous["web_fp"] != web_fp:
+                        st.write("- Contexte web modifié")
+                    st.write("**Sections recalculées :** " + (", ".join(SECTION_TITLES[key] for key in dirty_sections) or "aucune"))
+                    st.write("**Sections reprises du rapport précédent :** " + (", ".join(SECTION_TITLES[key] for key in reused_sections) or "aucune"))
+            
+            # La génération s'exécute en arrière-plan : le script rend la main immédiatement
+            job_id = job_queue.submit(form, documents_content, web_data, dirty_sections, reused_sections, documents_fp, web_fp)
+        st.session_state["report_job"] = job_id
+        st.query_params["job"] = job_id
+    
+    # Rapport en cours ou terminé, retrouvé après un rerun ou un rechargement de la page
+    job_id = st.session_state.get("report_job") or st.query_params.get("job")
+    job = job_queue.get(job_id) if job_id else None
+    if job is None:
         st.info("Remplissez le formulaire à gauche puis cliquez sur 'Générer le rapport complet' pour lancer le diagnostic urbain.")
+        return
+    
+    st.session_state["report_job"] = job_id
+    if job["status"] in REPORT_JOB_ACTIVE:
+        report_job_progress(job_queue, job_id)
+    else:
+        render_finished_report(job)
 
 def main():
     create_header()
@@ -0,0 +1,243 @@
+"""Diagnostic urbain en lot : un rapport PDF et JSON par ville, sans interface
+
+Usage :
+    python batch.py villes.csv --output-dir rapports --cities 3 --llm-concurrency 8
+
+Le fichier d'entrée (CSV ou Parquet) contient une ligne par ville ; les colonnes
+reprennent les champs du formulaire (city_name, country, population, ...), les champs
+absents prennent les valeurs par défaut de la barre latérale. Les listes
+(main_sectors, climate_risks, ...) sont séparées par des points-virgules.
+Les villes déjà traitées (JSON au statut "complete") sont ignorées à la relance.
+Une ville présente deux fois (même nom et même pays) est écrite sous <slug>_2.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import tomllib
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from diagnostic_urbain import (
+    DEFAULT_FORM, LLM_POOL_DEFAULTS, LLM_ROUTER_DEFAULTS, FailedGeneration, build_ai_clients, build_report_data,
+    create_report_charts, get_web_urban_data, project_city, project_forms, projection_summary, run_report_pipeline,
+    write_professional_pdf_report
+)
+
+SECRETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".streamlit", "secrets.toml")
+
+@lru_cache(maxsize=None)
+def load_secrets():
+    """Lit le fichier secrets.toml de l'application Streamlit, s'il existe"""
+    try:
+        with open(SECRETS_PATH, "rb") as f:
+            return tomllib.load(f)
+    except (OSError, tomllib.TOMLDecodeError):
+        return {}
+
+def load_setting(name, default=None):
+    """Lit un paramètre depuis l'environnement, puis secrets.toml s'il existe"""
+    value = os.environ.get(name)
+    if value is None:
+        value = load_secrets().get(name, default)
+    if value is not None and default is not None and not isinstance(value, type(default)):
+        value = type(default)(value)
+    return value
+
+def build_clients(llm_concurrency):
+    """Clients IA partagés par toutes les villes ; le routeur plafonne les appels simultanés"""
+    defaults = {**LLM_POOL_DEFAULTS, **LLM_ROUTER_DEFAULTS}
+    settings = {name: load_setting(name, default) for name, default in defaults.items()}
+    if llm_concurrency:
+        # Plafond commun à Groq et OpenAI ; le plafond par fournisseur ne doit pas être plus bas
+        settings["LLM_MAX_TOTAL_CALLS"] = llm_concurrency
+        settings["LLM_MAX_CONCURRENT_CALLS"] = llm_concurrency
+    return build_ai_clients(load_setting("OPENAI_API_KEY"), load_setting("GROQ_API_KEY"), settings)
+
+def read_cities(path):
+    """Charge la liste des villes depuis un fichier CSV ou Parquet"""
+    if path.lower().endswith((".parquet", ".pq")):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+def row_to_form(row):
+    """Convertit une ligne du fichier d'entrée en formulaire complet du diagnostic"""
+    form = dict(DEFAULT_FORM)
+    for name, value in row.items():
+        if name not in form:
+            continue
+        if isinstance(value, np.ndarray):
+            value = value.tolist()
+        if not isinstance(value, (list, tuple)) and pd.isna(value):
+            continue
+
+        default = form[name]
+        if isinstance(default, list):
+            if isinstance(value, str):
+                value = [item.strip() for item in value.split(";") if item.strip()]
+            value = list(value)
+        elif isinstance(default, int):
+            value = int(value)
+        elif isinstance(default, float):
+            value = float(value)
+        else:
+            value = str(value)
+        form[name] = value
+    return form
+
+def city_slug(form):
+    """Nom de fichier stable pour une ville"""
+    text = unicodedata.normalize("NFKD", f"{form['city_name']}_{form['country']}")
+    text = text.encode("ascii", "ignore").decode("ascii").lower()
+    return re.sub(r"[^a-z0-9]+", "_", text).strip("_") or "ville"
+
+def city_slugs(forms):
+    """Noms de fichier des villes d'un lot, uniques : une ville en double reçoit un suffixe
+    (_2, _3...) selon son rang dans le fichier d'entrée, stable d'une relance à l'autre
+    """
+    slugs = []
+    seen = {}
+    for form in forms:
+        slug = city_slug(form)
+        seen[slug] = seen.get(slug, 0) + 1
+        slugs.append(slug if seen[slug] == 1 else f"{slug}_{seen[slug]}")
+    return slugs
+
+def write_atomic(path, data):
+    """Écrit un fichier via un fichier temporaire pour ne jamais laisser de rapport tronqué"""
+    tmp_path = f"{path}.tmp"
+    mode = "wb" if isinstance(data, bytes) else "w"
+    encoding = None if isinstance(data, bytes) else "utf-8"
+    with open(tmp_path, mode, encoding=encoding) as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def is_complete(json_path):
+    """Vrai si la ville a déjà été traitée avec succès lors d'une exécution précédente"""
+    try:
+        with open(json_path, encoding="utf-8") as f:
+            return json.load(f).get("status") == "complete"
+    except (OSError, ValueError):
+        return False
+
+def run_city(form, clients, output_dir, enable_web=True, measure_memory=False, projection=None, slug=None):
+    """Exécute le pipeline complet pour une ville et écrit <slug>.pdf puis <slug>.json
+
+    `projection` est la projection démographique de la ville déjà calculée pour tout
+    le lot (voir project_forms) ; elle est calculée ici si elle n'est pas fournie.
+    `slug` vient de city_slugs pour un lot (villes en double), city_slug(form) sinon.
+    """
+    projection = projection or project_city(form)
+    start = time.perf_counter()
+    slug = slug or city_slug(form)
+
+    web_data = get_web_urban_data(form["city_name"], form["country"]) if enable_web else None
+    usage_log = []
+    sections = run_report_pipeline(form, clients, web_data=web_data, usage_log=usage_log)
+    failed = [key for key, content in sections.items() if isinstance(content, FailedGeneration)]
+
+    # Le PDF est écrit directement sur disque (fichier temporaire puis renommage)
+    pdf_path = os.path.join(output_dir, f"{slug}.pdf")
+    pdf_stats = write_professional_pdf_report(
+        f"{pdf_path}.tmp", form["city_name"], build_report_data(sections), create_report_charts(form, projection),
+        measure_memory=measure_memory
+    )
+    os.replace(f"{pdf_path}.tmp", pdf_path)
+
+    # Le JSON est écrit en dernier : sa présence au statut "complete" vaut reprise
+    report = {
+        "city_name": form["city_name"],
+        "country": form["country"],
+        "status": "partial" if failed else "complete",
+        "failed_sections": failed,
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "elapsed": round(time.perf_counter() - start, 2),
+        "form": form,
+        "sections": sections,
+        "usage": usage_log,
+        "pdf": pdf_stats,
+        "projections": projection_summary(projection),
+        "wikipedia_url": (web_data or {}).get("wikipedia_info", {}).get("url")
+    }
+    write_atomic(os.path.join(output_dir, f"{slug}.json"), json.dumps(report, ensure_ascii=False, indent=2, default=str))
+    return report
+
+def run_batch(cities, clients, output_dir, max_cities=2, enable_web=True, force=False, measure_memory=False):
+    """Traite plusieurs villes en parallèle ; renvoie (terminées, ignorées, échecs)"""
+    os.makedirs(output_dir, exist_ok=True)
+    forms = [row_to_form(row) for _, row in cities.iterrows()]
+
+    # Deux lignes de même ville et pays écriraient les mêmes fichiers : slugs rendus uniques
+    todo, slugs = [], []
+    skipped = 0
+    for form, slug in zip(forms, city_slugs(forms)):
+        if not force and is_complete(os.path.join(output_dir, f"{slug}.json")):
+            print(f"⏭️  {form['city_name']} : déjà traitée")
+            skipped += 1
+        else:
+            todo.append(form)
+            slugs.append(slug)
+
+    # Projections de toutes les villes en un seul calcul vectorisé
+    projections = project_forms(todo) if todo else []
+
+    done, failures = 0, 0
+    with ThreadPoolExecutor(max_workers=max_cities) as executor:
+        futures = {
+            executor.submit(run_city, form, clients, output_dir, enable_web, measure_memory, projection, slug): form
+            for form, projection, slug in zip(todo, projections, slugs)
+        }
+        for future in as_completed(futures):
+            form = futures[future]
+            try:
+                report = future.result()
+            except Exception as e:
+                print(f"❌ {form['city_name']} : {e}", file=sys.stderr)
+                failures += 1
+                continue
+            if report["status"] == "complete":
+                pdf = report["pdf"]
+                memory = f", pic mémoire PDF {pdf['peak_memory'] / 1e6:.1f} Mo" if pdf["peak_memory"] is not None else ""
+                print(f"✅ {form['city_name']} : rapport généré en {report['elapsed']:.1f} s ({pdf['pages']} pages{memory})")
+                done += 1
+            else:
+                print(f"⚠️  {form['city_name']} : {len(report['failed_sections'])} section(s) en erreur, à relancer", file=sys.stderr)
+                failures += 1
+    return done, skipped, failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Diagnostic urbain en lot (un rapport PDF et JSON par ville)")
+    parser.add_argument("input", help="Fichier CSV ou Parquet, une ligne par ville")
+    parser.add_argument("--output-dir", default="rapports", help="Dossier de sortie des rapports")
+    parser.add_argument("--cities", type=int, default=2, help="Nombre de villes traitées simultanément")
+    parser.add_argument("--llm-concurrency", type=int, default=None, help="Plafond d'appels LLM simultanés, tous fournisseurs confondus")
+    parser.add_argument("--no-web", action="store_true", help="Désactive l'enrichissement Wikipedia")
+    parser.add_argument("--force", action="store_true", help="Régénère aussi les villes déjà traitées")
+    parser.add_argument("--pdf-memory", action="store_true", help="Mesure le pic mémoire de chaque PDF (plus lent, PDF mesurés un à un ; avec --cities > 1 le pic inclut les appels LLM des autres villes)")
+    args = parser.parse_args(argv)
+
+    cities = read_cities(args.input)
+    if "city_name" not in cities.columns:
+        parser.error("la colonne 'city_name' est obligatoire")
+
+    clients = build_clients(args.llm_concurrency)
+    if len(clients) == 1:
+        parser.error("aucune clé API (GROQ_API_KEY ou OPENAI_API_KEY) dans l'environnement ou secrets.toml")
+
+    start = time.perf_counter()
+    done, skipped, failures = run_batch(
+        cities, clients, args.output_dir,
+        max_cities=args.cities, enable_web=not args.no_web, force=args.force, measure_memory=args.pdf_memory
+    )
+    print(f"{done} rapport(s) généré(s), {skipped} ignoré(s), {failures} échec(s) en {time.perf_counter() - start:.1f} s")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
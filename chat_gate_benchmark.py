@@ -0,0 +1,137 @@
+"""Mesure du filtre thématique du chatbot (classify_question) sur des questions étiquetées
+
+Usage :
+    python chat_gate_benchmark.py                      # résumé lisible, ancien et nouveau filtre
+    python chat_gate_benchmark.py --json               # résultat JSON, à archiver pour suivre l'évolution
+    python chat_gate_benchmark.py --min-accuracy 1.0   # code de sortie 1 si le filtre actuel se trompe
+
+L'ancien filtre (recherche de sous-chaînes dans la question en minuscules) est
+reproduit ici comme référence. Chaque question est étiquetée (liée à l'urbanisme,
+besoin de données récentes) ; la durée par question est la moyenne de `number` appels.
+"""
+import argparse
+import json
+import sys
+import timeit
+
+from diagnostic_urbain.chat import classify_question
+
+# Questions de longueur typique pour la mesure de durée (étiquetées comme les autres)
+SHORT_QUESTION = "Raconte une blague"
+LONG_QUESTION = "Quelles sont les meilleures stratégies pour améliorer la qualité de vie dans les grandes agglomérations sahéliennes en croissance rapide ? " * 2
+
+# Questions étiquetées : (question, liée à l'urbanisme, besoin de données récentes).
+# Outre les cas d'origine : chaque mot-clé de l'ancien filtre sous une forme fléchée,
+# les faux négatifs relevés en revue et des questions hors sujet piégeuses (« beaucoup »).
+LABELLED_QUESTIONS = [
+    ("Comment améliorer l'electricite a Dakar ?", True, False),
+    ("Quel est le taux d'URBANISATION en Afrique ?", True, False),
+    ("J'aime beaucoup le football", False, False),
+    ("Quelle est la dernière politique de l'habitat au Sénégal ?", True, True),
+    (SHORT_QUESTION, False, False),
+    ("Les bidonvilles de Nairobi", True, False),
+    ("Gestion des déchets à Nouakchott en 2025", True, True),
+    ("Donne-moi une recette de gâteau au beurre", False, False),
+    ("Quelle est la mobilité actuelle à Abidjan ?", True, True),
+    (LONG_QUESTION, True, False),
+    # Formes fléchées des mots-clés de l'ancien filtre
+    ("Quelles villes sahéliennes grandissent le plus vite ?", True, False),
+    ("Les politiques urbaines en Afrique de l'Ouest", True, False),
+    ("Financer les infrastructures routières", True, False),
+    ("Les transports en commun de Lagos", True, False),
+    ("Combien de logements sociaux faut-il construire ?", True, False),
+    ("Traitement des eaux usées à Bamako", True, False),
+    ("Le réseau électrique tient-il la charge ?", True, False),
+    ("Quelles gouvernances locales fonctionnent le mieux ?", True, False),
+    ("Comment planifier l'extension d'une commune ?", True, False),
+    ("Les développements récents du port de Cotonou", True, True),
+    ("Les populations déplacées par les inondations", True, False),
+    ("Les habitats précaires en périphérie", True, False),
+    ("Les réseaux d'assainissements autonomes", True, False),
+    ("Exemples de smart cities africaines", True, False),
+    ("Le rôle des conseillers municipaux", True, False),
+    ("Les élections municipales de l'an prochain", True, False),
+    ("Que peuvent faire les maires face aux inondations ?", True, False),
+    ("Comment associer les citoyennes et citoyens au budget ?", True, False),
+    ("La qualité des services publics à Niamey", True, False),
+    # Faux négatifs relevés en revue
+    ("Comment réduire les embouteillages à Dakar ?", True, False),
+    ("L'exode des villages vers la capitale", True, False),
+    ("Les agglomérations secondaires du Mali", True, False),
+    ("Le nouveau conseil régional de Kayes", True, True),
+    # Hors sujet
+    ("Qui a gagné la coupe du monde de football ?", False, False),
+    ("Traduis ce poème en anglais", False, False),
+    ("Quel est le meilleur film de l'année ?", False, False),
+    ("Explique-moi la photosynthèse", False, False),
+    ("Peux-tu corriger l'orthographe de ce paragraphe ?", False, False),
+    ("Quelle est la dernière version de Python ?", False, True)
+]
+
+# Ancien filtre : mots-clés cherchés comme sous-chaînes (« eau » trouvé dans « beaucoup »)
+LEGACY_URBAN_KEYWORDS = [
+    'ville', 'urbain', 'infrastructure', 'transport', 'logement', 'eau', 'électricité', 'gouvernance',
+    'planification', 'développement', 'population', 'habitat', 'assainissement', 'smart city', 'municipalité',
+    'maire', 'conseil', 'citoyen', 'service public'
+]
+LEGACY_RECENT_KEYWORDS = ['récent', 'dernier', 'nouveau', 'actuel', '2024', '2025']
+
+def legacy_classify_question(text):
+    """Ancien filtre du chatbot, conservé comme référence du benchmark"""
+    lowered = text.lower()
+    return any(keyword in lowered for keyword in LEGACY_URBAN_KEYWORDS), any(word in lowered for word in LEGACY_RECENT_KEYWORDS)
+
+def evaluate(classify, number=20000):
+    """Exactitude de `classify` sur les questions étiquetées, durée moyenne par question (µs)
+    et classement obtenu pour les deux questions chronométrées
+    """
+    errors = []
+    for question, urban, recent in LABELLED_QUESTIONS:
+        predicted = classify(question)
+        if predicted != (urban, recent):
+            errors.append({"question": question, "attendu": [urban, recent], "obtenu": list(predicted)})
+
+    timings = {}
+    timed = {}
+    for label, question in (("court", SHORT_QUESTION), ("long", LONG_QUESTION)):
+        timings[label] = round(timeit.timeit(lambda: classify(question), number=number) / number * 1e6, 2)
+        timed[label] = list(classify(question))
+    return {
+        "correct": len(LABELLED_QUESTIONS) - len(errors),
+        "total": len(LABELLED_QUESTIONS),
+        "accuracy": round(1 - len(errors) / len(LABELLED_QUESTIONS), 3),
+        "errors": errors,
+        "duration_us": timings,
+        "timed_classification": timed
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exactitude et durée du filtre thématique du chatbot")
+    parser.add_argument("--number", type=int, default=20000, help="Appels par mesure de durée")
+    parser.add_argument("--json", action="store_true", help="Affiche le résultat en JSON")
+    parser.add_argument("--min-accuracy", type=float, default=None, help="Exactitude minimale du filtre actuel (code de sortie 1 sinon)")
+    args = parser.parse_args(argv)
+
+    report = {
+        "ancien": evaluate(legacy_classify_question, args.number),
+        "actuel": evaluate(classify_question, args.number)
+    }
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        for name, result in report.items():
+            timings, timed = result["duration_us"], result["timed_classification"]
+            print(
+                f"Filtre {name} : {result['correct']}/{result['total']} questions correctes, "
+                f"{timings['court']} µs (question courte, classée {timed['court']}), "
+                f"{timings['long']} µs ({len(LONG_QUESTION)} caractères, classée {timed['long']})"
+            )
+            for error in result["errors"]:
+                print(f"  ✗ {error['question']} : attendu {error['attendu']}, obtenu {error['obtenu']}")
+
+    if args.min_accuracy is not None and report["actuel"]["accuracy"] < args.min_accuracy:
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""Moteur du diagnostic urbain, utilisable sans Streamlit
+
+L'application Streamlit (app.py) et le mode batch (batch.py) reposent sur cette API :
+
+    from diagnostic_urbain import build_ai_clients, run_report_pipeline, build_report_data
+
+    clients = build_ai_clients(None, groq_api_key, {**LLM_POOL_DEFAULTS, **LLM_ROUTER_DEFAULTS})
+    sections = run_report_pipeline(DEFAULT_FORM, clients)
+
+Les dépendances lourdes (clients LLM, Plotly, ReportLab, OCR) ne sont importées
+qu'à leur première utilisation.
+"""
+from .chart_images import render_chart_images
+from .charts import create_report_charts
+from .chat import (
+    ChatAnswerCache, classify_question, get_chat_answer_cache, new_chat_memory, stream_chat_answer
+)
+from .config import LLM_POOL_DEFAULTS, LLM_ROUTER_DEFAULTS, MAX_DOCUMENT_CHARS
+from .documents import DocumentIndex, extract_documents, get_document_index
+from .llm import (
+    FailedGeneration, ProviderRouter, build_ai_clients, generate_enhanced_content_with_docs_and_web,
+    generate_sections_parallel
+)
+from .pdf import generate_professional_pdf_report, iter_professional_pdf_report, write_professional_pdf_report
+from .projections import (
+    current_density, format_projection_facts, project_cities, project_city, project_forms, projection_summary
+)
+from .prompts import (
+    DEFAULT_FORM, SECTION_TITLES, build_section_prompts, fingerprint, plan_incremental_regeneration
+)
+from .report import REPORT_JOB_ACTIVE, ReportJobQueue, build_report_data, run_report_pipeline
+from .web import get_web_urban_data
+
+__all__ = [
+    "ChatAnswerCache",
+    "DEFAULT_FORM",
+    "DocumentIndex",
+    "FailedGeneration",
+    "LLM_POOL_DEFAULTS",
+    "LLM_ROUTER_DEFAULTS",
+    "MAX_DOCUMENT_CHARS",
+    "ProviderRouter",
+    "REPORT_JOB_ACTIVE",
+    "ReportJobQueue",
+    "SECTION_TITLES",
+    "build_ai_clients",
+    "build_report_data",
+    "build_section_prompts",
+    "classify_question",
+    "create_report_charts",
+    "current_density",
+    "extract_documents",
+    "fingerprint",
+    "format_projection_facts",
+    "generate_enhanced_content_with_docs_and_web",
+    "generate_professional_pdf_report",
+    "generate_sections_parallel",
+    "get_chat_answer_cache",
+    "get_document_index",
+    "get_web_urban_data",
+    "iter_professional_pdf_report",
+    "new_chat_memory",
+    "plan_incremental_regeneration",
+    "project_cities",
+    "project_city",
+    "project_forms",
+    "projection_summary",
+    "render_chart_images",
+    "run_report_pipeline",
+    "stream_chat_answer",
+    "write_professional_pdf_report",
+]
@@ -0,0 +1,193 @@
+"""Caches du moteur : cache mémoire à expiration, cache SQLite des réponses LLM et éviction des caches en fichiers"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from .config import CACHE_DIR, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL
+
+class TTLCache:
+    """Cache mémoire thread-safe avec expiration par entrée et éviction LRU"""
+    
+    def __init__(self, maxsize=256, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key, default=None):
+        """Renvoie la valeur en cache, ou `default` si absente ou expirée"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+    
+    def set(self, key, value, ttl=None):
+        """Enregistre une valeur avec une durée de vie propre (ttl par défaut sinon)"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def __len__(self):
+        return len(self._data)
+
+class LLMResponseCache:
+    """Cache SQLite des réponses LLM, adressé par le hash du prompt final et des paramètres d'appel
+    
+    Les entrées expirent après `ttl` secondes et les moins récemment utilisées sont
+    évincées au-delà de `max_entries`. Les compteurs hits/misses sont propres au processus.
+    """
+    
+    def __init__(self, path, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, content TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at)")
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+    
+    @staticmethod
+    def make_key(messages, model, max_tokens, temperature):
+        """Calcule la clé de cache à partir du prompt final, du modèle et des paramètres"""
+        payload = json.dumps(
+            {"messages": messages, "model": model, "max_tokens": max_tokens, "temperature": temperature},
+            ensure_ascii=False, sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+    
+    def get(self, key):
+        """Renvoie la réponse en cache, ou None si absente ou expirée"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT content, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._count(False)
+                return None
+            content, created_at = row
+            if now - created_at > self.ttl:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                conn.commit()
+                self._count(False)
+                return None
+            conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+            self._count(True)
+            return content
+        finally:
+            conn.close()
+    
+    def set(self, key, content):
+        """Enregistre une réponse puis applique l'expiration et l'éviction LRU"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, content, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, content, now, now)
+            )
+            conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+            conn.execute(
+                "DELETE FROM llm_cache WHERE key NOT IN "
+                "(SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def stats(self):
+        """Renvoie les compteurs du processus et le nombre d'entrées stockées"""
+        conn = self._connect()
+        try:
+            entries = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        finally:
+            conn.close()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+def touch_cache_file(path):
+    """Marque un fichier de cache comme utilisé : sa date de modification sert à l'éviction LRU"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+def evict_file_cache(directory, ttl, max_bytes):
+    """Supprime les fichiers d'un dossier de cache expirés, puis les moins récemment utilisés
+    au-delà de `max_bytes` ; renvoie le nombre de fichiers supprimés
+    
+    Les fichiers temporaires des écritures atomiques en cours sont ignorés. Une
+    suppression concurrente (autre processus) n'est pas une erreur.
+    """
+    now = time.time()
+    files = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".tmp") or not entry.is_file():
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+    except OSError:
+        return 0
+    
+    removed = 0
+    total_bytes = 0
+    # Du plus récemment utilisé au plus ancien
+    for mtime, size, path in sorted(files, reverse=True):
+        if now - mtime <= ttl and total_bytes + size <= max_bytes:
+            total_bytes += size
+            continue
+        try:
+            os.remove(path)
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+@lru_cache(maxsize=None)
+def get_llm_cache():
+    """Instance unique du cache LLM pour le processus"""
+    return LLMResponseCache(os.path.join(CACHE_DIR, "llm_cache.sqlite"))
@@ -0,0 +1,243 @@
+"""Rendu des graphiques Plotly en images PNG pour l'export PDF
+
+La figure Plotly est traduite en figure matplotlib (moteur Agg) : aucun navigateur,
+ni Kaleido, ni accès réseau. Seuls les types de traces des graphiques du rapport sont
+pris en charge (secteurs, barres, nuages de points et courbes, sous-graphiques).
+Les images sont mises en cache sur disque par empreinte de la spécification de la figure ;
+le cache est borné en âge et en taille (les images les moins récemment utilisées sont évincées).
+"""
+import base64
+import hashlib
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+
+from .caching import evict_file_cache, touch_cache_file
+from .config import CACHE_DIR, CHART_CACHE_MAX_BYTES, CHART_IMAGE_DPI, CHART_RENDER_WORKERS, FILE_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+# À incrémenter quand le rendu change, pour invalider les images en cache
+CHART_RENDER_VERSION = 3
+
+# Valeurs par défaut de Plotly (gabarit « plotly ») reprises pour un rendu fidèle
+PLOTLY_COLORWAY = ['#636efa', '#EF553B', '#00cc96', '#ab63fa', '#FFA15A', '#19d3f3', '#FF6692', '#B6E880', '#FF97FF', '#FECB52']
+PLOTLY_WIDTH = 900  # pixels, largeur des figures sans largeur explicite
+PLOTLY_HEIGHT = 450  # pixels
+PLOTLY_MARGIN = {'l': 80, 'r': 80, 't': 100, 'b': 80}  # pixels
+PLOT_BACKGROUND = '#E5ECF6'
+
+def figure_key(fig):
+    """Empreinte de la spécification d'une figure (données et mise en page)"""
+    spec = fig.to_json()
+    return hashlib.sha256(f"{CHART_RENDER_VERSION}:{CHART_IMAGE_DPI}:{spec}".encode("utf-8")).hexdigest()
+
+def _chart_cache_path(key):
+    return os.path.join(CACHE_DIR, "charts", f"{key}.png")
+
+def load_chart_cache(key):
+    """Charge depuis le disque l'image déjà rendue d'une figure, ou None"""
+    path = _chart_cache_path(key)
+    try:
+        with open(path, "rb") as f:
+            png = f.read()
+    except OSError:
+        return None
+    touch_cache_file(path)
+    return png
+
+def save_chart_cache(key, png):
+    """Enregistre l'image rendue d'une figure (écriture atomique) puis applique l'éviction du cache"""
+    path = _chart_cache_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(png)
+    os.replace(tmp_path, path)
+    evict_file_cache(os.path.dirname(path), FILE_CACHE_TTL, CHART_CACHE_MAX_BYTES)
+
+def _values(value):
+    """Tableau d'une propriété de trace : liste, ou tableau typé encodé en base64 par Plotly"""
+    if isinstance(value, dict) and "bdata" in value:
+        array = np.frombuffer(base64.b64decode(value["bdata"]), dtype=np.dtype(value["dtype"]))
+        return array.reshape(value["shape"]) if "shape" in value else array
+    return list(value if value is not None else [])
+
+def _axis_suffix(ref):
+    """Suffixe de l'axe de mise en page d'une référence de trace ('x2' -> '2', 'x' -> '')"""
+    return (ref or "x")[1:]
+
+def _paper_to_figure(x_domain, y_domain, width, height, margin):
+    """Rectangle [gauche, bas, largeur, hauteur] en fraction de figure d'un domaine Plotly"""
+    plot_width = width - margin['l'] - margin['r']
+    plot_height = height - margin['t'] - margin['b']
+    left = (margin['l'] + x_domain[0] * plot_width) / width
+    bottom = (margin['b'] + y_domain[0] * plot_height) / height
+    return [left, bottom, (x_domain[1] - x_domain[0]) * plot_width / width, (y_domain[1] - y_domain[0]) * plot_height / height]
+
+def _title_text(title):
+    """Texte d'un titre Plotly (chaîne ou dictionnaire {'text': ...})"""
+    if isinstance(title, dict):
+        return title.get("text") or ""
+    return title or ""
+
+def _trace_color(trace, index):
+    """Couleur d'une trace : couleur explicite du marqueur ou de la ligne, ou couleur suivante du gabarit"""
+    color = (trace.get("marker") or {}).get("color") or (trace.get("line") or {}).get("color")
+    return color if isinstance(color, str) else PLOTLY_COLORWAY[index % len(PLOTLY_COLORWAY)]
+
+def _draw_pie(ax, trace):
+    values = np.asarray(_values(trace.get("values")), dtype=float)
+    labels = list(_values(trace.get("labels")))
+    colors = (trace.get("marker") or {}).get("colors") or [PLOTLY_COLORWAY[i % len(PLOTLY_COLORWAY)] for i in range(len(values))]
+    hole = trace.get("hole") or 0
+    ax.pie(
+        values, labels=labels, colors=colors, autopct="%1.1f%%", startangle=90, counterclock=False,
+        wedgeprops={"width": 1 - hole, "edgecolor": "white"} if hole else {"edgecolor": "white"},
+        textprops={"fontsize": 8}
+    )
+    ax.set_aspect("equal")
+
+def _draw_cartesian(ax, traces, layout, x_suffix, y_suffix):
+    """Dessine les barres et courbes partageant une même paire d'axes"""
+    from matplotlib.ticker import FuncFormatter, MultipleLocator
+    
+    categories = []
+    for _, trace in traces:
+        for value in _values(trace.get("x")):
+            if isinstance(value, str) and value not in categories:
+                categories.append(value)
+    positions = {category: index for index, category in enumerate(categories)}
+    
+    def x_values(trace):
+        x = _values(trace.get("x"))
+        return np.asarray([positions.get(value, value) for value in x], dtype=float)
+    
+    bars = [(index, trace) for index, trace in traces if trace.get("type") == "bar"]
+    grouped = layout.get("barmode", "group") == "group" and len(bars) > 1
+    bar_width = 0.8 / len(bars) if grouped else 0.8
+    
+    for bar_index, (index, trace) in enumerate(bars):
+        offset = (bar_index - (len(bars) - 1) / 2) * bar_width if grouped else 0
+        y = np.asarray(_values(trace.get("y")), dtype=float)
+        ax.bar(x_values(trace) + offset, y, width=bar_width, color=_trace_color(trace, index), label=trace.get("name"), zorder=2)
+    
+    for index, trace in traces:
+        if trace.get("type") != "scatter":
+            continue
+        mode = trace.get("mode") or "lines+markers"
+        y = np.asarray(_values(trace.get("y")), dtype=float)
+        ax.plot(
+            x_values(trace), y, color=_trace_color(trace, index), label=trace.get("name"), zorder=3,
+            linestyle="-" if "lines" in mode else "none", marker="o" if "markers" in mode else None
+        )
+    
+    if categories:
+        # Incliner les libellés seulement s'ils ne tiennent pas à l'horizontale
+        tilted = sum(len(category) for category in categories) > 45
+        ax.set_xticks(range(len(categories)))
+        ax.set_xticklabels(categories, rotation=30 if tilted else 0, ha="right" if tilted else "center")
+    else:
+        # Axe numérique : pas et format des graduations de la mise en page (années entières)
+        x_axis = layout.get(f"xaxis{x_suffix}") or {}
+        if x_axis.get("dtick"):
+            ax.xaxis.set_major_locator(MultipleLocator(float(x_axis["dtick"])))
+        if x_axis.get("tickformat") == "d":
+            ax.xaxis.set_major_formatter(FuncFormatter(lambda value, _: f"{value:.0f}"))
+    # Grands nombres en toutes lettres avec séparateur de milliers (pas de notation 1e6)
+    ax.yaxis.set_major_formatter(FuncFormatter(lambda value, _: f"{value:,.0f}".replace(",", "\u202f") if abs(value) >= 10000 else f"{value:g}"))
+    ax.set_facecolor(PLOT_BACKGROUND)
+    ax.grid(True, axis="y", color="white", linewidth=1, zorder=0)
+    ax.set_axisbelow(True)
+    for spine in ax.spines.values():
+        spine.set_visible(False)
+    ax.tick_params(labelsize=8, length=0)
+    ax.set_xlabel(_title_text((layout.get(f"xaxis{x_suffix}") or {}).get("title")), fontsize=9)
+    ax.set_ylabel(_title_text((layout.get(f"yaxis{y_suffix}") or {}).get("title")), fontsize=9)
+    
+    named = [trace for _, trace in traces if trace.get("name") and trace.get("showlegend", True)]
+    if layout.get("showlegend", len(named) > 1) and len(named) > 1:
+        ax.legend(fontsize=8, frameon=False)
+
+def render_figure(fig_dict, dpi=CHART_IMAGE_DPI):
+    """Rend une figure Plotly (dictionnaire to_dict()) en image PNG avec matplotlib"""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    
+    layout = fig_dict.get("layout", {})
+    width = layout.get("width") or PLOTLY_WIDTH
+    height = layout.get("height") or PLOTLY_HEIGHT
+    margin = {**PLOTLY_MARGIN, **(layout.get("margin") or {})}
+    
+    # API objet de matplotlib (sans pyplot) : sûre dans des threads concurrents
+    figure = Figure(figsize=(width / 100, height / 100), dpi=100, facecolor="white")
+    FigureCanvasAgg(figure)
+    
+    cartesian = {}
+    for index, trace in enumerate(fig_dict.get("data", [])):
+        if trace.get("type") == "pie":
+            domain = trace.get("domain") or {}
+            ax = figure.add_axes(_paper_to_figure(domain.get("x", [0, 1]), domain.get("y", [0, 1]), width, height, margin))
+            _draw_pie(ax, trace)
+        elif trace.get("type") in ("bar", "scatter"):
+            suffix = _axis_suffix(trace.get("xaxis"))
+            cartesian.setdefault(suffix, []).append((index, trace))
+        else:
+            logger.warning("Type de trace non pris en charge dans le PDF: %s", trace.get("type"))
+    
+    for suffix, traces in cartesian.items():
+        x_domain = (layout.get(f"xaxis{suffix}") or {}).get("domain", [0, 1])
+        y_suffix = _axis_suffix((layout.get(f"xaxis{suffix}") or {}).get("anchor", f"y{suffix}"))
+        y_domain = (layout.get(f"yaxis{y_suffix}") or {}).get("domain", [0, 1])
+        ax = figure.add_axes(_paper_to_figure(x_domain, y_domain, width, height, margin))
+        _draw_cartesian(ax, traces, layout, suffix, y_suffix)
+    
+    # Titres des sous-graphiques : annotations positionnées en coordonnées « paper »
+    for annotation in layout.get("annotations", []):
+        if annotation.get("xref") != "paper" or annotation.get("yref") != "paper":
+            continue
+        left, bottom, _, _ = _paper_to_figure([annotation.get("x", 0.5)] * 2, [annotation.get("y", 1)] * 2, width, height, margin)
+        figure.text(left, bottom + 0.01, annotation.get("text", ""), ha="center", va="bottom", fontsize=10)
+    
+    title = _title_text(layout.get("title"))
+    if title:
+        figure.suptitle(title, x=margin['l'] / width, ha="left", y=1 - 0.3 * margin['t'] / height, fontsize=13)
+    
+    buffer = io.BytesIO()
+    # Recadrage sur le contenu : les libellés inclinés ne sont jamais coupés
+    figure.savefig(buffer, format="png", dpi=dpi, bbox_inches="tight", pad_inches=0.1)
+    return buffer.getvalue()
+
+def chart_image(fig):
+    """Image PNG d'une figure Plotly, depuis le cache disque ou rendue puis mise en cache"""
+    key = figure_key(fig)
+    png = load_chart_cache(key)
+    if png is None:
+        png = render_figure(fig.to_dict())
+        save_chart_cache(key, png)
+    return png
+
+@lru_cache(maxsize=None)
+def get_chart_render_pool():
+    """Pool de threads partagé pour le rendu des graphiques"""
+    return ThreadPoolExecutor(max_workers=CHART_RENDER_WORKERS, thread_name_prefix="chart-render")
+
+def render_chart_images(charts_data):
+    """Rend en parallèle les graphiques du rapport ; renvoie {nom: PNG}
+    
+    Un graphique dont le rendu échoue (matplotlib absent, trace non prise en charge)
+    est omis : le PDF est produit sans lui.
+    """
+    charts_data = {name: fig for name, fig in (charts_data or {}).items() if fig is not None}
+    futures = {name: get_chart_render_pool().submit(chart_image, fig) for name, fig in charts_data.items()}
+    images = {}
+    for name, future in futures.items():
+        try:
+            images[name] = future.result()
+        except Exception as e:
+            logger.warning("Rendu du graphique %s impossible: %s", name, e)
+    return images
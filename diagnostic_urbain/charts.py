@@ -0,0 +1,139 @@
+"""Graphiques Plotly du rapport, construits à partir des données saisies pour la ville
+
+La mise en page de chaque graphique (sous-graphiques, titres, styles, traces vides)
+est construite et validée une seule fois par processus ; chaque rendu ne fait
+qu'insérer les tableaux NumPy calculés depuis le formulaire. Plotly est importé
+à la première utilisation.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from .config import HOUSEHOLD_SIZE, INFRASTRUCTURE_TARGETS_2030
+from .projections import PROJECTION_SCENARIOS, PROJECTION_YEARS, project_city
+
+# Taux d'accès équivalent (%) à l'appréciation qualitative du réseau routier
+ROAD_QUALITY_SCORES = {"Très mauvaise": 20, "Mauvaise": 40, "Moyenne": 60, "Bonne": 80, "Très bonne": 95}
+
+# Services de base comparés à leurs objectifs 2030 (%)
+INFRASTRUCTURE_SERVICES = list(INFRASTRUCTURE_TARGETS_2030)
+INFRASTRUCTURE_TARGETS = np.array(list(INFRASTRUCTURE_TARGETS_2030.values()), dtype=float)
+
+SOCIO_INDICATORS = ['Chômage', 'Économie informelle', 'Alphabétisation', 'Accès Internet']
+
+# Couleur des courbes de projection, par scénario
+SCENARIO_COLORS = {"bas": '#00cc96', "médian": '#636efa', "haut": '#EF553B'}
+
+def figure_from_template(template, traces):
+    """Figure Plotly issue d'un gabarit déjà validé, avec les données de chaque trace remplacées
+    
+    Le gabarit a été validé à sa construction et les données sont des tableaux NumPy :
+    la validation Plotly, coûteuse, est sautée (la figure est tout de même copiée).
+    """
+    import plotly.graph_objects as go
+    
+    data = [{**trace, **values} for trace, values in zip(template["data"], traces)]
+    return go.Figure({"data": data, "layout": template["layout"]}, _validate=False)
+
+@lru_cache(maxsize=None)
+def demographic_chart_template():
+    """Gabarit du graphique démographique (quatre sous-graphiques)"""
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+    
+    fig = make_subplots(
+        rows=2, cols=2,
+        subplot_titles=('Répartition par âge', 'Projections démographiques 2025-2050',
+                       'Densité urbaine projetée (hab/km², médian)', 'Indicateurs socio-économiques (%)'),
+        specs=[[{"type": "pie"}, {"type": "scatter"}],
+               [{"type": "scatter"}, {"type": "bar"}]]
+    )
+    fig.add_trace(go.Pie(labels=['0-25 ans', '25 ans et plus'], values=[], name="Âge", showlegend=False), row=1, col=1)
+    # Seules les courbes des scénarios figurent dans la légende
+    for scenario in PROJECTION_SCENARIOS:
+        fig.add_trace(go.Scatter(
+            x=[], y=[], mode='lines', name=f"Scénario {scenario}", line_color=SCENARIO_COLORS[scenario]
+        ), row=1, col=2)
+    fig.add_trace(go.Scatter(x=[], y=[], mode='lines', name="Densité", showlegend=False), row=2, col=1)
+    fig.add_trace(go.Bar(x=SOCIO_INDICATORS, y=[], name="Indicateurs", showlegend=False), row=2, col=2)
+    fig.update_xaxes(dtick=5, tickformat="d", row=1, col=2)
+    fig.update_xaxes(dtick=5, tickformat="d", row=2, col=1)
+    fig.update_layout(height=600, showlegend=True, title_text="Analyse Démographique Complète")
+    return fig.to_dict()
+
+@lru_cache(maxsize=None)
+def infrastructure_chart_template():
+    """Gabarit du graphique des infrastructures (accès actuel et objectifs 2030)"""
+    import plotly.graph_objects as go
+    
+    fig = go.Figure()
+    fig.add_trace(go.Bar(name='Accès actuel (%)', x=INFRASTRUCTURE_SERVICES, y=[], marker_color='lightcoral'))
+    fig.add_trace(go.Bar(name='Objectif 2030 (%)', x=INFRASTRUCTURE_SERVICES, y=INFRASTRUCTURE_TARGETS.tolist(), marker_color='lightblue'))
+    fig.update_layout(
+        title='État des Infrastructures de Base',
+        xaxis_title='Services',
+        yaxis_title='Taux d\'accès (%)',
+        barmode='group',
+        height=400
+    )
+    return fig.to_dict()
+
+@lru_cache(maxsize=None)
+def housing_chart_template():
+    """Gabarit du graphique du logement (statut de l'habitat et besoins)"""
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+    
+    fig = make_subplots(
+        rows=1, cols=2,
+        subplot_titles=("Statut de l'habitat", 'Besoins en logements (unités)'),
+        specs=[[{"type": "pie"}, {"type": "bar"}]]
+    )
+    fig.add_trace(go.Pie(labels=['Habitat formel', 'Habitat informel'], values=[], name="Habitat"), row=1, col=1)
+    fig.add_trace(go.Bar(x=['Déficit déclaré', 'Ménages en habitat informel', "Nouveaux ménages d'ici 2030"], y=[], name="Besoins"), row=1, col=2)
+    fig.update_layout(height=400, showlegend=False)
+    return fig.to_dict()
+
+def create_demographic_chart(form, projection=None):
+    """Crée le graphique démographique de la ville (projections 2025-2050 par scénario)"""
+    projection = projection or project_city(form)
+    median = PROJECTION_SCENARIOS.index("médian")
+    youth = float(form["youth_percentage"])
+    return figure_from_template(demographic_chart_template(), [
+        {"values": np.array([youth, 100 - youth])},
+        *({"x": PROJECTION_YEARS, "y": population.round()} for population in projection["population"]),
+        {"x": PROJECTION_YEARS, "y": projection["density"][median].round()},
+        {"y": np.array([form["unemployment_rate"], form["informal_economy"], form["literacy_rate"], form["internet_access"]], dtype=float)}
+    ])
+
+def create_infrastructure_chart(form):
+    """Crée le graphique d'infrastructure de la ville"""
+    current_access = np.array([
+        form["water_access"], form["electricity_access"], form["sanitation_access"],
+        ROAD_QUALITY_SCORES.get(form["road_quality"], 50), form["internet_access"]
+    ], dtype=float)
+    return figure_from_template(infrastructure_chart_template(), [{"y": current_access}, {}])
+
+def create_housing_analysis_chart(form, projection=None):
+    """Crée le graphique d'analyse du logement de la ville"""
+    projection = projection or project_city(form)
+    median = PROJECTION_SCENARIOS.index("médian")
+    new_households = projection["housing_need"][median, np.searchsorted(PROJECTION_YEARS, 2030)] - form["housing_deficit"]
+    informal = float(form["informal_settlements"])
+    informal_households = form["population"] * informal / 100 / HOUSEHOLD_SIZE
+    return figure_from_template(housing_chart_template(), [
+        {"values": np.array([100 - informal, informal])},
+        {"y": np.array([form["housing_deficit"], informal_households, new_households], dtype=float).round()}
+    ])
+
+def create_report_charts(form, projection=None):
+    """Crée les graphiques du rapport à partir des données du formulaire
+    
+    `projection` (voir projections.project_city) est calculée si elle n'est pas fournie.
+    """
+    projection = projection or project_city(form)
+    return {
+        "demographic_chart": create_demographic_chart(form, projection),
+        "housing_chart": create_housing_analysis_chart(form, projection),
+        "infra_chart": create_infrastructure_chart(form)
+    }
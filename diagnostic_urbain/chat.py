@@ -0,0 +1,340 @@
+"""Chatbot urbain : filtrage des questions, cache des réponses et fenêtre de conversation"""
+import logging
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+
+from .caching import get_llm_cache
+from .config import MESSAGE_OVERHEAD_TOKENS
+from .documents import normalize_text
+from .llm import failed_generation, format_web_sources, select_provider_model, stream_chat_messages
+from .tokens import count_tokens, truncate_to_tokens
+from .web import search_web_info
+
+logger = logging.getLogger(__name__)
+
+# Chatbot : prompt système construit une seule fois, fenêtre de contexte glissante
+CHAT_SYSTEM_PROMPT = """Vous êtes un expert en développement urbain et planification urbaine, spécialisé dans les villes africaines.
+Vous aidez les urbanistes, décideurs et chercheurs avec des analyses précises et des recommandations pratiques.
+
+RÈGLES IMPORTANTES:
+- Répondez UNIQUEMENT aux questions liées à l'urbanisme et au développement urbain
+- Si vous ne connaissez pas une information précise, dites "Je ne connais pas cette information spécifique"
+- Si vous trouvez des informations sur le web, indiquez clairement la source
+- Gardez vos réponses courtes et précises (max 150 mots)
+- Concentrez-vous sur les villes africaines quand c'est pertinent
+
+Vos domaines d'expertise incluent :
+- Planification urbaine et aménagement du territoire
+- Infrastructures urbaines (eau, électricité, transport, assainissement)
+- Habitat et logement social
+- Économie urbaine et développement local
+- Gouvernance urbaine et participation citoyenne
+- Résilience climatique et développement durable
+- Démographie urbaine et migration
+- Services urbains de base
+
+Contexte : Nous travaillons sur un diagnostic urbain pour des villes africaines, notamment Nouakchott en Mauritanie.
+Répondez de manière concise et pratique. Si vous ne connaissez pas une information précise, dites-le clairement."""
+
+CHAT_GREETING = "Bonjour ! Je suis votre assistant IA spécialisé en développement urbain. Comment puis-je vous aider aujourd'hui ?"
+CHAT_OFF_TOPIC = "Je suis spécialisé uniquement dans les questions de développement urbain et de planification urbaine. Pouvez-vous reformuler votre question en lien avec ces domaines ?"
+CHAT_MAX_TOKENS = 200
+CHAT_HISTORY_TOKEN_BUDGET = 1200  # tokens des derniers échanges envoyés à chaque tour
+CHAT_SUMMARY_MAX_TOKENS = 250
+CHAT_SUMMARY_PROMPT = "Résumez la conversation suivante entre un utilisateur et un assistant en urbanisme en moins de 150 mots. Conservez les villes, les chiffres, les questions en suspens et les recommandations déjà données."
+
+# Filtre thématique du chatbot : radicaux cherchés en début de mot dans le texte sans accents
+# (« électricité », « electricite » et « électrique » reconnus ; « eau » ne correspond plus à « beaucoup »).
+# Les radicaux couvrent les formes fléchées : « municipaux », « conseillers », « agglomérations »...
+URBAN_TERMS = [
+    r"vill\w*", r"urbai\w*", r"urbanis\w*", r"agglom\w*", r"infrastructure\w*", r"transport\w*",
+    r"logement\w*", r"eaux?", r"electri\w*", r"gouvernance\w*", r"planifi\w*", r"developpement\w*",
+    r"population\w*", r"habitat\w*", r"assainissement\w*", r"smart cit(?:y|ies)", r"municipa\w*",
+    r"maires?", r"mairies?", r"conseil\w*", r"citoyen\w*", r"services? publics?", r"quartiers?",
+    r"bidonvilles?", r"mobilite\w*", r"amenagement\w*", r"foncier\w*", r"dechets?", r"densite\w*",
+    r"embouteill\w*"
+]
+RECENT_TERMS = [r"recent\w*", r"derni\w*", r"nouve\w*", r"actuel\w*"] + [str(year) for year in range(2024, datetime.now().year + 1)]
+
+# Une seule expression compilée : un passage sur la question détermine les deux décisions
+CHAT_GATE_PATTERN = re.compile(
+    rf"\b(?:(?P<urban>{'|'.join(URBAN_TERMS)})|(?P<recent>{'|'.join(RECENT_TERMS)}))\b"
+)
+
+SUGGESTED_QUESTIONS = [
+    ("🏠 Comment améliorer l'accès au logement décent ?", "Comment améliorer l'accès au logement décent ?"),
+    ("💧 Stratégies pour l'accès à l'eau potable", "Quelles sont les meilleures stratégies pour améliorer l'accès à l'eau potable en milieu urbain africain ?"),
+    ("🚌 Développer le transport public", "Comment développer un système de transport public efficace dans une ville en croissance rapide ?"),
+    ("📊 Interpréter les indicateurs urbains", "Comment interpréter et utiliser les indicateurs urbains pour la prise de décision ?"),
+    ("🌱 Résilience climatique urbaine", "Quelles mesures prendre pour renforcer la résilience climatique d'une ville sahélienne ?"),
+    ("💼 Créer des emplois urbains", "Quelles stratégies pour créer des emplois durables en milieu urbain africain ?")
+]
+SUGGESTED_PROMPTS = frozenset(question for _, question in SUGGESTED_QUESTIONS)
+
+# Cache des réponses du chatbot : correspondance exacte puis quasi-doublons (n-grammes de caractères)
+CHAT_CACHE_TTL = 24 * 3600  # secondes
+CHAT_CACHE_MAX_ENTRIES = 500
+CHAT_CACHE_SIMILARITY = 0.9  # similarité cosinus minimale pour réutiliser une réponse
+CHAT_CACHE_NGRAM = 3  # caractères
+CHAT_CACHE_DIMENSIONS = 2048  # taille des vecteurs de n-grammes hachés
+CHAT_CACHE_TYPO_MIN_LENGTH = 5  # longueur minimale d'un mot pour tolérer une faute de frappe
+
+# Mots sans effet sur le sens d'une question : deux questions proches ne peuvent différer que par eux
+QUESTION_STOPWORDS = frozenset("""
+a au aux avec c ce ces cet cette comment d de des du dans elle elles en est et il ils j je l la le les
+leur leurs me moi mon ma mes n ne nous on ou par peut peuvent pour qu que quel quelle quelles quels qui
+quoi s sa se ses son sont sur t ta te tes ton tu un une vous y svp stp merci
+""".split())
+
+def normalize_question(text):
+    """Forme canonique d'une question : minuscules, sans accents ni ponctuation"""
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", normalize_text(text)).split())
+
+def question_terms(key):
+    """Nombres et mots porteurs de sens d'une question normalisée, triés"""
+    return tuple(sorted(word for word in key.split() if word not in QUESTION_STOPWORDS))
+
+def is_typo(word, other):
+    """Indique si deux mots ne diffèrent que d'une faute de frappe (une lettre ajoutée, omise,
+    remplacée ou deux lettres voisines inversées), hors première lettre et hors nombres
+    
+    « logemnt » et « logement » se correspondent ; « decroissance » et « croissance »,
+    « indecent » et « decent », « 2014 » et « 2024 » ne se correspondent pas.
+    """
+    if min(len(word), len(other)) < CHAT_CACHE_TYPO_MIN_LENGTH or word[0] != other[0]:
+        return False
+    if word.isdigit() or other.isdigit():
+        return False
+    if len(word) == len(other):
+        diffs = [i for i in range(len(word)) if word[i] != other[i]]
+        return len(diffs) == 1 or (
+            len(diffs) == 2 and diffs[1] == diffs[0] + 1
+            and word[diffs[0]] == other[diffs[1]] and word[diffs[1]] == other[diffs[0]]
+        )
+    if abs(len(word) - len(other)) != 1:
+        return False
+    shorter, longer = sorted((word, other), key=len)
+    i = next((i for i in range(len(shorter)) if shorter[i] != longer[i]), len(shorter))
+    return shorter[i:] == longer[i + 1:]
+
+def same_question_terms(terms, other_terms):
+    """Indique si deux questions ont les mêmes nombres et mots porteurs de sens, aux fautes de frappe près"""
+    if len(terms) != len(other_terms):
+        return False
+    remaining = list(other_terms)
+    for word in terms:
+        match = next((other for other in remaining if other == word), None)
+        if match is None:
+            match = next((other for other in remaining if is_typo(word, other)), None)
+        if match is None:
+            return False
+        remaining.remove(match)
+    return True
+
+class ChatAnswerCache:
+    """Cache mémoire thread-safe des réponses du chatbot, avec expiration et éviction LRU
+    
+    Une question est d'abord cherchée sous sa forme normalisée, puis parmi les questions
+    proches : chaque question est représentée par un vecteur normé de n-grammes de
+    caractères hachés, et la similarité avec toutes les entrées est calculée en un seul
+    produit matriciel. Une question proche n'est retenue que si elle a les mêmes nombres
+    et mots porteurs de sens (aux mots vides, accents et fautes de frappe près) : « 2014 »
+    et « 2024 », « urbain » et « rural » ou « décent » et « indécent » restent distincts.
+    """
+    
+    def __init__(self, ttl=CHAT_CACHE_TTL, max_entries=CHAT_CACHE_MAX_ENTRIES, threshold=CHAT_CACHE_SIMILARITY):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # question normalisée -> (réponse, question, expiration, ligne, termes)
+        self._vectors = np.zeros((max_entries, CHAT_CACHE_DIMENSIONS), dtype=np.float32)
+        self._row_keys = [None] * max_entries
+        self._free_rows = list(range(max_entries))
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def vectorize(key):
+        """Vecteur normé des n-grammes de caractères d'une question normalisée"""
+        vector = np.zeros(CHAT_CACHE_DIMENSIONS, dtype=np.float32)
+        padded = f" {key} "
+        for i in range(max(1, len(padded) - CHAT_CACHE_NGRAM + 1)):
+            vector[zlib.crc32(padded[i:i + CHAT_CACHE_NGRAM].encode("utf-8")) % CHAT_CACHE_DIMENSIONS] += 1
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def _remove(self, key):
+        row = self._entries.pop(key)[3]
+        self._vectors[row] = 0
+        self._row_keys[row] = None
+        self._free_rows.append(row)
+    
+    def get(self, question):
+        """Renvoie (réponse, question d'origine, similarité), ou None si aucune question proche n'est en cache"""
+        key = normalize_question(question)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            similarity = 1.0
+            if entry is None and self._entries:
+                # Quasi-doublon : similarité cosinus avec toutes les questions en cache,
+                # puis mêmes termes que la question (du candidat le plus proche au moins proche)
+                scores = self._vectors @ self.vectorize(key)
+                terms = question_terms(key)
+                candidates = np.flatnonzero(scores >= self.threshold)
+                for row in candidates[np.argsort(-scores[candidates], kind="stable")]:
+                    candidate = self._entries[self._row_keys[row]]
+                    if same_question_terms(terms, candidate[4]):
+                        key = self._row_keys[row]
+                        entry = candidate
+                        similarity = float(scores[row])
+                        break
+            
+            if entry is None or entry[2] < now:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            if similarity < 1.0:
+                self.similar_hits += 1
+            else:
+                self.hits += 1
+            return entry[0], entry[1], similarity
+    
+    def set(self, question, answer):
+        """Enregistre la réponse à une question, en évinçant la moins récemment utilisée si besoin"""
+        key = normalize_question(question)
+        vector = self.vectorize(key)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            while len(self._entries) >= self.max_entries:
+                self._remove(next(iter(self._entries)))
+            row = self._free_rows.pop()
+            self._vectors[row] = vector
+            self._row_keys[row] = key
+            self._entries[key] = (answer, question, time.monotonic() + self.ttl, row, question_terms(key))
+    
+    def __len__(self):
+        return len(self._entries)
+
+@lru_cache(maxsize=None)
+def get_chat_answer_cache():
+    """Cache des réponses du chatbot partagé par toutes les sessions du processus"""
+    return ChatAnswerCache()
+
+def classify_question(text):
+    """Renvoie (question liée à l'urbanisme, besoin de données récentes) en un seul passage"""
+    found = {match.lastgroup for match in CHAT_GATE_PATTERN.finditer(normalize_question(text))}
+    return "urban" in found, "recent" in found
+
+def new_chat_memory():
+    """Mémoire de la conversation : résumé des anciens échanges et résumé en cours de calcul"""
+    return {"summary": "", "summarized": 0, "pending": None}
+
+@lru_cache(maxsize=None)
+def get_chat_executor():
+    """Pool de threads partagé pour les résumés de conversation en arrière-plan"""
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="chat-summary")
+
+def build_chat_messages(history, memory, budget=CHAT_HISTORY_TOKEN_BUDGET):
+    """Construit la fenêtre de contexte envoyée au modèle
+    
+    Le prompt système porte le résumé des échanges anciens ; suivent les derniers
+    messages, du plus récent au plus ancien, tant qu'ils tiennent dans `budget`.
+    Renvoie (messages, index du premier message de la fenêtre).
+    """
+    system = CHAT_SYSTEM_PROMPT
+    if memory["summary"]:
+        system += f"\n\nRésumé de la conversation précédente :\n{memory['summary']}"
+    
+    # La question posée est toujours transmise, même si elle dépasse le budget
+    window_start = len(history) - 1
+    remaining = budget - count_tokens(history[-1]["content"])
+    for index in range(len(history) - 2, memory["summarized"] - 1, -1):
+        tokens = count_tokens(history[index]["content"]) + MESSAGE_OVERHEAD_TOKENS // 2
+        if tokens > remaining:
+            break
+        remaining -= tokens
+        window_start = index
+    
+    window = [{"role": message["role"], "content": message["content"]} for message in history[window_start:]]
+    return [{"role": "system", "content": system}] + window, window_start
+
+def summarize_chat_turns(summary, turns, clients, upto):
+    """Intègre des échanges sortis de la fenêtre dans le résumé de la conversation"""
+    transcript = "\n".join(
+        f"{'Utilisateur' if message['role'] == 'user' else 'Assistant'} : {message['content']}" for message in turns
+    )
+    prompt = CHAT_SUMMARY_PROMPT
+    if summary:
+        prompt += f"\n\nRésumé existant :\n{summary}"
+    prompt += f"\n\nNouveaux échanges :\n{truncate_to_tokens(transcript, 2 * CHAT_HISTORY_TOKEN_BUDGET)}"
+    _, response = clients['router'].complete([{"role": "user", "content": prompt}], CHAT_SUMMARY_MAX_TOKENS)
+    return response.choices[0].message.content, upto
+
+def apply_chat_summary(memory):
+    """Intègre le résumé calculé en arrière-plan s'il est prêt"""
+    future = memory["pending"]
+    if future is None or not future.done():
+        return
+    memory["pending"] = None
+    try:
+        memory["summary"], memory["summarized"] = future.result()
+    except Exception:
+        # Les échanges restent hors fenêtre ; le résumé sera retenté au tour suivant
+        pass
+
+def schedule_chat_summary(memory, history, upto, clients):
+    """Lance en arrière-plan le résumé des messages sortis de la fenêtre, pour le tour suivant"""
+    if memory["pending"] is not None or upto <= memory["summarized"]:
+        return
+    turns = [dict(message) for message in history[memory["summarized"]:upto]]
+    memory["pending"] = get_chat_executor().submit(summarize_chat_turns, memory["summary"], turns, clients, upto)
+
+def stream_chat_answer(history, memory, clients, include_Web_Search=False, usage_log=None):
+    """Diffuse la réponse de l'assistant au dernier message de l'historique
+    
+    Le coût de chaque tour est borné : prompt système, résumé et fenêtre de messages
+    récents dans la limite de CHAT_HISTORY_TOKEN_BUDGET, quelle que soit la longueur
+    de la conversation. Le résumé des messages sortis de la fenêtre est calculé en
+    arrière-plan après la réponse et n'allonge donc pas le temps d'attente.
+    """
+    try:
+        provider, model = select_provider_model(clients)
+        if provider is None:
+            yield "Contenu générique - Aucun client IA disponible"
+            return
+        
+        apply_chat_summary(memory)
+        messages, window_start = build_chat_messages(history, memory)
+        
+        web_results = search_web_info(history[-1]["content"]) if include_Web_Search else []
+        if web_results:
+            web_context = "\n".join([f"- {result['snippet']} (Source: {result['url']})" for result in web_results])
+            messages[-1]["content"] += f"\n\nInformations web récentes:\n{web_context}"
+        
+        cache = get_llm_cache() if not include_Web_Search else None
+        yield from stream_chat_messages(messages, clients, model, CHAT_MAX_TOKENS, cache, usage_log, "chatbot")
+        
+        sources = format_web_sources(web_results)
+        if sources:
+            yield sources
+        
+        schedule_chat_summary(memory, history, window_start, clients)
+    
+    except Exception as e:
+        logger.error("Erreur lors de la génération de contenu: %s", e)
+        yield failed_generation(history[-1]["content"])
@@ -0,0 +1,100 @@
+"""Paramètres du moteur de diagnostic urbain"""
+import os
+
+# Dossier racine du projet (caches partagés avec l'application Streamlit et le mode batch)
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Nombre maximal d'appels LLM simultanés lors de la génération du rapport
+MAX_PARALLEL_SECTIONS = 6
+
+# Pools de connexions HTTP des clients LLM (valeurs par défaut, surchargeables dans st.secrets)
+LLM_POOL_DEFAULTS = {
+    "LLM_MAX_CONNECTIONS": 20,
+    "LLM_MAX_KEEPALIVE_CONNECTIONS": 10,
+    "LLM_KEEPALIVE_EXPIRY": 120,  # secondes
+    "LLM_CONNECT_TIMEOUT": 10,  # secondes
+    "LLM_READ_TIMEOUT": 60,  # secondes
+    "LLM_MAX_CONCURRENT_CALLS": 8,  # par fournisseur et par processus
+    "LLM_MAX_TOTAL_CALLS": 0  # tous fournisseurs confondus, par processus (0 : pas de plafond commun)
+}
+
+# Routage des appels LLM : débit, reprises et coupe-circuit (surchargeables dans st.secrets)
+LLM_ROUTER_DEFAULTS = {
+    "GROQ_REQUESTS_PER_MINUTE": 30,
+    "OPENAI_REQUESTS_PER_MINUTE": 60,
+    "LLM_MAX_RETRIES": 4,
+    "LLM_BACKOFF_BASE": 1.0,  # secondes, doublé à chaque reprise
+    "LLM_BACKOFF_MAX": 30,  # secondes
+    "LLM_MAX_QUEUE_WAIT": 5,  # secondes d'attente d'un jeton avant de basculer de fournisseur
+    "LLM_CIRCUIT_FAILURE_THRESHOLD": 5,
+    "LLM_CIRCUIT_RESET_TIMEOUT": 60  # secondes
+}
+
+# Extraction des documents : budget de caractères par document et processus d'extraction
+MAX_DOCUMENT_CHARS = 200000
+MAX_EXTRACTION_WORKERS = min(4, os.cpu_count() or 1)
+DOCUMENT_CACHE_TTL = 24 * 3600  # secondes, niveau mémoire (niveau disque : FILE_CACHE_TTL et DOCUMENT_CACHE_MAX_BYTES)
+
+# Recherche de passages pertinents dans les documents (BM25)
+CHUNK_SIZE = 800  # caractères
+CHUNK_OVERLAP = 150  # caractères
+RETRIEVAL_TOP_K = 6
+DOCUMENT_CONTEXT_BUDGET = 4000  # caractères de documents par prompt
+
+# Cache disque des réponses LLM (partagé entre sessions et processus)
+CACHE_DIR = os.environ.get("DIAGNOSTIC_CACHE_DIR", os.path.join(PROJECT_DIR, ".cache"))
+LLM_CACHE_TTL = 7 * 24 * 3600  # secondes
+LLM_CACHE_MAX_ENTRIES = 2000
+
+# Caches disque en fichiers : expiration, puis éviction des moins récemment utilisés au-delà de la taille maximale
+FILE_CACHE_TTL = 30 * 24 * 3600  # secondes
+DOCUMENT_CACHE_MAX_BYTES = 200 * 1024 * 1024  # textes extraits des documents
+OCR_CACHE_MAX_BYTES = 100 * 1024 * 1024  # texte OCR par page
+CHART_CACHE_MAX_BYTES = 200 * 1024 * 1024  # images PNG des graphiques
+
+# File des rapports générés en arrière-plan (persistée dans SQLite)
+REPORT_JOB_WORKERS = 2  # rapports générés simultanément par processus
+REPORT_JOB_PROGRESS_INTERVAL = 0.5  # secondes minimum entre deux écritures d'une section partielle
+REPORT_JOB_RETENTION = 7 * 24 * 3600  # secondes de conservation des rapports terminés
+
+# Taille moyenne des ménages, pour convertir une population en nombre de logements
+HOUSEHOLD_SIZE = 5.0  # personnes par ménage
+
+# Objectifs de taux d'accès aux services de base à l'horizon 2030 (%)
+INFRASTRUCTURE_TARGETS_2030 = {
+    "Eau potable": 80,
+    "Électricité": 75,
+    "Assainissement": 60,
+    "Routes": 85,
+    "Télécommunications": 90
+}
+
+# Rendu des graphiques Plotly en images pour l'export PDF (matplotlib, sans navigateur)
+CHART_IMAGE_DPI = 150
+CHART_RENDER_WORKERS = 3  # graphiques rendus simultanément
+
+# Cache des données web (Wikipedia) : les pages introuvables sont aussi mises en cache
+WEB_DATA_TTL = 24 * 3600  # secondes
+WEB_DATA_NEGATIVE_TTL = 6 * 3600  # secondes
+
+# API MediaWiki interrogée directement (requêtes concurrentes sans état global de langue)
+WIKIPEDIA_API_URL = "https://{lang}.wikipedia.org/w/api.php"
+WIKIPEDIA_LANGS = ("fr", "en")
+WIKIPEDIA_TIMEOUT = 10  # secondes
+WIKIPEDIA_USER_AGENT = "AfricanCitiesIA/1.0 (diagnostic urbain; Centre of Urban Systems - UM6P)"
+
+# Modèles des fournisseurs LLM
+GROQ_MODEL = "llama-3.1-8b-instant"
+OPENAI_MODEL = "gpt-3.5-turbo"
+PROVIDER_MODELS = {'groq': GROQ_MODEL, 'openai': OPENAI_MODEL}
+
+LLM_TEMPERATURE = 0.7
+
+# Budget de tokens par appel : contexte des modèles et plafond du message utilisateur
+MODEL_CONTEXT_TOKENS = {GROQ_MODEL: 131072, OPENAI_MODEL: 16385}
+DEFAULT_CONTEXT_TOKENS = 8192
+PROMPT_TOKEN_BUDGET = 6000  # plafond coût/latence, y compris la réponse attendue
+MESSAGE_OVERHEAD_TOKENS = 12  # balises de rôle des messages système et utilisateur
+PASSAGE_OVERHEAD_TOKENS = 8  # séparateurs et en-têtes de document par passage
+TOKENIZER_ENCODING = "cl100k_base"
+CHARS_PER_TOKEN_ESTIMATE = 4
@@ -0,0 +1,212 @@
+"""Ingestion des documents techniques : extraction du texte et index de recherche BM25"""
+import hashlib
+import multiprocessing
+import re
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+
+from .caching import TTLCache
+from .config import (
+    CHUNK_OVERLAP, CHUNK_SIZE, DOCUMENT_CACHE_TTL, DOCUMENT_CONTEXT_BUDGET, MAX_DOCUMENT_CHARS,
+    MAX_EXTRACTION_WORKERS, RETRIEVAL_TOP_K
+)
+from .extraction import extract_pdf_text, load_extraction_cache, retry_failed_ocr_pages, save_extraction_cache
+
+@lru_cache(maxsize=None)
+def get_extraction_pool():
+    """Pool de processus partagé pour l'extraction des documents"""
+    # « spawn » évite de dupliquer par fork les threads du serveur (Streamlit, pools)
+    return ProcessPoolExecutor(max_workers=MAX_EXTRACTION_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+@lru_cache(maxsize=None)
+def get_document_cache():
+    """Cache mémoire des textes extraits, partagé par toutes les sessions du processus"""
+    return TTLCache(maxsize=64, ttl=DOCUMENT_CACHE_TTL)
+
+def extract_documents(files, on_extract=None):
+    """Extrait le texte d'une liste de fichiers PDF (nom, contenu binaire)
+    
+    Le texte extrait (OCR compris) est mis en cache par SHA-256 du fichier, en mémoire
+    puis sur disque : un document déjà traité n'est pas relu. Les fichiers restants
+    sont extraits en parallèle dans un pool de processus ; un fichier seul est traité
+    directement pour éviter le coût d'envoi au pool. Un résultat en cache dont des pages
+    OCR ont échoué est repris : seules ces pages sont retentées. `on_extract` reçoit les
+    noms des fichiers à extraire avant l'extraction. Renvoie une entrée par fichier (nom, SHA-256,
+    résultat d'extraction, provenance 'mémoire', 'disque' ou 'extrait', durée).
+    """
+    memory_cache = get_document_cache()
+    entries = []
+    to_extract = []
+    for filename, data in files:
+        start = time.perf_counter()
+        file_hash = hashlib.sha256(data).hexdigest()
+        cache_key = (file_hash, MAX_DOCUMENT_CHARS)
+        
+        result = memory_cache.get(cache_key)
+        cache_status = "mémoire"
+        if result is None:
+            result = load_extraction_cache(file_hash, MAX_DOCUMENT_CHARS)
+            cache_status = "disque"
+            if result is not None:
+                memory_cache.set(cache_key, result)
+        if result is None or result.get('ocr_failed_pages'):
+            cache_status = "extrait"
+            to_extract.append((len(entries), data, result))
+        
+        entries.append({
+            'filename': filename,
+            'sha256': file_hash,
+            'result': result,
+            'cache_status': cache_status,
+            'elapsed': time.perf_counter() - start
+        })
+    
+    if to_extract:
+        if on_extract:
+            on_extract([entries[index]['filename'] for index, _, _ in to_extract])
+        # Extraction complète, ou seulement les pages OCR en échec d'un résultat en cache
+        tasks = [
+            (retry_failed_ocr_pages, (data, previous, MAX_DOCUMENT_CHARS)) if previous else (extract_pdf_text, (data, MAX_DOCUMENT_CHARS))
+            for _, data, previous in to_extract
+        ]
+        if len(tasks) > 1:
+            pool = get_extraction_pool()
+            results = [future.result() for future in [pool.submit(function, *args) for function, args in tasks]]
+        else:
+            results = [tasks[0][0](*tasks[0][1])]
+        
+        for (index, _, _), result in zip(to_extract, results):
+            entry = entries[index]
+            entry['result'] = result
+            entry['elapsed'] += result['elapsed']
+            # Ne pas figer un échec de lecture ; des pages OCR en échec sont notées et seules retentées
+            if not result['error']:
+                memory_cache.set((entry['sha256'], MAX_DOCUMENT_CHARS), result)
+                save_extraction_cache(entry['sha256'], MAX_DOCUMENT_CHARS, result)
+    
+    return entries
+
+# Mots vides ignorés par l'index (français, anglais et consignes récurrentes des prompts)
+STOPWORDS = frozenset("""
+les des une pour par sur dans avec aux est sont qui que quoi dont mais plus moins tres ses son leur leurs
+cette ces cet entre sans sous vers chez comme ainsi aussi etre avoir fait faire peut tout tous toute toutes
+the and for with from that this are was were have has not but into their its
+mots style analyse analysez detaillez redigez professionnel actuellement
+""".split())
+
+# Diacritiques combinants (accents latins) retirés après décomposition NFKD
+COMBINING_MARKS = re.compile("[\u0300-\u036f]")
+
+def normalize_text(text):
+    """Met en minuscules et retire les accents"""
+    return COMBINING_MARKS.sub("", unicodedata.normalize("NFKD", text.lower()))
+
+def tokenize(text):
+    """Découpe un texte normalisé en termes indexables"""
+    return [token for token in re.findall(r"[a-z0-9]{3,}", normalize_text(text)) if token not in STOPWORDS]
+
+def chunk_text(text, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """Découpe un texte en passages de taille bornée, chevauchants, coupés sur des espaces"""
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            cut = text.rfind(" ", start + size // 2, end)
+            end = cut if cut != -1 else end
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+class DocumentIndex:
+    """Index BM25 en mémoire des passages des documents techniques
+    
+    Les poids BM25 sont précalculés par couple (passage, terme) dans des tableaux NumPy
+    triés par terme ; une requête ne fait qu'une recherche dichotomique par terme et une somme.
+    """
+    
+    def __init__(self, documents_content, k1=1.5, b=0.75):
+        self.chunks = []  # (indice du document, nom du fichier, texte)
+        vocabulary = {}
+        rows, cols, counts = [], [], []
+        lengths = []
+        
+        for doc_index, doc in enumerate(documents_content):
+            for chunk in chunk_text(doc['content']):
+                row = len(self.chunks)
+                self.chunks.append((doc_index, doc['filename'], chunk))
+                tokens = tokenize(chunk)
+                lengths.append(len(tokens))
+                term_counts = {}
+                for token in tokens:
+                    term_id = vocabulary.setdefault(token, len(vocabulary))
+                    term_counts[term_id] = term_counts.get(term_id, 0) + 1
+                for term_id, count in term_counts.items():
+                    rows.append(row)
+                    cols.append(term_id)
+                    counts.append(count)
+        
+        self.vocabulary = vocabulary
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        tf = np.asarray(counts, dtype=np.float64)
+        lengths = np.asarray(lengths, dtype=np.float64)
+        
+        n_chunks = len(self.chunks)
+        doc_freq = np.bincount(cols, minlength=len(vocabulary))
+        idf = np.log(1 + (n_chunks - doc_freq + 0.5) / (doc_freq + 0.5))
+        avg_length = lengths.mean() if n_chunks else 1.0
+        norm = k1 * (1 - b + b * lengths / max(avg_length, 1.0))
+        weights = idf[cols] * tf * (k1 + 1) / (tf + norm[rows]) if n_chunks else tf
+        
+        # Trier les postings par terme pour retrouver ceux d'un terme par dichotomie
+        order = np.argsort(cols, kind="stable")
+        self._rows = rows[order]
+        self._cols = cols[order]
+        self._weights = weights[order]
+    
+    def search(self, query, top_k=RETRIEVAL_TOP_K, char_budget=DOCUMENT_CONTEXT_BUDGET):
+        """Renvoie les passages les plus pertinents pour la requête, dans la limite du budget
+        
+        Résultat : liste de (indice du document, nom du fichier, texte), par pertinence décroissante.
+        """
+        term_ids = sorted({self.vocabulary[token] for token in tokenize(query) if token in self.vocabulary})
+        scores = np.zeros(len(self.chunks))
+        for term_id in term_ids:
+            start, end = np.searchsorted(self._cols, [term_id, term_id + 1])
+            np.add.at(scores, self._rows[start:end], self._weights[start:end])
+        
+        selected = []
+        used_chars = 0
+        for row in np.argsort(-scores, kind="stable")[:top_k]:
+            if scores[row] <= 0:
+                break
+            chunk = self.chunks[row]
+            if used_chars + len(chunk[2]) > char_budget:
+                continue
+            selected.append(chunk)
+            used_chars += len(chunk[2])
+        return selected
+
+@lru_cache(maxsize=None)
+def get_document_index_cache():
+    """Index documentaires partagés par toutes les sessions du processus"""
+    return TTLCache(maxsize=16, ttl=DOCUMENT_CACHE_TTL)
+
+def get_document_index(documents_content):
+    """Renvoie l'index BM25 des documents, construit une seule fois par ensemble de fichiers"""
+    cache = get_document_index_cache()
+    cache_key = tuple(doc['sha256'] for doc in documents_content)
+    index = cache.get(cache_key)
+    if index is None:
+        index = DocumentIndex(documents_content)
+        cache.set(cache_key, index)
+    return index
@@ -0,0 +1,211 @@
+"""Extraction du texte des documents PDF
+
+Ce module ne dépend pas de Streamlit : ses fonctions peuvent être exécutées
+dans un pool de processus (elles doivent rester importables et sérialisables).
+"""
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .caching import evict_file_cache, touch_cache_file
+from .config import CACHE_DIR, DOCUMENT_CACHE_MAX_BYTES, FILE_CACHE_TTL, OCR_CACHE_MAX_BYTES
+
+# PyPDF2, pytesseract et pdf2image sont importés à la première extraction :
+# l'application charge ce module au démarrage sans payer leur import
+
+# OCR des pages sans couche texte (documents scannés)
+OCR_LANG = "fra+eng"
+OCR_DPI = 200
+OCR_PAGE_TIMEOUT = 30  # secondes par page (rastérisation et Tesseract)
+OCR_MAX_PAGES = 20
+OCR_WORKERS = min(4, os.cpu_count() or 1)
+
+def _ocr_cache_path(file_hash):
+    return os.path.join(CACHE_DIR, "ocr", f"{file_hash}.json")
+
+def load_ocr_cache(file_hash):
+    """Charge le texte OCR déjà calculé pour un fichier : {numéro de page: texte}"""
+    path = _ocr_cache_path(file_hash)
+    try:
+        with open(path, encoding="utf-8") as f:
+            ocr_texts = {int(page): text for page, text in json.load(f).items()}
+    except (OSError, ValueError):
+        return {}
+    touch_cache_file(path)
+    return ocr_texts
+
+def save_ocr_cache(file_hash, ocr_texts):
+    """Enregistre le texte OCR d'un fichier (écriture atomique) puis applique l'éviction du cache"""
+    path = _ocr_cache_path(file_hash)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(ocr_texts, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    evict_file_cache(os.path.dirname(path), FILE_CACHE_TTL, OCR_CACHE_MAX_BYTES)
+
+def _extraction_cache_path(file_hash, max_chars):
+    return os.path.join(CACHE_DIR, "documents", f"{file_hash}-{max_chars}.json")
+
+def load_extraction_cache(file_hash, max_chars):
+    """Charge depuis le disque le résultat d'extraction d'un fichier, ou None"""
+    path = _extraction_cache_path(file_hash, max_chars)
+    try:
+        with open(path, encoding="utf-8") as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        return None
+    touch_cache_file(path)
+    return result
+
+def save_extraction_cache(file_hash, max_chars, result):
+    """Enregistre sur le disque le résultat d'extraction d'un fichier (écriture atomique)
+    puis applique l'éviction du cache
+    """
+    path = _extraction_cache_path(file_hash, max_chars)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    evict_file_cache(os.path.dirname(path), FILE_CACHE_TTL, DOCUMENT_CACHE_MAX_BYTES)
+
+def ocr_page(pdf_path, page_index):
+    """Rastérise une seule page et la passe dans Tesseract, avec une limite de temps"""
+    import pytesseract
+    from pdf2image import convert_from_path
+    
+    images = convert_from_path(
+        pdf_path, dpi=OCR_DPI, first_page=page_index + 1, last_page=page_index + 1, timeout=OCR_PAGE_TIMEOUT
+    )
+    return pytesseract.image_to_string(images[0], lang=OCR_LANG, timeout=OCR_PAGE_TIMEOUT) if images else ""
+
+def ocr_missing_pages(data, page_indexes, char_budget, result):
+    """OCR des pages sans texte, par lots parallèles et dans l'ordre, jusqu'au budget de caractères
+    
+    Le texte OCR est mis en cache par hash du fichier : un même scan n'est reconnu qu'une fois.
+    Les pages en échec sont ajoutées à result['ocr_failed_pages']. Renvoie {numéro de page: texte}.
+    """
+    file_hash = hashlib.sha256(data).hexdigest()
+    cached = load_ocr_cache(file_hash)
+    ocr_texts = {}
+    new_pages = 0
+    total_chars = 0
+    
+    pending = page_indexes[:OCR_MAX_PAGES]
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as pdf_file:
+        pdf_file.write(data)
+        pdf_file.flush()
+        
+        with ThreadPoolExecutor(max_workers=OCR_WORKERS) as executor:
+            while pending and total_chars < char_budget:
+                batch, pending = pending[:OCR_WORKERS], pending[OCR_WORKERS:]
+                futures = {
+                    page_index: executor.submit(ocr_page, pdf_file.name, page_index)
+                    for page_index in batch if page_index not in cached
+                }
+                for page_index in batch:
+                    if page_index in cached:
+                        text = cached[page_index]
+                    else:
+                        try:
+                            text = futures[page_index].result()
+                        except Exception as e:
+                            # Page en échec ou hors délai : notée pour être seule retentée
+                            result['ocr_error'] = str(e)
+                            result['ocr_failed_pages'].append(page_index)
+                            continue
+                        cached[page_index] = text
+                        new_pages += 1
+                    ocr_texts[page_index] = text
+                    total_chars += len(text) + 1
+    
+    if new_pages:
+        save_ocr_cache(file_hash, cached)
+    result['ocr_pages'] = len(ocr_texts)
+    return ocr_texts
+
+def _finish_extraction(result, page_texts, max_chars):
+    """Assemble le texte des pages dans l'ordre ; conserve le texte par page tant que des
+    pages OCR sont en échec, pour ne retenter qu'elles (voir retry_failed_ocr_pages)
+    """
+    result['text'] = "\n".join(page_texts[index] for index in sorted(page_texts)).strip()[:max_chars]
+    if result['ocr_failed_pages']:
+        result['page_texts'] = {str(index): text for index, text in page_texts.items()}
+    else:
+        result.pop('page_texts', None)
+
+def extract_pdf_text(data, max_chars, ocr=True):
+    """Extrait le texte d'un PDF page par page jusqu'à atteindre le budget de caractères
+    
+    Les pages suivantes ne sont pas lues une fois le budget atteint. Les pages sans
+    couche texte sont ensuite reconnues par OCR si le budget n'est pas atteint.
+    Renvoie un dictionnaire avec le texte, le nombre de pages lues, totales et OCR,
+    les erreurs éventuelles, les pages OCR en échec et la durée d'extraction.
+    """
+    import PyPDF2
+    
+    start = time.perf_counter()
+    result = {
+        'text': "", 'pages_read': 0, 'page_count': 0, 'ocr_pages': 0, 'error': None, 'ocr_error': None,
+        'ocr_failed_pages': []
+    }
+    try:
+        pdf_reader = PyPDF2.PdfReader(io.BytesIO(data))
+        result['page_count'] = len(pdf_reader.pages)
+        
+        # Accumulation par page pour éviter la croissance quadratique des chaînes
+        page_texts = {}
+        missing_pages = []
+        total_chars = 0
+        for page_index, page in enumerate(pdf_reader.pages):
+            page_text = page.extract_text()
+            result['pages_read'] += 1
+            if page_text and page_text.strip():
+                page_texts[page_index] = page_text
+                total_chars += len(page_text) + 1
+            else:
+                missing_pages.append(page_index)
+            if total_chars >= max_chars:
+                break
+        
+        if ocr and missing_pages and total_chars < max_chars:
+            try:
+                page_texts.update(ocr_missing_pages(data, missing_pages, max_chars - total_chars, result))
+            except Exception as e:
+                # Tesseract ou Poppler indisponible : on conserve la couche texte seule
+                result['ocr_error'] = str(e)
+                result['ocr_failed_pages'] = [index for index in missing_pages[:OCR_MAX_PAGES] if index not in page_texts]
+        
+        _finish_extraction(result, page_texts, max_chars)
+    except Exception as e:
+        result['error'] = str(e)
+    result['elapsed'] = time.perf_counter() - start
+    return result
+
+def retry_failed_ocr_pages(data, previous, max_chars):
+    """Relance l'OCR des seules pages en échec d'un résultat d'extraction déjà en cache
+    
+    La couche texte n'est pas relue : le texte des autres pages vient de `previous`.
+    Renvoie un nouveau résultat, de même forme que celui d'extract_pdf_text.
+    """
+    start = time.perf_counter()
+    page_texts = {int(index): text for index, text in previous['page_texts'].items()}
+    result = {**previous, 'ocr_error': None, 'ocr_failed_pages': []}
+    try:
+        used_chars = sum(len(text) + 1 for text in page_texts.values())
+        ocr_texts = ocr_missing_pages(data, previous['ocr_failed_pages'], max_chars - used_chars, result)
+        page_texts.update(ocr_texts)
+        result['ocr_pages'] = previous['ocr_pages'] + len(ocr_texts)
+    except Exception as e:
+        result['ocr_error'] = str(e)
+        result['ocr_failed_pages'] = list(previous['ocr_failed_pages'])
+        result['ocr_pages'] = previous['ocr_pages']
+    
+    _finish_extraction(result, page_texts, max_chars)
+    result['elapsed'] = time.perf_counter() - start
+    return result
@@ -0,0 +1,557 @@
+"""Appels LLM : routage entre fournisseurs, cache des réponses et génération des sections"""
+import logging
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from .caching import LLMResponseCache, get_llm_cache
+from .config import GROQ_MODEL, LLM_TEMPERATURE, MAX_PARALLEL_SECTIONS, OPENAI_MODEL, PROVIDER_MODELS
+from .prompts import SYSTEM_PROMPT, build_enhanced_prompt, prompt_token_budget
+from .tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+class FailedGeneration(str):
+    """Message d'erreur renvoyé à la place du texte d'une génération échouée
+    
+    C'est une chaîne (affichable telle quelle), mais son type signale l'échec :
+    les appelants testent isinstance(texte, FailedGeneration) plutôt que son préfixe.
+    """
+
+def failed_generation(prompt):
+    """Message d'échec de génération pour un prompt"""
+    return FailedGeneration(f"Erreur de génération pour: {prompt[:50]}...")
+
+def error_status(error):
+    """Code HTTP d'une erreur de fournisseur LLM (SDK Groq ou OpenAI), ou None"""
+    for attribute in ("status_code", "http_status"):
+        status = getattr(error, attribute, None)
+        if isinstance(status, int):
+            return status
+    return getattr(getattr(error, "response", None), "status_code", None)
+
+def retry_after_seconds(error):
+    """Délai demandé par l'en-tête Retry-After d'une erreur, ou None"""
+    headers = getattr(error, "headers", None) or getattr(getattr(error, "response", None), "headers", None) or {}
+    value = next((v for k, v in headers.items() if k.lower() == "retry-after"), None)
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return None
+
+def is_retryable(error):
+    """Indique si une erreur est transitoire (limite de débit, surcharge, délai, connexion)"""
+    status = error_status(error)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    # Sans statut HTTP : délai dépassé ou connexion interrompue
+    import httpx
+    import requests
+    return isinstance(error, (TimeoutError, ConnectionError, httpx.TransportError, requests.exceptions.RequestException)) \
+        or any(word in type(error).__name__ for word in ("Timeout", "Connection"))
+
+class TokenBucket:
+    """Limiteur de débit à seau de jetons, partagé par tous les appels vers un fournisseur"""
+    
+    def __init__(self, requests_per_minute, burst=None):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = burst or max(1, requests_per_minute // 2)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+    
+    def acquire(self, timeout=None):
+        """Prend un jeton, en attendant au plus `timeout` secondes ; renvoie False si le délai est dépassé"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                wait = self.paused_until - now
+                if wait <= 0 and self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                if wait <= 0:
+                    wait = (1 - self.tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+    
+    def pause(self, seconds):
+        """Suspend la distribution de jetons (après un 429, pour tous les appels en attente)"""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+class CircuitBreaker:
+    """Coupe-circuit : écarte un fournisseur après plusieurs pannes consécutives
+    
+    Une fois ouvert, un seul appel d'essai est autorisé par période `reset_timeout` ;
+    un succès le referme.
+    """
+    
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+    
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.opened_at = time.monotonic()
+                return True
+            return False
+    
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+class CallSlot:
+    """Créneau de concurrence d'un appel : plafond commun à tous les fournisseurs, puis celui
+    du fournisseur, toujours pris dans cet ordre et rendus ensemble
+    """
+    
+    def __init__(self, *semaphores):
+        self.semaphores = [semaphore for semaphore in semaphores if semaphore is not None]
+    
+    def acquire(self):
+        for semaphore in self.semaphores:
+            semaphore.acquire()
+    
+    def release(self):
+        for semaphore in reversed(self.semaphores):
+            semaphore.release()
+
+class GuardedStream:
+    """Flux de réponse qui libère le créneau de concurrence et informe le coupe-circuit à sa fin"""
+    
+    def __init__(self, response, slot, breaker):
+        self.response = response
+        self.slot = slot
+        self.breaker = breaker
+        self._released = False
+    
+    def __iter__(self):
+        try:
+            for chunk in self.response:
+                yield chunk
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        finally:
+            self.close()
+        self.breaker.record_success()
+    
+    def close(self):
+        if not self._released:
+            self._released = True
+            self.slot.release()
+    
+    def __del__(self):
+        self.close()
+
+class ProviderRouter:
+    """Routage des appels LLM : limitation de débit par fournisseur, reprises avec backoff
+    exponentiel (en respectant Retry-After), coupe-circuit et bascule de Groq vers OpenAI
+    """
+    
+    def __init__(self, clients, settings):
+        self.clients = clients
+        self.providers = [provider for provider in ('groq', 'openai') if provider in clients]
+        self.max_retries = settings["LLM_MAX_RETRIES"]
+        self.backoff_base = settings["LLM_BACKOFF_BASE"]
+        self.backoff_max = settings["LLM_BACKOFF_MAX"]
+        self.max_queue_wait = settings["LLM_MAX_QUEUE_WAIT"]
+        self.read_timeout = settings["LLM_READ_TIMEOUT"]
+        self.buckets = {
+            'groq': TokenBucket(settings["GROQ_REQUESTS_PER_MINUTE"]),
+            'openai': TokenBucket(settings["OPENAI_REQUESTS_PER_MINUTE"])
+        }
+        self.breakers = {
+            provider: CircuitBreaker(settings["LLM_CIRCUIT_FAILURE_THRESHOLD"], settings["LLM_CIRCUIT_RESET_TIMEOUT"])
+            for provider in ('groq', 'openai')
+        }
+        self.concurrency = {
+            provider: threading.BoundedSemaphore(settings["LLM_MAX_CONCURRENT_CALLS"])
+            for provider in ('groq', 'openai')
+        }
+        # Plafond commun : avec les deux clés, le total resterait sinon 2 × LLM_MAX_CONCURRENT_CALLS
+        total_calls = settings["LLM_MAX_TOTAL_CALLS"]
+        self.total_concurrency = threading.BoundedSemaphore(total_calls) if total_calls else None
+    
+    def _create(self, provider, messages, max_tokens, stream):
+        import openai
+        if provider == 'groq':
+            return self.clients['groq'].chat.completions.create(
+                messages=messages,
+                model=GROQ_MODEL,
+                max_tokens=max_tokens,
+                temperature=LLM_TEMPERATURE,
+                stream=stream
+            )
+        return openai.ChatCompletion.create(
+            model=OPENAI_MODEL,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=LLM_TEMPERATURE,
+            stream=stream,
+            request_timeout=self.read_timeout
+        )
+    
+    def _call(self, messages, max_tokens, stream):
+        """Essaie les fournisseurs par ordre de préférence, avec reprises ; renvoie (fournisseur, réponse)
+        
+        Un refus d'authentification (401, 403) n'est pas transitoire : le fournisseur est
+        écarté pour le reste de l'appel, sans reprise ni attente. Si aucun fournisseur
+        n'est utilisable (coupe-circuits ouverts), l'appel échoue aussitôt.
+        """
+        last_error = None
+        rejected = set()
+        for attempt in range(self.max_retries + 1):
+            delay = self.backoff_base * (2 ** attempt)
+            allowed = [
+                provider for provider in self.providers
+                if provider not in rejected and self.breakers[provider].allow()
+            ]
+            if not allowed:
+                # Tous les coupe-circuits ouverts (ou clés refusées) : attendre ne servirait à rien
+                break
+            for index, provider in enumerate(allowed):
+                # Ne pas faire la queue derrière un fournisseur saturé s'il existe une alternative
+                is_last = index == len(allowed) - 1
+                if not self.buckets[provider].acquire(timeout=None if is_last else self.max_queue_wait):
+                    continue
+                
+                slot = CallSlot(self.total_concurrency, self.concurrency[provider])
+                slot.acquire()
+                try:
+                    response = self._create(provider, messages, max_tokens, stream)
+                except Exception as e:
+                    slot.release()
+                    last_error = e
+                    status = error_status(e)
+                    if status == 429:
+                        # Limite de débit : pause du fournisseur, sans compter comme une panne
+                        wait = retry_after_seconds(e)
+                        self.buckets[provider].pause(wait if wait is not None else delay)
+                        delay = max(delay, wait or 0)
+                    elif status in (401, 403):
+                        # Clé refusée : bascule immédiate vers le fournisseur suivant
+                        rejected.add(provider)
+                        self.breakers[provider].record_failure()
+                    elif is_retryable(e):
+                        self.breakers[provider].record_failure()
+                    else:
+                        # Requête invalide : inutile de réessayer ailleurs
+                        raise
+                    continue
+                
+                if stream:
+                    return provider, GuardedStream(response, slot, self.breakers[provider])
+                slot.release()
+                self.breakers[provider].record_success()
+                return provider, response
+            
+            if rejected.issuperset(self.providers):
+                break
+            if attempt < self.max_retries:
+                time.sleep(min(self.backoff_max, delay) * random.uniform(0.8, 1.2))
+        
+        if last_error is not None:
+            raise last_error
+        raise RuntimeError("Aucun fournisseur LLM disponible (coupe-circuit ouvert)")
+    
+    def complete(self, messages, max_tokens):
+        """Appel bloquant ; renvoie (modèle, réponse)"""
+        provider, response = self._call(messages, max_tokens, stream=False)
+        return PROVIDER_MODELS[provider], response
+    
+    def open_stream(self, messages, max_tokens):
+        """Ouvre un flux de réponse ; renvoie (fournisseur, modèle, flux)
+        
+        La bascule vers un autre fournisseur n'est possible qu'avant le premier fragment.
+        """
+        provider, response = self._call(messages, max_tokens, stream=True)
+        return provider, PROVIDER_MODELS[provider], response
+
+def build_ai_clients(openai_api_key, groq_api_key, pool_settings):
+    """Construit les clients IA et leurs pools de connexions HTTP
+    
+    À appeler une seule fois par processus (l'application la met en cache avec
+    st.cache_resource) : les connexions et sessions TLS sont alors partagées par
+    toutes les sessions. Le routeur associé borne les appels simultanés, limite le débit
+    et bascule d'un fournisseur à l'autre en cas d'échec.
+    """
+    import httpx
+    import openai
+    import requests
+    from groq import Groq
+    
+    clients = {}
+    
+    # OpenAI
+    if openai_api_key:
+        openai.api_key = openai_api_key
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_settings["LLM_MAX_KEEPALIVE_CONNECTIONS"],
+            pool_maxsize=pool_settings["LLM_MAX_CONNECTIONS"]
+        )
+        session.mount("https://", adapter)
+        openai.requestssession = session
+        clients['openai'] = True
+    
+    # Groq
+    if groq_api_key:
+        http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=pool_settings["LLM_MAX_CONNECTIONS"],
+                max_keepalive_connections=pool_settings["LLM_MAX_KEEPALIVE_CONNECTIONS"],
+                keepalive_expiry=pool_settings["LLM_KEEPALIVE_EXPIRY"]
+            ),
+            timeout=httpx.Timeout(pool_settings["LLM_READ_TIMEOUT"], connect=pool_settings["LLM_CONNECT_TIMEOUT"])
+        )
+        # Les reprises sont gérées par le routeur (backoff partagé, bascule de fournisseur)
+        clients['groq'] = Groq(api_key=groq_api_key, http_client=http_client, max_retries=0)
+    
+    clients['router'] = ProviderRouter(clients, pool_settings)
+    return clients
+
+def select_provider_model(clients):
+    """Renvoie le fournisseur et le modèle utilisés pour les appels LLM"""
+    if 'groq' in clients:
+        return 'groq', GROQ_MODEL
+    if 'openai' in clients:
+        return 'openai', OPENAI_MODEL
+    return None, None
+
+def record_usage(usage_log, label, model, prompt_tokens, completion_tokens, source, elapsed):
+    """Enregistre la consommation de tokens d'un appel LLM dans le journal fourni"""
+    if usage_log is None:
+        return
+    usage_log.append({
+        "section": label or "-",
+        "modèle": model,
+        "tokens prompt": prompt_tokens,
+        "tokens réponse": completion_tokens,
+        "source": source,
+        "durée (s)": round(elapsed, 2)
+    })
+
+def format_web_sources(web_results):
+    """Formate la mention des sources web consultées"""
+    if not web_results:
+        return ""
+    return f"\n\n📍 *Sources web consultées: {', '.join([r['url'] for r in web_results])}"
+
+def generate_enhanced_content_with_docs_and_web(prompt, clients, documents_content=None, web_data=None, max_tokens=800, include_Web_Search=False, stream=False, use_cache=True, usage_log=None, label=None):
+    """Génère du contenu enrichi en incluant les documents uploadés ET les données web
+    
+    Avec stream=True, renvoie un générateur de fragments de texte au fur et à mesure
+    de leur arrivée ; leur concaténation est identique au texte du mode bloquant.
+    Les réponses sont servies depuis le cache LLM quand le prompt final est identique,
+    sauf si une recherche web fraîche est demandée. Si `usage_log` est une liste, la
+    consommation de tokens de l'appel y est ajoutée sous l'étiquette `label`.
+    """
+    if stream:
+        return stream_enhanced_content_with_docs_and_web(prompt, clients, documents_content, web_data, max_tokens, include_Web_Search, use_cache, usage_log, label)
+    
+    try:
+        start = time.perf_counter()
+        provider, model = select_provider_model(clients)
+        if provider is None:
+            return "Contenu générique - Aucun client IA disponible"
+        
+        enhanced_prompt, web_results = build_enhanced_prompt(
+            prompt, documents_content, web_data, include_Web_Search, prompt_token_budget(model, max_tokens)
+        )
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": enhanced_prompt}
+        ]
+        
+        cache = get_llm_cache() if use_cache and not include_Web_Search else None
+        cache_key = LLMResponseCache.make_key(messages, model, max_tokens, LLM_TEMPERATURE)
+        content = cache.get(cache_key) if cache else None
+        
+        if content is None:
+            # Le modèle effectif peut différer du modèle principal en cas de bascule ; la réponse
+            # est rangée sous la clé lue (modèle principal) pour être resservie au prochain appel
+            model, response = clients['router'].complete(messages, max_tokens)
+            content = response.choices[0].message.content
+            if cache:
+                cache.set(cache_key, content)
+            
+            usage = getattr(response, "usage", None)
+            if usage:
+                record_usage(usage_log, label, model, usage.prompt_tokens, usage.completion_tokens, "api", time.perf_counter() - start)
+            else:
+                record_usage(usage_log, label, model, count_tokens(SYSTEM_PROMPT + enhanced_prompt), count_tokens(content), "estimé", time.perf_counter() - start)
+        else:
+            record_usage(usage_log, label, model, count_tokens(SYSTEM_PROMPT + enhanced_prompt), count_tokens(content), "cache", time.perf_counter() - start)
+        
+        # Ajouter la source si recherche web
+        return content + format_web_sources(web_results)
+            
+    except Exception as e:
+        logger.error("Erreur lors de la génération de contenu: %s", e)
+        return failed_generation(prompt)
+
+def stream_chat_messages(messages, clients, model, max_tokens, cache=None, usage_log=None, label=None):
+    """Diffuse la réponse à une liste de messages, depuis le cache LLM ou l'API via le routeur"""
+    start = time.perf_counter()
+    prompt_text = "".join(message["content"] for message in messages)
+    cache_key = LLMResponseCache.make_key(messages, model, max_tokens, LLM_TEMPERATURE)
+    cached = cache.get(cache_key) if cache else None
+    
+    if cached is not None:
+        record_usage(usage_log, label, model, count_tokens(prompt_text), count_tokens(cached), "cache", time.perf_counter() - start)
+        yield cached
+        return
+    
+    parts = []
+    usage = None
+    # Bascule possible jusqu'à l'ouverture du flux ; le créneau de concurrence est tenu jusqu'à sa fin
+    provider, model, response = clients['router'].open_stream(messages, max_tokens)
+    for chunk in response:
+        if provider == 'groq':
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                yield parts[-1]
+            # Groq joint la consommation au dernier fragment du flux
+            x_groq = getattr(chunk, "x_groq", None)
+            if x_groq is not None and getattr(x_groq, "usage", None):
+                usage = x_groq.usage
+        else:
+            delta = chunk.choices[0].get("delta", {}).get("content") if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                yield delta
+    
+    content = "".join(parts)
+    # Ne mettre en cache que les réponses complètes, sous la clé lue même après une bascule
+    if cache:
+        cache.set(cache_key, content)
+    
+    if usage:
+        record_usage(usage_log, label, model, usage.prompt_tokens, usage.completion_tokens, "api", time.perf_counter() - start)
+    else:
+        record_usage(usage_log, label, model, count_tokens(prompt_text), count_tokens(content), "estimé", time.perf_counter() - start)
+
+def stream_enhanced_content_with_docs_and_web(prompt, clients, documents_content=None, web_data=None, max_tokens=800, include_Web_Search=False, use_cache=True, usage_log=None, label=None):
+    """Génère les fragments de texte renvoyés par les API de streaming Groq ou OpenAI
+    
+    En cas d'échec, le dernier fragment est un FailedGeneration : le texte déjà reçu
+    est incomplet et doit être remplacé par ce message.
+    """
+    try:
+        provider, model = select_provider_model(clients)
+        if provider is None:
+            yield "Contenu générique - Aucun client IA disponible"
+            return
+        
+        enhanced_prompt, web_results = build_enhanced_prompt(
+            prompt, documents_content, web_data, include_Web_Search, prompt_token_budget(model, max_tokens)
+        )
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": enhanced_prompt}
+        ]
+        
+        cache = get_llm_cache() if use_cache and not include_Web_Search else None
+        yield from stream_chat_messages(messages, clients, model, max_tokens, cache, usage_log, label)
+        
+        sources = format_web_sources(web_results)
+        if sources:
+            yield sources
+    
+    except Exception as e:
+        logger.error("Erreur lors de la génération de contenu: %s", e)
+        yield failed_generation(prompt)
+
+def generate_enhanced_content_with_docs(prompt, clients, documents_content=None, max_tokens=800):
+    """Génère du contenu enrichi avec gestion des limites (fonction de compatibilité)"""
+    return generate_enhanced_content_with_docs_and_web(prompt, clients, documents_content, None, max_tokens)
+
+def generate_enhanced_content(prompt, clients, max_tokens=800):
+    """Génère du contenu enrichi avec gestion des limites (fonction de compatibilité)"""
+    return generate_enhanced_content_with_docs_and_web(prompt, clients, None, None, max_tokens)
+
+def generate_sections_parallel(section_prompts, clients, documents_content=None, web_data=None, on_section_done=None, on_section_progress=None, max_workers=MAX_PARALLEL_SECTIONS, usage_log=None):
+    """Génère les sections indépendantes du rapport en parallèle via un pool de threads borné
+    
+    Les rappels on_section_progress (texte partiel, mode streaming) et on_section_done
+    (texte final) sont exécutés dans le thread appelant. Le texte final d'une section
+    en échec est un FailedGeneration, sans le texte partiel reçu avant l'erreur.
+    """
+    results = {}
+    updates = queue.Queue()
+    stream = on_section_progress is not None
+    
+    def generate_section(key, prompt, max_tokens):
+        content = failed_generation(prompt)
+        try:
+            if stream:
+                parts = []
+                for chunk in generate_enhanced_content_with_docs_and_web(prompt, clients, documents_content, web_data, max_tokens, stream=True, usage_log=usage_log, label=key):
+                    if isinstance(chunk, FailedGeneration):
+                        # Flux interrompu : le texte partiel est abandonné
+                        content = chunk
+                        break
+                    parts.append(chunk)
+                    updates.put((key, "".join(parts), False))
+                else:
+                    content = "".join(parts)
+            else:
+                content = generate_enhanced_content_with_docs_and_web(prompt, clients, documents_content, web_data, max_tokens, usage_log=usage_log, label=key)
+        finally:
+            updates.put((key, content, True))
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for key, (prompt, max_tokens) in section_prompts.items():
+            executor.submit(generate_section, key, prompt, max_tokens)
+        
+        # Les sections sont transmises dès qu'elles progressent ou se terminent
+        pending = len(section_prompts)
+        while pending:
+            batch = [updates.get()]
+            while not updates.empty():
+                batch.append(updates.get_nowait())
+            
+            # Ne rendre que le dernier état de chaque section pour limiter les rafraîchissements
+            partial = {}
+            for key, text, done in batch:
+                if done:
+                    results[key] = text
+                    pending -= 1
+                    if on_section_done:
+                        on_section_done(key, text)
+                else:
+                    partial[key] = text
+            for key, text in partial.items():
+                if key not in results:
+                    on_section_progress(key, text)
+    
+    # Restituer les sections dans l'ordre du document
+    return {key: results[key] for key in section_prompts}
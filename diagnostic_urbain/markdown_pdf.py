@@ -0,0 +1,183 @@
+"""Conversion du Markdown des sections LLM en flowables ReportLab
+
+Le texte est converti en HTML par le paquet markdown, puis traduit bloc par bloc
+(paragraphes, titres, listes, citations, code) en balisage de paragraphe ReportLab
+échappé et toujours équilibré. La conversion est mémorisée par texte de section :
+régénérer le PDF d'un rapport déjà converti ne refait pas l'analyse.
+"""
+import html
+import re
+from functools import lru_cache
+from html.parser import HTMLParser
+from xml.sax.saxutils import escape, quoteattr
+
+# Nombre de textes de section dont la conversion est conservée en mémoire
+MARKDOWN_CACHE_SIZE = 512
+
+# Balises en ligne traduites en balisage ReportLab (les autres ne gardent que leur texte)
+INLINE_TAGS = {
+    "strong": ("<b>", "</b>"),
+    "b": ("<b>", "</b>"),
+    "em": ("<i>", "</i>"),
+    "i": ("<i>", "</i>"),
+    "u": ("<u>", "</u>"),
+    "del": ("<strike>", "</strike>"),
+    "s": ("<strike>", "</strike>"),
+    "code": ('<font face="Courier">', "</font>")
+}
+
+HEADING_TAGS = ("h1", "h2", "h3", "h4", "h5", "h6")
+
+# Sauts de ligne en fin de bloc, éventuellement suivis de balises fermantes
+TRAILING_BREAKS = re.compile(r"(?:<br/>\s*)+((?:</\w+>)*)$")
+
+def closing_tag(tag):
+    """Balise ReportLab fermant une balise en ligne ouverte (liens compris)"""
+    return "</a>" if tag == "a" else INLINE_TAGS[tag][1]
+
+class MarkdownBlockParser(HTMLParser):
+    """Découpe le HTML produit par markdown en blocs (type, balisage, profondeur, puce)
+    
+    Le texte est ré-échappé et les balises en ligne sont refermées en fin de bloc :
+    une balise orpheline du texte du LLM ne peut pas casser la construction du PDF.
+    """
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks = []
+        self.parts = []
+        self.open_inline = []
+        self.lists = []  # pile des listes ouvertes : [balise, numéro de l'élément courant]
+        self.kind = "paragraph"
+        self.quote_depth = 0
+        self.in_pre = False
+    
+    def flush(self):
+        """Termine le bloc courant en refermant les balises en ligne restées ouvertes"""
+        markup = "".join(self.parts).strip()
+        markup += "".join(closing_tag(tag) for tag in reversed(self.open_inline))
+        markup = TRAILING_BREAKS.sub(r"\1", markup)
+        if markup:
+            depth = len(self.lists)
+            bullet = None
+            if self.kind == "bullet":
+                tag, number = self.lists[-1]
+                bullet = f"{number}." if tag == "ol" else "•"
+            kind = "quote" if self.quote_depth and self.kind == "paragraph" else self.kind
+            self.blocks.append((kind, markup, depth, bullet))
+        self.parts = []
+        self.open_inline = []
+        self.kind = "bullet" if self.lists else "paragraph"
+    
+    def handle_starttag(self, tag, attrs):
+        if tag in INLINE_TAGS:
+            self.open_inline.append(tag)
+            self.parts.append(INLINE_TAGS[tag][0])
+        elif tag == "a":
+            href = dict(attrs).get("href")
+            if href:
+                self.open_inline.append("a")
+                self.parts.append(f"<a href={quoteattr(href)} color=\"blue\">")
+        elif tag == "br":
+            self.parts.append("<br/>")
+        elif tag in ("ul", "ol"):
+            # Une sous-liste termine le texte de l'élément parent
+            self.flush()
+            self.lists.append([tag, 0])
+            self.kind = "bullet"
+        elif tag == "li":
+            self.flush()
+            if self.lists:
+                self.lists[-1][1] += 1
+            self.kind = "bullet" if self.lists else "paragraph"
+        elif tag in HEADING_TAGS:
+            self.flush()
+            self.kind = "heading"
+        elif tag == "pre":
+            self.flush()
+            self.kind = "code"
+            self.in_pre = True
+        elif tag == "blockquote":
+            self.flush()
+            self.quote_depth += 1
+        elif tag == "p":
+            # Dans un élément de liste, les paragraphes restent dans le même bloc
+            if self.lists and self.parts:
+                self.parts.append("<br/>")
+            elif not self.lists:
+                self.flush()
+        elif tag == "hr":
+            self.flush()
+    
+    def handle_endtag(self, tag):
+        if tag in INLINE_TAGS or tag == "a":
+            # Ignorer une fermeture sans ouverture (balisage mal formé)
+            if tag in self.open_inline:
+                while self.open_inline:
+                    open_tag = self.open_inline.pop()
+                    self.parts.append(closing_tag(open_tag))
+                    if open_tag == tag:
+                        break
+        elif tag in ("ul", "ol"):
+            self.flush()
+            if self.lists:
+                self.lists.pop()
+            self.kind = "bullet" if self.lists else "paragraph"
+        elif tag in HEADING_TAGS or tag == "pre":
+            self.flush()
+            self.in_pre = False
+        elif tag == "blockquote":
+            self.flush()
+            self.quote_depth = max(0, self.quote_depth - 1)
+        elif tag == "p" and not self.lists:
+            self.flush()
+    
+    def handle_data(self, data):
+        # Le code est échappé une fois de plus par markdown : revenir au texte source
+        if self.in_pre or "code" in self.open_inline:
+            data = html.unescape(data)
+        if self.in_pre:
+            self.parts.append(escape(data).replace("\n", "<br/>"))
+        else:
+            # Les sauts de ligne significatifs sont déjà des <br /> (extension nl2br)
+            self.parts.append(escape(" ".join(data.split("\n"))))
+    
+    def close(self):
+        super().close()
+        self.flush()
+
+@lru_cache(maxsize=MARKDOWN_CACHE_SIZE)
+def markdown_blocks(text):
+    """Convertit un texte Markdown en blocs (type, balisage ReportLab, profondeur de liste, puce)
+    
+    Types : 'paragraph', 'heading', 'bullet', 'quote', 'code'. Le HTML brut éventuel
+    du texte est affiché tel quel (échappé) plutôt qu'interprété.
+    """
+    import markdown
+    
+    # Échapper le HTML brut avant la conversion ; « > » reste permis pour les citations
+    source = text.replace("&", "&amp;").replace("<", "&lt;")
+    rendered = markdown.markdown(source, extensions=["nl2br", "sane_lists"])
+    parser = MarkdownBlockParser()
+    parser.feed(rendered)
+    parser.close()
+    return tuple(parser.blocks)
+
+def markdown_flowables(text, styles):
+    """Flowables ReportLab d'un texte Markdown
+    
+    `styles` fournit 'body', 'subheading', 'quote', 'code' et 'bullets' (un style
+    par niveau d'imbrication des listes).
+    """
+    from reportlab.platypus import Paragraph
+    
+    flowables = []
+    for kind, markup, depth, bullet in markdown_blocks(text):
+        if kind == "bullet":
+            style = styles["bullets"][min(depth, len(styles["bullets"])) - 1]
+            flowables.append(Paragraph(markup, style, bulletText=bullet))
+        elif kind == "heading":
+            flowables.append(Paragraph(markup, styles["subheading"]))
+        else:
+            flowables.append(Paragraph(markup, styles.get(kind, styles["body"])))
+    return flowables
@@ -0,0 +1,287 @@
+"""Export PDF du rapport (ReportLab est importé à la première utilisation)"""
+import io
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import nullcontext
+from datetime import datetime
+from functools import lru_cache
+
+from xml.sax.saxutils import escape
+
+from .chart_images import render_chart_images
+from .markdown_pdf import markdown_flowables
+
+# Écriture en flux : taille des blocs renvoyés et seuil de débordement du tampon sur disque
+PDF_CHUNK_SIZE = 64 * 1024  # octets
+PDF_SPOOL_MAX_SIZE = 1024 * 1024  # octets
+
+# tracemalloc agit sur tout le processus : les constructions mesurées passent une à une
+PDF_MEMORY_LOCK = threading.Lock()
+
+# Légendes des graphiques insérés dans la section 6, dans l'ordre du rapport
+CHART_CAPTIONS = {
+    "demographic_chart": "Figure 1 - Analyse démographique",
+    "housing_chart": "Figure 2 - Statut de l'habitat et besoins en logements",
+    "infra_chart": "Figure 3 - État des infrastructures de base"
+}
+
+def chart_flowables(chart_images, max_width, body_style, caption_style):
+    """Images des graphiques (largeur du cadre, proportions conservées) suivies de leur légende"""
+    from reportlab.lib.utils import ImageReader
+    from reportlab.platypus import Image as RLImage, KeepTogether, Paragraph
+    
+    if not chart_images:
+        return [Paragraph("Les graphiques détaillés sont présentés dans l'interface web interactive.", body_style)]
+    
+    flowables = []
+    for name, png in chart_images.items():
+        image_width, image_height = ImageReader(io.BytesIO(png)).getSize()
+        height = max_width * image_height / image_width
+        # Garder l'image et sa légende sur la même page
+        flowables.append(KeepTogether([
+            RLImage(io.BytesIO(png), width=max_width, height=height),
+            Paragraph(CHART_CAPTIONS.get(name, name), caption_style)
+        ]))
+    flowables.append(Paragraph("Les versions interactives de ces graphiques sont disponibles dans l'interface web.", body_style))
+    return flowables
+
+@lru_cache(maxsize=None)
+def get_pdf_styles():
+    """Styles de paragraphe du rapport, construits une seule fois par processus"""
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    
+    styles = getSampleStyleSheet()
+    return {
+        'title': ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=24,
+            spaceAfter=30,
+            alignment=TA_CENTER,
+            textColor=colors.HexColor('#1f4e79')
+        ),
+        'section': ParagraphStyle(
+            'SectionHeader',
+            parent=styles['Heading2'],
+            fontSize=16,
+            spaceAfter=12,
+            spaceBefore=20,
+            textColor=colors.HexColor('#2c5aa0')
+        ),
+        'body': ParagraphStyle(
+            'BodyText',
+            parent=styles['Normal'],
+            fontSize=11,
+            spaceAfter=12,
+            alignment=TA_JUSTIFY,
+            leading=14
+        ),
+        'caption': ParagraphStyle(
+            'Caption',
+            parent=styles['Normal'],
+            fontSize=9,
+            spaceAfter=18,
+            alignment=TA_CENTER,
+            textColor=colors.HexColor('#555555')
+        ),
+        'subheading': ParagraphStyle(
+            'SubHeader',
+            parent=styles['Heading3'],
+            fontSize=13,
+            spaceBefore=10,
+            spaceAfter=6,
+            textColor=colors.HexColor('#2c5aa0')
+        ),
+        # Un style par niveau d'imbrication des listes
+        'bullets': tuple(
+            ParagraphStyle(
+                f'Bullet{level}',
+                parent=styles['Normal'],
+                fontSize=11,
+                leading=14,
+                spaceAfter=4,
+                leftIndent=18 * level,
+                bulletIndent=18 * level - 12
+            )
+            for level in (1, 2, 3)
+        ),
+        'quote': ParagraphStyle(
+            'Quote',
+            parent=styles['Normal'],
+            fontSize=11,
+            leading=14,
+            spaceAfter=12,
+            leftIndent=24,
+            fontName='Helvetica-Oblique',
+            textColor=colors.HexColor('#444444')
+        ),
+        'code': ParagraphStyle(
+            'Code',
+            parent=styles['Normal'],
+            fontSize=9,
+            leading=11,
+            spaceAfter=12,
+            leftIndent=12,
+            backColor=colors.HexColor('#f4f4f4')
+        ),
+        'toc': ParagraphStyle(
+            'TOCEntry',
+            parent=styles['Normal'],
+            fontSize=12,
+            leading=18,
+            leftIndent=0,
+            firstLineIndent=0
+        )
+    }
+
+@lru_cache(maxsize=None)
+def get_report_template_class():
+    """Gabarit de document qui référence chaque titre de section dans la table des matières"""
+    from reportlab.platypus import SimpleDocTemplate
+    
+    class ReportDocTemplate(SimpleDocTemplate):
+        """Gabarit du rapport : entrées de sommaire et signets PDF aux titres de section"""
+        
+        def afterFlowable(self, flowable):
+            """Enregistre la page réelle de chaque titre de section (passes de multiBuild)"""
+            toc_key = getattr(flowable, 'toc_key', None)
+            if toc_key is None:
+                return
+            text = flowable.getPlainText()
+            self.canv.bookmarkPage(toc_key)
+            self.canv.addOutlineEntry(text, toc_key, level=0)
+            # Le sommaire réinterprète le texte comme balisage : le ré-échapper
+            self.notify('TOCEntry', (0, escape(text), self.page, toc_key))
+    
+    return ReportDocTemplate
+
+def draw_page_footer(canvas, doc):
+    """Numéro de page en pied de page (hors page de titre)"""
+    canvas.saveState()
+    canvas.setFont('Helvetica', 8)
+    canvas.drawRightString(doc.pagesize[0] - doc.rightMargin, 10, f"Page {doc.page}")
+    canvas.restoreState()
+
+def section_heading(title, toc_key, style):
+    """Titre de section référencé dans la table des matières et les signets"""
+    from reportlab.platypus import Paragraph
+    
+    heading = Paragraph(title, style)
+    heading.toc_key = toc_key
+    return heading
+
+def build_report_story(city_name, report_data, chart_images, frame_width):
+    """Construit la suite de flowables du rapport (page de titre, sommaire, sections, annexes)"""
+    from reportlab.platypus import Paragraph, Spacer, PageBreak
+    from reportlab.platypus.tableofcontents import TableOfContents
+    
+    styles = get_pdf_styles()
+    story = []
+    
+    # Page de titre
+    story.append(Paragraph("DIAGNOSTIC URBAIN INTELLIGENT", styles['title']))
+    story.append(Paragraph(f"Ville de {escape(city_name)}", styles['title']))
+    story.append(Spacer(1, 50))
+    story.append(Paragraph(f"Rapport généré le {datetime.now().strftime('%d/%m/%Y à %H:%M')}", styles['body']))
+    story.append(Paragraph("UrbanAI Diagnostic Platform", styles['body']))
+    story.append(PageBreak())
+    
+    # Table des matières : numéros de page réels, calculés par les passes de multiBuild
+    story.append(Paragraph("TABLE DES MATIÈRES", styles['section']))
+    toc = TableOfContents()
+    toc.levelStyles = [styles['toc']]
+    toc.dotsMinLevel = 0
+    story.append(toc)
+    story.append(PageBreak())
+    
+    # Contenu des sections
+    sections = [
+        ("1. RÉSUMÉ EXÉCUTIF", report_data.get('executive_summary', '')),
+        ("2. CONTEXTE DÉMOGRAPHIQUE ET SOCIAL", report_data.get('demographic_context', '')),
+        ("3. ANALYSE DE L'HABITAT ET DES INFRASTRUCTURES", report_data.get('housing_analysis', '')),
+        ("4. DÉFIS ET OPPORTUNITÉS IDENTIFIÉS", report_data.get('challenges', '')),
+        ("5. RECOMMANDATIONS STRATÉGIQUES", report_data.get('recommendations', '')),
+        ("6. GRAPHIQUES ET VISUALISATIONS", None),
+        ("7. CONCLUSION PROSPECTIVE", report_data.get('conclusion', ''))
+    ]
+    
+    for index, (section_title, content) in enumerate(sections):
+        story.append(section_heading(section_title, f"section-{index}", styles['section']))
+        if content is None:
+            story.extend(chart_flowables(chart_images, frame_width, styles['body'], styles['caption']))
+        else:
+            story.extend(markdown_flowables(content, styles))
+        story.append(Spacer(1, 20))
+    
+    # Annexes éventuelles : [{'title': ..., 'content': Markdown}], une nouvelle page chacune
+    for index, annex in enumerate(report_data.get('annexes') or []):
+        story.append(PageBreak())
+        story.append(section_heading(f"ANNEXE {index + 1}. {escape(annex['title'])}", f"annex-{index}", styles['section']))
+        story.extend(markdown_flowables(annex['content'], styles))
+    
+    return story
+
+def write_professional_pdf_report(output, city_name, report_data, charts_data, measure_memory=False):
+    """Écrit le rapport PDF dans `output` (chemin de fichier ou objet fichier binaire)
+    
+    Le document est construit en plusieurs passes (multiBuild) pour que la table des
+    matières porte les numéros de page réels ; seule la dernière passe est écrite.
+    Écrire directement dans un fichier évite de garder une seconde copie du PDF en
+    mémoire. Renvoie des statistiques : pages, passes, durée et, si `measure_memory`,
+    pic de mémoire Python alloué pendant la construction (tracemalloc ; la mesure ralentit
+    nettement la construction). Les constructions mesurées sont sérialisées par
+    PDF_MEMORY_LOCK ; les allocations des autres threads en cours (appels LLM d'autres
+    villes, par exemple) restent comptées dans le pic.
+    """
+    from reportlab.lib.pagesizes import A4
+    
+    with PDF_MEMORY_LOCK if measure_memory else nullcontext():
+        start = time.perf_counter()
+        tracing = measure_memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        elif measure_memory:
+            tracemalloc.reset_peak()
+        
+        try:
+            doc = get_report_template_class()(output, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
+            # Graphiques rendus en parallèle (et mis en cache) avant la mise en page
+            story = build_report_story(city_name, report_data, render_chart_images(charts_data), doc.width)
+            passes = doc.multiBuild(story, onLaterPages=draw_page_footer)
+            peak_memory = tracemalloc.get_traced_memory()[1] if measure_memory else None
+        finally:
+            if tracing:
+                tracemalloc.stop()
+    
+    return {
+        'pages': doc.page,
+        'passes': passes,
+        'elapsed': round(time.perf_counter() - start, 3),
+        'peak_memory': peak_memory
+    }
+
+def iter_professional_pdf_report(city_name, report_data, charts_data, chunk_size=PDF_CHUNK_SIZE):
+    """Génère le rapport PDF par blocs d'octets, pour une réponse HTTP découpée (chunked)
+    
+    Le PDF est écrit dans un tampon qui déborde sur disque au-delà de PDF_SPOOL_MAX_SIZE,
+    puis relu par blocs : un long rapport n'est jamais conservé deux fois en mémoire.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_SIZE) as spool:
+        write_professional_pdf_report(spool, city_name, report_data, charts_data)
+        spool.seek(0)
+        while True:
+            chunk = spool.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+def generate_professional_pdf_report(city_name, report_data, charts_data):
+    """Génère un rapport PDF professionnel en mémoire (BytesIO)"""
+    buffer = io.BytesIO()
+    write_professional_pdf_report(buffer, city_name, report_data, charts_data)
+    buffer.seek(0)
+    return buffer
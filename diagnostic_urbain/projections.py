@@ -0,0 +1,178 @@
+"""Projections démographiques vectorisées et besoins induits (logement, services de base)
+
+Toutes les villes, tous les scénarios et toutes les années sont calculés en une seule
+opération NumPy : tableaux (villes, scénarios, années). Les résultats alimentent les
+graphiques et sont injectés dans les prompts comme faits déjà calculés.
+"""
+from datetime import datetime
+
+import numpy as np
+
+from .config import HOUSEHOLD_SIZE, INFRASTRUCTURE_TARGETS_2030
+
+# Horizon des projections
+PROJECTION_YEARS = np.arange(2025, 2051)
+PROJECTION_MILESTONES = (2030, 2040, 2050)
+
+# Scénarios : écart au taux de croissance déclaré, en points de pourcentage par an
+PROJECTION_SCENARIOS = ("bas", "médian", "haut")
+SCENARIO_GROWTH_OFFSETS = np.array([-1.0, 0.0, 1.0])
+
+# Services de base projetés : champ du formulaire -> service des objectifs 2030
+SERVICE_FIELDS = {
+    "water_access": "Eau potable",
+    "electricity_access": "Électricité",
+    "sanitation_access": "Assainissement"
+}
+
+# Champs du formulaire lus par les projections
+PROJECTION_FIELDS = ("population", "growth_rate", "urban_area", "housing_deficit", *SERVICE_FIELDS)
+
+# Champs nécessaires à chaque thème de format_projection_facts ; les autres peuvent manquer
+PROJECTION_TOPIC_FIELDS = {
+    "population": ("population", "growth_rate"),
+    "density": ("population", "growth_rate", "urban_area"),
+    "housing": ("population", "growth_rate", "housing_deficit"),
+    "services": ("population", "growth_rate", *SERVICE_FIELDS)
+}
+
+def project_cities(population, growth_rate, urban_area, housing_deficit, access, base_year=None):
+    """Projette plusieurs villes à la fois (un élément par ville dans chaque tableau d'entrée)
+    
+    La population déclarée est celle de `base_year` (année en cours par défaut) ; les
+    années antérieures sont reconstituées au même taux. La superficie urbaine est
+    supposée constante. `access` associe des champs de SERVICE_FIELDS aux taux
+    d'accès actuels (%) ; seuls ces services sont projetés. Renvoie des tableaux de
+    forme (villes, scénarios, années), sauf `connections_2030` : {champ: (villes, scénarios)}.
+    """
+    base_year = base_year or datetime.now().year
+    population = np.asarray(population, dtype=float)
+    urban_area = np.asarray(urban_area, dtype=float)
+    
+    # Taux par ville et scénario, bornés pour rester définis en décroissance forte
+    rates = np.maximum(np.asarray(growth_rate, dtype=float)[:, None] + SCENARIO_GROWTH_OFFSETS[None, :], -99.0) / 100
+    exponents = PROJECTION_YEARS - base_year
+    projected = population[:, None, None] * (1 + rates[:, :, None]) ** exponents[None, None, :]
+    
+    area = urban_area[:, None, None]
+    density = np.divide(projected, area, out=np.full_like(projected, np.nan), where=area > 0)
+    
+    # Logements : déficit déclaré + ménages supplémentaires depuis l'année de référence
+    households = projected / HOUSEHOLD_SIZE
+    base_households = population[:, None, None] / HOUSEHOLD_SIZE
+    new_households = np.maximum(households - base_households, 0)
+    housing_need = np.asarray(housing_deficit, dtype=float)[:, None, None] + new_households
+    annual_housing_need = np.diff(households, axis=2, prepend=households[:, :, :1])
+    
+    # Services : habitants à raccorder pour atteindre les objectifs 2030
+    population_2030 = projected[:, :, np.searchsorted(PROJECTION_YEARS, 2030)]
+    connections_2030 = {
+        field: np.maximum(
+            population_2030 * INFRASTRUCTURE_TARGETS_2030[service] / 100
+            - (population * np.asarray(access[field], dtype=float) / 100)[:, None],
+            0
+        )
+        for field, service in SERVICE_FIELDS.items() if field in access
+    }
+    
+    return {
+        "years": PROJECTION_YEARS,
+        "scenarios": PROJECTION_SCENARIOS,
+        "base_year": base_year,
+        "population": projected,
+        "density": density,
+        "households": households,
+        "housing_need": housing_need,
+        "annual_housing_need": annual_housing_need,
+        "connections_2030": connections_2030
+    }
+
+def project_forms(forms, base_year=None):
+    """Projette un lot de formulaires en un seul appel vectorisé ; renvoie une projection par ville
+    
+    Seules la population et la croissance sont obligatoires (voir PROJECTION_TOPIC_FIELDS) :
+    sans superficie la densité vaut NaN, sans déficit déclaré les besoins en logement
+    partent de zéro, et un service sans taux d'accès n'est pas projeté.
+    """
+    columns = {
+        "population": [form["population"] for form in forms],
+        "growth_rate": [form["growth_rate"] for form in forms],
+        "urban_area": [form.get("urban_area", np.nan) for form in forms],
+        "housing_deficit": [form.get("housing_deficit", 0) for form in forms]
+    }
+    access = {field: [form[field] for form in forms] for field in SERVICE_FIELDS if all(field in form for form in forms)}
+    result = project_cities(access=access, base_year=base_year, **columns)
+    
+    projections = []
+    for index in range(len(forms)):
+        projections.append({
+            name: (value[index] if isinstance(value, np.ndarray) and value.ndim == 3 else value)
+            for name, value in result.items() if name != "connections_2030"
+        })
+        projections[-1]["connections_2030"] = {field: values[index] for field, values in result["connections_2030"].items()}
+    return projections
+
+def project_city(form, base_year=None):
+    """Projection d'une seule ville : tableaux de forme (scénarios, années)"""
+    return project_forms([form], base_year)[0]
+
+def current_density(form):
+    """Densité actuelle (hab/km²) : population déclarée sur superficie urbaine, comme les projections"""
+    return int(round(form["population"] / form["urban_area"])) if form["urban_area"] > 0 else 0
+
+def projection_summary(projection):
+    """Chiffres clés d'une projection, sérialisables en JSON (jalons 2030, 2040, 2050)"""
+    columns = np.searchsorted(projection["years"], PROJECTION_MILESTONES)
+    median = PROJECTION_SCENARIOS.index("médian")
+    
+    def by_milestone(values):
+        return {str(year): int(round(value)) for year, value in zip(PROJECTION_MILESTONES, values[columns])}
+    
+    return {
+        "base_year": int(projection["base_year"]),
+        "population": {
+            scenario: by_milestone(projection["population"][index])
+            for index, scenario in enumerate(PROJECTION_SCENARIOS)
+        },
+        "density": by_milestone(np.nan_to_num(projection["density"][median])),
+        "housing_need": by_milestone(projection["housing_need"][median]),
+        "annual_housing_need_2030": int(round(projection["annual_housing_need"][median, columns[0]])),
+        "connections_2030": {
+            field: int(round(values[median])) for field, values in projection["connections_2030"].items()
+        }
+    }
+
+def format_number(value):
+    """Nombre entier avec séparateur de milliers (espace fine insécable)"""
+    return f"{value:,}".replace(",", "\u202f")
+
+def format_projection_facts(summary, topics=("population", "density", "housing", "services")):
+    """Faits chiffrés à injecter dans un prompt, limités aux thèmes demandés"""
+    lines = []
+    population = summary["population"]
+    if "population" in topics:
+        for year in ("2030", "2050"):
+            lines.append(
+                f"- Population projetée {year} : {format_number(population['bas'][year])} (scénario bas), "
+                f"{format_number(population['médian'][year])} (médian), {format_number(population['haut'][year])} (haut)"
+            )
+    if "density" in topics:
+        density = summary["density"]
+        lines.append(f"- Densité projetée (médian) : {format_number(density['2030'])} hab/km² en 2030, {format_number(density['2050'])} hab/km² en 2050")
+    if "housing" in topics:
+        need = summary["housing_need"]
+        lines.append(
+            f"- Logements à produire (déficit actuel inclus, médian) : {format_number(need['2030'])} d'ici 2030, "
+            f"{format_number(need['2050'])} d'ici 2050, soit {format_number(summary['annual_housing_need_2030'])} par an vers 2030"
+        )
+    if "services" in topics:
+        connections = summary["connections_2030"]
+        lines.append(
+            "- Habitants à raccorder d'ici 2030 pour atteindre les objectifs (médian) : "
+            + ", ".join(
+                f"{SERVICE_FIELDS[field].lower()} {format_number(connections[field])} "
+                f"(objectif {INFRASTRUCTURE_TARGETS_2030[SERVICE_FIELDS[field]]}%)"
+                for field in SERVICE_FIELDS
+            )
+        )
+    return "\n".join(lines)
@@ -0,0 +1,374 @@
+"""Prompts du diagnostic : contexte documentaire et web, sections du rapport, régénération incrémentale"""
+import hashlib
+import json
+
+from .config import (
+    DEFAULT_CONTEXT_TOKENS, DOCUMENT_CONTEXT_BUDGET, HOUSEHOLD_SIZE, MESSAGE_OVERHEAD_TOKENS, MODEL_CONTEXT_TOKENS,
+    PASSAGE_OVERHEAD_TOKENS, PROMPT_TOKEN_BUDGET
+)
+from .documents import get_document_index
+from .projections import current_density, format_number, format_projection_facts, project_city, projection_summary
+from .tokens import count_tokens, truncate_to_tokens
+from .web import format_web_info_for_prompt, search_web_info
+
+SYSTEM_PROMPT = "Vous êtes un expert en urbanisme et développement urbain en Afrique. Analysez les documents fournis et les informations web collectées, puis intégrez-les dans vos réponses. Rédigez du contenu professionnel, détaillé et précis sans emojis. Citez vos sources quand vous utilisez des informations externes. Si vous ne connaissez pas une information précise, dites 'Je ne connais pas cette information spécifique'. Gardez vos réponses courtes et précises (max 150 mots pour le chatbot)."
+
+def prompt_token_budget(model, max_tokens):
+    """Tokens disponibles pour le message utilisateur, une fois réservés la réponse et le prompt système"""
+    context_tokens = MODEL_CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS)
+    # Le plafond PROMPT_TOKEN_BUDGET couvre le prompt et la réponse attendue
+    budget = min(PROMPT_TOKEN_BUDGET, context_tokens) - max_tokens
+    return budget - count_tokens(SYSTEM_PROMPT) - MESSAGE_OVERHEAD_TOKENS
+
+def build_enhanced_prompt(prompt, documents_content=None, web_data=None, include_Web_Search=False, token_budget=None):
+    """Construit le prompt enrichi avec les documents et les données web
+    
+    Les blocs sont ajoutés par priorité dans la limite de `token_budget` : données du
+    formulaire (toujours), informations web, recherche web récente, puis passages des
+    documents un par un tant qu'ils tiennent dans le budget restant.
+    """
+    web_results = []
+    remaining = token_budget if token_budget is not None else float("inf")
+    
+    closing = ""
+    if documents_content:
+        closing = "\n\nVeuillez intégrer les informations de ces documents techniques ET les données web dans votre analyse."
+    elif web_data:
+        closing = "\n\nVeuillez intégrer les informations web collectées dans votre analyse."
+    
+    parts = [prompt]
+    remaining -= count_tokens(prompt) + count_tokens(closing)
+    
+    def add_block(text):
+        # Ajoute un bloc entier s'il tient, sinon sa partie qui tient dans le budget
+        nonlocal remaining
+        if remaining <= 0 or not text:
+            return False
+        tokens = count_tokens(text)
+        if tokens > remaining:
+            text = truncate_to_tokens(text, int(remaining))
+            tokens = count_tokens(text)
+        parts.append(text)
+        remaining -= tokens
+        return True
+    
+    # Ajouter les informations web
+    if web_data:
+        add_block(format_web_info_for_prompt(web_data))
+    
+    # Recherche web si nécessaire
+    if include_Web_Search:
+        search_query = prompt.split(":")[-1].strip() if ":" in prompt else prompt
+        web_results = search_web_info(search_query)
+        
+        if web_results:
+            web_context = "\n".join([f"- {result['snippet']} (Source: {result['url']})" for result in web_results])
+            add_block(f"\n\nInformations web récentes:\n{web_context}")
+    
+    # Ajouter les passages des documents les plus pertinents pour ce prompt
+    if documents_content and len(documents_content) > 0:
+        passages = get_document_index(documents_content).search(prompt)
+        if not passages:
+            # Aucun terme commun : à défaut, le début de chaque document
+            passages = [(i, doc['filename'], doc['content'][:DOCUMENT_CONTEXT_BUDGET // len(documents_content)]) for i, doc in enumerate(documents_content)]
+        
+        # Retenir les passages par pertinence tant qu'ils tiennent dans le budget
+        header = "\n\nDOCUMENTS TECHNIQUES FOURNIS (extraits pertinents) :\n"
+        remaining -= count_tokens(header)
+        kept = []
+        for passage in passages:
+            tokens = count_tokens(passage[2]) + PASSAGE_OVERHEAD_TOKENS
+            if tokens <= remaining:
+                kept.append(passage)
+                remaining -= tokens
+        
+        docs_text = header
+        for doc_index in sorted({passage[0] for passage in kept}):
+            filename = documents_content[doc_index]['filename']
+            docs_text += f"\n--- Document {doc_index + 1}: {filename} ---\n"
+            docs_text += "\n[...]\n".join(text for index, _, text in kept if index == doc_index)
+            docs_text += "\n"
+        parts.append(docs_text)
+    
+    parts.append(closing)
+    return "".join(parts), web_results
+
+# Sections du rapport dans l'ordre du document : clé -> titre affiché
+SECTION_TITLES = {
+    "executive_summary": "1. Résumé exécutif",
+    "demographic_analysis": "2.1 Profil démographique",
+    "socio_analysis": "2.2 Contexte socio-économique",
+    "housing_analysis": "3.1 État du parc de logements",
+    "infrastructure_analysis": "3.2 Infrastructures de base",
+    "challenges_analysis": "4.1 Défis majeurs",
+    "opportunities_analysis": "4.2 Opportunités de développement",
+    "short_term_reco": "5.1 Priorités à court terme",
+    "medium_term_reco": "5.2 Stratégies à moyen terme",
+    "long_term_reco": "5.3 Vision à long terme",
+    "conclusion": "7. Conclusion prospective"
+}
+
+SECTION_MAX_TOKENS = {
+    "executive_summary": 600,
+    "demographic_analysis": 500,
+    "socio_analysis": 600,
+    "housing_analysis": 700,
+    "infrastructure_analysis": 700,
+    "challenges_analysis": 700,
+    "opportunities_analysis": 600,
+    "short_term_reco": 500,
+    "medium_term_reco": 600,
+    "long_term_reco": 500,
+    "conclusion": 350
+}
+
+# Graphe de dépendances : champs du formulaire utilisés par le prompt de chaque section.
+# build_section_prompts ne transmet à chaque prompt que ces champs, le graphe est donc exhaustif.
+SECTION_DEPENDENCIES = {
+    "executive_summary": [
+        "city_name", "country", "diagnostic_type", "diagnostic_objective", "population", "growth_rate",
+        "water_access", "electricity_access", "sanitation_access", "unemployment_rate",
+        "informal_settlements", "climate_risks", "additional_comments"
+    ],
+    "demographic_analysis": ["city_name", "population", "growth_rate", "youth_percentage", "urban_area"],
+    "socio_analysis": [
+        "city_name", "main_sectors", "unemployment_rate", "informal_economy", "gdp_per_capita",
+        "literacy_rate", "infant_mortality", "life_expectancy", "health_facilities", "schools"
+    ],
+    "housing_analysis": [
+        "city_name", "housing_deficit", "informal_settlements", "housing_cost", "construction_materials",
+        "water_access", "electricity_access", "population", "growth_rate"
+    ],
+    "infrastructure_analysis": [
+        "city_name", "water_access", "electricity_access", "sanitation_access", "road_quality",
+        "internet_access", "waste_management", "public_transport", "population", "growth_rate"
+    ],
+    "challenges_analysis": [
+        "city_name", "growth_rate", "housing_deficit", "informal_settlements", "water_access",
+        "electricity_access", "unemployment_rate", "informal_economy", "climate_risks", "air_quality",
+        "waste_management"
+    ],
+    "opportunities_analysis": ["city_name", "main_sectors", "youth_percentage", "urban_area"],
+    "short_term_reco": [
+        "city_name", "water_access", "electricity_access", "informal_settlements", "unemployment_rate",
+        "climate_risks"
+    ],
+    "medium_term_reco": ["city_name", "growth_rate", "main_sectors", "public_transport"],
+    "long_term_reco": ["city_name", "main_sectors"],
+    "conclusion": ["city_name"]
+}
+
+# Valeurs par défaut du formulaire, partagées par la barre latérale et le mode batch
+DEFAULT_FORM = {
+    "city_name": "Nouakchott",
+    "country": "Mauritanie",
+    "region": "Nouakchott",
+    "population": 1200000,
+    "growth_rate": 3.5,
+    "urban_area": 1000,
+    "youth_percentage": 60,
+    "water_access": 45,
+    "electricity_access": 42,
+    "sanitation_access": 25,
+    "road_quality": "Très mauvaise",
+    "internet_access": 35,
+    "housing_deficit": 50000,
+    "informal_settlements": 40,
+    "housing_cost": 200,
+    "construction_materials": ["Béton", "Tôle"],
+    "unemployment_rate": 25,
+    "informal_economy": 70,
+    "main_sectors": ["Commerce", "Services", "Pêche"],
+    "gdp_per_capita": 1500,
+    "health_facilities": 15,
+    "schools": 120,
+    "literacy_rate": 65,
+    "infant_mortality": 45,
+    "life_expectancy": 65,
+    "climate_risks": ["Inondations", "Sécheresse"],
+    "waste_management": "Très mauvaise",
+    "green_spaces": 5,
+    "air_quality": "Très mauvaise",
+    "public_transport": "Inexistant",
+    "vehicle_ownership": 80,
+    "traffic_congestion": "Très faible",
+    "diagnostic_type": "Diagnostic général",
+    "diagnostic_objective": "Évaluer l'état actuel du développement urbain et identifier les priorités d'intervention pour améliorer les conditions de vie des habitants.",
+    "target_audience": ["Autorités locales", "Bailleurs de fonds"],
+    "additional_comments": ""
+}
+
+def _join(values, default):
+    """Joint une liste de valeurs du formulaire avec une valeur par défaut"""
+    return ', '.join(values) if values else default
+
+def _projection_facts(v, topics):
+    """Projections déjà calculées pour la ville (voir projections.py), sur les thèmes demandés
+    
+    Les lignes suivant la première sont indentées comme le texte des prompts. La projection
+    ne lit que les champs des thèmes demandés (PROJECTION_TOPIC_FIELDS), déclarés dans
+    SECTION_DEPENDENCIES.
+    """
+    return format_projection_facts(projection_summary(project_city(v)), topics).replace("\n", "\n            ")
+
+def build_section_prompt(key, v):
+    """Construit le prompt d'une section à partir de ses seules entrées déclarées"""
+    if key == "executive_summary":
+        return f"""
+            Rédigez un résumé exécutif professionnel de 400 mots pour le diagnostic urbain de {v['city_name']}, {v['country']}.
+            Type de diagnostic: {v['diagnostic_type']}
+            Objectif: {v['diagnostic_objective']}
+            Population: {v['population']:,} habitants, croissance: {v['growth_rate']}%.
+            Accès eau: {v['water_access']}%, électricité: {v['electricity_access']}%, assainissement: {v['sanitation_access']}%.
+            Chômage: {v['unemployment_rate']}%, habitat informel: {v['informal_settlements']}%.
+            Risques climatiques: {_join(v['climate_risks'], 'Non spécifiés')}.
+            Contexte particulier: {v['additional_comments'] if v['additional_comments'] else 'Aucun commentaire spécifique'}.
+            Incluez: situation actuelle, défis principaux, opportunités, recommandations clés.
+            Style: professionnel, sans emojis, paragraphes structurés.
+            """
+    if key == "demographic_analysis":
+        return f"""
+            Analysez le profil démographique de {v['city_name']} avec {v['population']:,} habitants et {v['growth_rate']}% de croissance.
+            Densité actuelle: {format_number(current_density(v))} hab/km² ({v['urban_area']} km²), jeunes (0-25 ans): {v['youth_percentage']}%.
+            Projections calculées (croissance de ±1 point pour les scénarios bas et haut, superficie constante):
+            {_projection_facts(v, ("population", "density"))}
+            Détaillez: structure par âge, migration, densité urbaine, projections 2030-2050.
+            Reprenez les projections calculées telles quelles, sans les recalculer.
+            Comparaisons régionales avec autres capitales sahéliennes.
+            300 mots, style analytique professionnel.
+            """
+    if key == "socio_analysis":
+        return f"""
+            Analysez le contexte socio-économique de {v['city_name']}:
+            - Secteurs économiques dominants: {_join(v['main_sectors'], 'Non spécifiés')}
+            - Chômage: {v['unemployment_rate']}%, économie informelle: {v['informal_economy']}%
+            - PIB par habitant: {v['gdp_per_capita']} USD
+            - Taux d'alphabétisation: {v['literacy_rate']}%
+            - Mortalité infantile: {v['infant_mortality']}‰, espérance de vie: {v['life_expectancy']} ans
+            - Établissements de santé: {v['health_facilities']}, écoles: {v['schools']}
+            350 mots, données chiffrées, analyse approfondie.
+            """
+    if key == "housing_analysis":
+        return f"""
+            Analysez l'état du parc de logements à {v['city_name']}:
+            - Déficit en logements: {v['housing_deficit']:,} unités
+            - Population en habitat informel: {v['informal_settlements']}%
+            - Coût du logement: {v['housing_cost']} USD/m²
+            - Matériaux dominants: {_join(v['construction_materials'], 'Non spécifiés')}
+            - Accès eau: {v['water_access']}%, électricité: {v['electricity_access']}%
+            Besoins projetés (déjà calculés, {HOUSEHOLD_SIZE:g} personnes par ménage, à reprendre tels quels):
+            {_projection_facts(v, ("housing",))}
+            Détaillez: types de logements, qualité du bâti, surpeuplement, marché immobilier, quartiers informels.
+            400 mots, analyse technique détaillée.
+            """
+    if key == "infrastructure_analysis":
+        return f"""
+            Évaluez les infrastructures de base de {v['city_name']}:
+            - Eau potable: {v['water_access']}% de couverture
+            - Électricité: {v['electricity_access']}% de couverture
+            - Assainissement: {v['sanitation_access']}% de couverture
+            - Qualité des routes: {v['road_quality']}
+            - Accès Internet: {v['internet_access']}%
+            - Gestion des déchets: {v['waste_management']}
+            - Transport public: {v['public_transport']}
+            Besoins projetés (déjà calculés, à reprendre tels quels):
+            {_projection_facts(v, ("services",))}
+            450 mots, évaluation technique approfondie.
+            """
+    if key == "challenges_analysis":
+        return f"""
+            Identifiez et analysez les défis majeurs de {v['city_name']}:
+            - Croissance démographique rapide ({v['growth_rate']}%) et planification urbaine
+            - Déficit en logements ({v['housing_deficit']:,} unités) et habitat informel ({v['informal_settlements']}%)
+            - Insuffisance des services de base (eau: {v['water_access']}%, électricité: {v['electricity_access']}%)
+            - Chômage élevé ({v['unemployment_rate']}%) et économie informelle ({v['informal_economy']}%)
+            - Risques climatiques: {_join(v['climate_risks'], 'Non spécifiés')}
+            - Qualité de l'air: {v['air_quality']}, gestion des déchets: {v['waste_management']}
+            400 mots, analyse critique et factuelle.
+            """
+    if key == "opportunities_analysis":
+        return f"""
+            Analysez les opportunités de développement pour {v['city_name']}:
+            - Secteurs économiques porteurs: {_join(v['main_sectors'], 'À identifier')}
+            - Population jeune ({v['youth_percentage']}% de moins de 25 ans)
+            - Potentiel de développement urbain sur {v['urban_area']} km²
+            - Coopération internationale et financement
+            - Innovation technologique et villes intelligentes
+            - Partenariats public-privé
+            350 mots, vision prospective et réaliste.
+            """
+    if key == "short_term_reco":
+        return f"""
+            Formulez des recommandations prioritaires à court terme pour {v['city_name']}:
+            - Amélioration urgente de l'accès à l'eau potable (actuellement {v['water_access']}%)
+            - Extension du réseau électrique (actuellement {v['electricity_access']}%)
+            - Programmes d'urgence pour l'habitat précaire ({v['informal_settlements']}% de la population)
+            - Création d'emplois face au chômage de {v['unemployment_rate']}%
+            - Renforcement des capacités institutionnelles
+            - Gestion des risques climatiques: {_join(v['climate_risks'], 'À définir')}
+            300 mots, recommandations concrètes et réalisables.
+            """
+    if key == "medium_term_reco":
+        return f"""
+            Développez des stratégies à moyen terme pour {v['city_name']}:
+            - Planification urbaine intégrée pour gérer la croissance de {v['growth_rate']}%
+            - Développement de nouveaux quartiers planifiés
+            - Modernisation des infrastructures existantes
+            - Diversification économique (secteurs actuels: {_join(v['main_sectors'], 'À développer')})
+            - Renforcement de la résilience climatique
+            - Amélioration du transport public (actuellement: {v['public_transport']})
+            350 mots, approche stratégique et intégrée.
+            """
+    if key == "long_term_reco":
+        return f"""
+            Esquissez une vision à long terme pour {v['city_name']}:
+            - Transformation en ville intelligente et durable
+            - Hub économique régional basé sur {_join(v['main_sectors'], 'les secteurs porteurs')}
+            - Inclusion sociale et égalité d'accès aux services
+            - Adaptation au changement climatique et neutralité carbone
+            - Gouvernance participative et innovation numérique
+            300 mots, style prospectif et inspirant.
+            """
+    if key == "conclusion":
+        return f"""
+            Rédigez une conclusion prospective pour le diagnostic urbain de {v['city_name']}, en insistant sur l'importance d'une approche intégrée, la mobilisation des acteurs locaux, et l'innovation pour relever les défis urbains du XXIe siècle. 200 mots, ton mobilisateur.
+            """
+    raise KeyError(f"Section inconnue: {key}")
+
+def build_section_prompts(form, keys=None):
+    """Construit les prompts (prompt, max_tokens) des sections demandées, dans l'ordre du document"""
+    prompts = {}
+    for key in SECTION_TITLES:
+        if keys is not None and key not in keys:
+            continue
+        inputs = {name: form[name] for name in SECTION_DEPENDENCIES[key]}
+        prompts[key] = (build_section_prompt(key, inputs), SECTION_MAX_TOKENS[key])
+    return prompts
+
+def fingerprint(value):
+    """Empreinte SHA-256 d'une valeur sérialisable en JSON"""
+    payload = json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def plan_incremental_regeneration(previous, form, documents_fp, web_fp):
+    """Détermine les sections à recalculer par rapport au rapport précédent
+    
+    Renvoie (sections à recalculer, champs modifiés). Une section est recalculée si
+    l'un de ses champs a changé, si les documents ou le contexte web ont changé,
+    ou si elle est absente ou en échec (previous["failed_sections"]) dans le rapport précédent.
+    """
+    if not previous:
+        return list(SECTION_TITLES), []
+    
+    previous_form = previous["form"]
+    changed_inputs = [name for name in form if previous_form.get(name) != form[name]]
+    context_changed = previous["documents_fp"] != documents_fp or previous["web_fp"] != web_fp
+    
+    dirty = [
+        key for key in SECTION_TITLES
+        if context_changed
+        or key not in previous["sections"]
+        or key in previous.get("failed_sections", ())
+        or any(name in changed_inputs for name in SECTION_DEPENDENCIES[key])
+    ]
+    return dirty, changed_inputs
@@ -0,0 +1,255 @@
+"""Génération du rapport : pipeline des sections et file de rapports en arrière-plan"""
+import json
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import REPORT_JOB_PROGRESS_INTERVAL, REPORT_JOB_RETENTION, REPORT_JOB_WORKERS
+from .llm import FailedGeneration, generate_sections_parallel
+from .prompts import SECTION_TITLES, build_section_prompts
+
+def run_report_pipeline(form, clients, documents_content=None, web_data=None, keys=None, on_section_done=None, on_section_progress=None, usage_log=None):
+    """Génère les sections du rapport indépendamment de l'interface (onglet Diagnostic et mode batch)"""
+    section_prompts = build_section_prompts(form, keys)
+    return generate_sections_parallel(
+        section_prompts, clients, documents_content, web_data,
+        on_section_done=on_section_done,
+        on_section_progress=on_section_progress,
+        usage_log=usage_log
+    )
+
+def build_report_data(sections):
+    """Regroupe les sections générées en chapitres du rapport PDF"""
+    return {
+        "executive_summary": sections["executive_summary"],
+        "demographic_context": sections["demographic_analysis"] + "\n\n" + sections["socio_analysis"],
+        "housing_analysis": sections["housing_analysis"] + "\n\n" + sections["infrastructure_analysis"],
+        "challenges": sections["challenges_analysis"] + "\n\n" + sections["opportunities_analysis"],
+        "recommendations": sections["short_term_reco"] + "\n\n" + sections["medium_term_reco"] + "\n\n" + sections["long_term_reco"],
+        "conclusion": sections["conclusion"]
+    }
+
+# États d'un rapport en arrière-plan
+REPORT_JOB_ACTIVE = ("en attente", "en cours")
+
+# États d'une section dont la génération est achevée (avec succès ou non)
+REPORT_SECTION_FINISHED = ("terminé", "échec")
+
+def current_job_owner():
+    """Identifiant du processus qui exécute un rapport : hôte et PID"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def job_owner_alive(owner):
+    """Faux seulement si le processus propriétaire est sur cet hôte et n'existe plus"""
+    if not owner:
+        return False
+    host, _, pid = owner.rpartition(":")
+    if host != socket.gethostname() or os.name == "nt":
+        # Processus d'un autre hôte (ou Windows, où os.kill termine le processus) : supposé vivant
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        return True
+    return True
+
+class ReportJobQueue:
+    """File de génération des rapports en arrière-plan, persistée dans SQLite
+    
+    Chaque rapport reçoit un identifiant ; l'avancement et le texte de chaque section
+    sont enregistrés au fil de la génération, ce qui permet à l'interface de suivre un
+    rapport après un rerun ou un rechargement de la page. Les rapports interrompus par
+    un redémarrage du serveur sont relancés sans recalculer les sections terminées.
+    Plusieurs processus peuvent partager la base : un rapport n'est exécuté que par le
+    processus qui l'a réclamé (passage atomique de « en attente » à « en cours »).
+    """
+    
+    def __init__(self, path, clients, max_workers=REPORT_JOB_WORKERS):
+        self.path = path
+        self.clients = clients
+        self.owner = current_job_owner()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report-job")
+        
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS report_jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, form TEXT NOT NULL, inputs TEXT NOT NULL, "
+                "documents_fp TEXT NOT NULL, web_fp TEXT NOT NULL, usage TEXT, error TEXT, "
+                "created_at REAL NOT NULL, started_at REAL, finished_at REAL, owner TEXT)"
+            )
+            # Bases créées avant l'ajout du propriétaire
+            if "owner" not in [row[1] for row in conn.execute("PRAGMA table_info(report_jobs)")]:
+                conn.execute("ALTER TABLE report_jobs ADD COLUMN owner TEXT")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS report_job_sections ("
+                "job_id TEXT NOT NULL, key TEXT NOT NULL, status TEXT NOT NULL, content TEXT NOT NULL, "
+                "updated_at REAL NOT NULL, PRIMARY KEY (job_id, key))"
+            )
+            expired = time.time() - REPORT_JOB_RETENTION
+            conn.execute("DELETE FROM report_job_sections WHERE job_id IN (SELECT id FROM report_jobs WHERE created_at < ?)", (expired,))
+            conn.execute("DELETE FROM report_jobs WHERE created_at < ?", (expired,))
+            
+            # Rapports « en cours » d'un processus arrêté : remis en attente (si personne ne l'a fait avant)
+            for job_id, owner in conn.execute("SELECT id, owner FROM report_jobs WHERE status = 'en cours'").fetchall():
+                if not job_owner_alive(owner):
+                    conn.execute(
+                        "UPDATE report_jobs SET status = 'en attente', owner = NULL WHERE id = ? AND status = 'en cours' AND owner IS ?",
+                        (job_id, owner)
+                    )
+            conn.commit()
+            unfinished = [row[0] for row in conn.execute(
+                "SELECT id FROM report_jobs WHERE status = 'en attente' ORDER BY created_at"
+            )]
+        finally:
+            conn.close()
+        
+        # Reprendre les rapports en attente ; chacun n'est exécuté que par le processus qui le réclame
+        for job_id in unfinished:
+            self.executor.submit(self._run, job_id)
+    
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+    
+    def submit(self, form, documents_content, web_data, keys, reused_sections, documents_fp, web_fp):
+        """Enregistre un rapport à générer et renvoie son identifiant sans attendre la génération"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        inputs = {
+            "documents_content": [{"filename": doc["filename"], "content": doc["content"], "sha256": doc["sha256"]} for doc in documents_content],
+            "web_data": web_data
+        }
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT INTO report_jobs (id, status, form, inputs, documents_fp, web_fp, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, "en attente", json.dumps(form, ensure_ascii=False, default=str),
+                 json.dumps(inputs, ensure_ascii=False, default=str), documents_fp, web_fp, now)
+            )
+            conn.executemany(
+                "INSERT INTO report_job_sections (job_id, key, status, content, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (job_id, key, "terminé", reused_sections[key], now) if key in reused_sections
+                    else (job_id, key, "en attente", "", now)
+                    for key in SECTION_TITLES if key in keys or key in reused_sections
+                ]
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        self.executor.submit(self._run, job_id)
+        return job_id
+    
+    def get(self, job_id):
+        """Renvoie l'état d'un rapport et de ses sections, ou None s'il est inconnu"""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT status, form, documents_fp, web_fp, usage, error, created_at, started_at, finished_at "
+                "FROM report_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            sections = {
+                key: {"status": status, "content": content}
+                for key, status, content in conn.execute(
+                    "SELECT key, status, content FROM report_job_sections WHERE job_id = ?", (job_id,)
+                )
+            }
+        finally:
+            conn.close()
+        status, form, documents_fp, web_fp, usage, error, created_at, started_at, finished_at = row
+        return {
+            "id": job_id,
+            "status": status,
+            "form": json.loads(form),
+            "documents_fp": documents_fp,
+            "web_fp": web_fp,
+            "usage": json.loads(usage) if usage else [],
+            "error": error,
+            "created_at": created_at,
+            "started_at": started_at,
+            "finished_at": finished_at,
+            "sections": {key: sections[key] for key in SECTION_TITLES if key in sections}
+        }
+    
+    def _load_inputs(self, job_id):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT inputs FROM report_jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return json.loads(row[0])
+    
+    def _update_section(self, job_id, key, status, content):
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE report_job_sections SET status = ?, content = ?, updated_at = ? WHERE job_id = ? AND key = ?",
+                (status, content, time.time(), job_id, key)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def _update_job(self, job_id, **fields):
+        conn = self._connect()
+        try:
+            assignments = ", ".join(f"{name} = ?" for name in fields)
+            conn.execute(f"UPDATE report_jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def _claim(self, job_id):
+        """Réclame un rapport en attente pour ce processus ; faux s'il est déjà pris"""
+        conn = self._connect()
+        try:
+            claimed = conn.execute(
+                "UPDATE report_jobs SET status = 'en cours', owner = ?, started_at = ? WHERE id = ? AND status = 'en attente'",
+                (self.owner, time.time(), job_id)
+            ).rowcount == 1
+            conn.commit()
+        finally:
+            conn.close()
+        return claimed
+    
+    def _run(self, job_id):
+        """Génère les sections restantes d'un rapport (exécuté dans le pool de la file)"""
+        if not self._claim(job_id):
+            return
+        job = self.get(job_id)
+        inputs = self._load_inputs(job_id)
+        keys = [key for key, section in job["sections"].items() if section["status"] != "terminé"]
+        usage_log = list(job["usage"])
+        last_write = {}
+        
+        def on_section_progress(key, content):
+            # Limiter les écritures SQLite pendant le streaming d'une section
+            now = time.monotonic()
+            if now - last_write.get(key, 0) >= REPORT_JOB_PROGRESS_INTERVAL:
+                last_write[key] = now
+                self._update_section(job_id, key, "en cours", content)
+        
+        def on_section_done(key, content):
+            self._update_section(job_id, key, "échec" if isinstance(content, FailedGeneration) else "terminé", content)
+        
+        try:
+            if keys:
+                run_report_pipeline(
+                    job["form"], self.clients, inputs["documents_content"], inputs["web_data"], keys=keys,
+                    on_section_done=on_section_done,
+                    on_section_progress=on_section_progress,
+                    usage_log=usage_log
+                )
+        except Exception as e:
+            self._update_job(job_id, status="échec", error=str(e), usage=json.dumps(usage_log), finished_at=time.time())
+            return
+        self._update_job(job_id, status="terminé", usage=json.dumps(usage_log), finished_at=time.time())
@@ -0,0 +1,30 @@
+"""Comptage et troncature des tokens (tiktoken, ou estimation par caractères)"""
+from functools import lru_cache
+
+from .config import CHARS_PER_TOKEN_ESTIMATE, TOKENIZER_ENCODING
+
+@lru_cache(maxsize=None)
+def get_tokenizer():
+    """Encodeur de tokens local (tiktoken), ou None s'il est indisponible"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(TOKENIZER_ENCODING)
+    except Exception:
+        return None
+
+def count_tokens(text):
+    """Compte les tokens d'un texte (estimation par caractères si aucun tokenizer n'est disponible)"""
+    encoder = get_tokenizer()
+    if encoder is None:
+        return len(text) // CHARS_PER_TOKEN_ESTIMATE + 1
+    return len(encoder.encode(text, disallowed_special=()))
+
+def truncate_to_tokens(text, max_tokens):
+    """Tronque un texte à un nombre maximal de tokens"""
+    if max_tokens <= 0:
+        return ""
+    encoder = get_tokenizer()
+    if encoder is None:
+        return text[:max_tokens * CHARS_PER_TOKEN_ESTIMATE]
+    tokens = encoder.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoder.decode(tokens[:max_tokens])
@@ -0,0 +1,169 @@
+"""Collecte des données web sur une ville (API MediaWiki de Wikipedia)"""
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from .caching import TTLCache
+from .config import (
+    WEB_DATA_NEGATIVE_TTL, WEB_DATA_TTL, WIKIPEDIA_API_URL, WIKIPEDIA_LANGS, WIKIPEDIA_TIMEOUT,
+    WIKIPEDIA_USER_AGENT
+)
+
+@lru_cache(maxsize=None)
+def get_web_data_cache():
+    """Cache des données web partagé par toutes les sessions du processus"""
+    return TTLCache(maxsize=512, ttl=WEB_DATA_TTL)
+
+def search_web_info(query, max_results=3):
+    """Recherche d'informations sur le web avec gestion d'erreurs"""
+    try:
+        # Simulation d'une recherche web (remplacez par une vraie API)
+        search_results = [
+            {
+                "title": f"Résultat pour: {query}",
+                "url": "https://example.com",
+                "snippet": "Information trouvée sur le web..."
+            }
+        ]
+        return search_results
+    except Exception as e:
+        return []
+
+def fetch_wikipedia_page(term, lang):
+    """Recherche un terme et récupère titre, URL et résumé en une seule requête à l'API MediaWiki"""
+    import requests
+    
+    params = {
+        "action": "query",
+        "format": "json",
+        "formatversion": 2,
+        "generator": "search",
+        "gsrsearch": term,
+        "gsrlimit": 1,
+        "prop": "extracts|info|pageprops",
+        "exintro": 1,
+        "explaintext": 1,
+        "exsentences": 5,
+        "inprop": "url",
+        "ppprop": "disambiguation",
+        "redirects": 1
+    }
+    response = requests.get(
+        WIKIPEDIA_API_URL.format(lang=lang),
+        params=params,
+        headers={"User-Agent": WIKIPEDIA_USER_AGENT},
+        timeout=WIKIPEDIA_TIMEOUT
+    )
+    response.raise_for_status()
+    pages = response.json().get("query", {}).get("pages", [])
+    
+    # Ignorer les pages d'homonymie et les pages sans résumé
+    if not pages or "disambiguation" in pages[0].get("pageprops", {}) or not pages[0].get("extract"):
+        return None
+    
+    page = pages[0]
+    return {
+        'title': page['title'],
+        'summary': page['extract'],
+        'url': page.get('fullurl'),
+        'found': True
+    }
+
+def get_wikipedia_info(city_name, country_name, lang="fr"):
+    """Récupère des informations sur la ville depuis Wikipedia
+    
+    Toutes les variantes du nom et les langues de repli sont interrogées en parallèle ;
+    le résultat retenu est le premier trouvé dans l'ordre de priorité (langue demandée
+    d'abord, puis variantes du nom de la plus simple à la plus précise).
+    """
+    # Essayer différentes variantes du nom de la ville
+    search_terms = [
+        f"{city_name}",
+        f"{city_name} {country_name}",
+        f"{city_name}, {country_name}"
+    ]
+    langs = [lang] + [fallback for fallback in WIKIPEDIA_LANGS if fallback != lang]
+    candidates = [(term, candidate_lang) for candidate_lang in langs for term in search_terms]
+    
+    executor = ThreadPoolExecutor(max_workers=len(candidates))
+    try:
+        futures = [executor.submit(fetch_wikipedia_page, term, candidate_lang) for term, candidate_lang in candidates]
+        
+        # Parcourir par priorité : inutile d'attendre les candidats moins prioritaires
+        errors = []
+        for future in futures:
+            try:
+                result = future.result()
+            except Exception as e:
+                errors.append(e)
+                continue
+            if result:
+                return result
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    
+    if len(errors) == len(candidates):
+        return {
+            'title': f"{city_name}",
+            'summary': f"Erreur lors de la recherche d'informations sur {city_name}: {str(errors[0])}",
+            'url': None,
+            'found': False,
+            'error': True
+        }
+    
+    return {
+        'title': f"{city_name}",
+        'summary': f"Aucune information Wikipedia trouvée pour {city_name}, {country_name}.",
+        'url': None,
+        'found': False,
+        # Un résultat négatif partiel (certaines requêtes en échec) ne doit pas être mis en cache
+        'error': bool(errors)
+    }
+
+def get_web_urban_data(city_name, country_name, lang="fr"):
+    """Collecte des données urbaines depuis différentes sources web
+    
+    Les résultats sont mis en cache par ville, pays et langue. Une page introuvable
+    est mémorisée avec une durée de vie plus courte ; les erreurs ne le sont pas.
+    """
+    cache = get_web_data_cache()
+    cache_key = (city_name.strip().lower(), country_name.strip().lower(), lang)
+    web_data = cache.get(cache_key)
+    if web_data is not None:
+        return web_data
+    
+    web_data = {
+        'wikipedia_info': get_wikipedia_info(city_name, country_name, lang),
+        'additional_context': f"Recherche web effectuée pour {city_name}, {country_name}"
+    }
+    
+    # Ici, tu peux ajouter d'autres sources de données web
+    # Par exemple : World Bank API, UN Data, etc.
+    
+    wiki_info = web_data['wikipedia_info']
+    if wiki_info.get('found'):
+        cache.set(cache_key, web_data)
+    elif not wiki_info.get('error'):
+        cache.set(cache_key, web_data, ttl=WEB_DATA_NEGATIVE_TTL)
+    
+    return web_data
+
+def format_web_info_for_prompt(web_data):
+    """Formate les informations web pour inclusion dans le prompt"""
+    if not web_data:
+        return ""
+    
+    formatted_info = "\n\n=== INFORMATIONS WEB COLLECTÉES ===\n"
+    
+    # Informations Wikipedia
+    wiki_info = web_data.get('wikipedia_info', {})
+    if wiki_info.get('found', False):
+        formatted_info += f"\n--- Wikipedia: {wiki_info.get('title', 'N/A')} ---\n"
+        formatted_info += wiki_info.get('summary', 'Aucun résumé disponible')
+        if wiki_info.get('url'):
+            formatted_info += f"\nSource: {wiki_info.get('url')}"
+    else:
+        formatted_info += f"\n--- Wikipedia ---\n{wiki_info.get('summary', 'Aucune information trouvée')}"
+    
+    formatted_info += "\n\n=== FIN DES INFORMATIONS WEB ===\n"
+    
+    return formatted_info
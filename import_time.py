@@ -0,0 +1,93 @@
+"""Mesure du temps d'import de l'application (python -X importtime)
+
+Usage :
+    python import_time.py                 # résumé lisible
+    python import_time.py --json          # résultat JSON, à archiver pour suivre l'évolution
+    python import_time.py --max-ms 1500   # code de sortie 1 si l'import d'app dépasse le seuil
+    python import_time.py --module diagnostic_urbain   # moteur seul, sans l'interface
+
+Chaque mesure lance un interpréteur neuf, comme un démarrage à froid de conteneur.
+La médiane de plusieurs exécutions est retenue.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Modules qui ne doivent pas être chargés au démarrage de l'application
+HEAVY_MODULES = ["pandas", "plotly", "reportlab", "openai", "groq", "httpx", "tiktoken", "PyPDF2", "pytesseract", "pdf2image", "matplotlib", "seaborn"]
+
+def run_importtime(module):
+    """Importe `module` dans un interpréteur neuf ; renvoie les lignes (module, propre µs, cumulé µs, profondeur)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Échec de l'import de {module}:\n{result.stderr[-2000:]}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        # Un espace de base, puis deux espaces par niveau d'imbrication
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+def measure(module="app", runs=3, top=15):
+    """Temps d'import médian de `module`, ses imports directs les plus lents et les modules lourds chargés"""
+    totals = []
+    for _ in range(runs):
+        rows = run_importtime(module)
+        totals.append(next(cumulative for name, _, cumulative, depth in rows if name == module and depth == 0))
+
+    # Le détail provient de la dernière exécution : sous-arbre des imports du module
+    end = next(index for index, (name, _, _, depth) in enumerate(rows) if name == module and depth == 0)
+    start = max((index + 1 for index, row in enumerate(rows[:end]) if row[3] == 0), default=0)
+    subtree = rows[start:end]
+    direct = sorted(
+        ((name, cumulative) for name, _, cumulative, depth in subtree if depth == 1),
+        key=lambda item: item[1], reverse=True
+    )
+    # Les modules déjà importés par Streamlit lui-même ne dépendent pas de l'application
+    loaded = {name for name, _, _, _ in subtree} - {name for name, _, _, _ in run_importtime("streamlit")}
+    return {
+        "module": module,
+        "runs": runs,
+        "total_ms": round(statistics.median(totals) / 1000, 1),
+        "all_runs_ms": [round(total / 1000, 1) for total in totals],
+        "slowest_imports_ms": {name: round(cumulative / 1000, 1) for name, cumulative in direct[:top]},
+        "heavy_modules_loaded": [name for name in HEAVY_MODULES if name in loaded]
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Temps d'import de l'application (python -X importtime)")
+    parser.add_argument("--module", default="app", help="Module à importer")
+    parser.add_argument("--runs", type=int, default=3, help="Nombre d'exécutions (médiane retenue)")
+    parser.add_argument("--top", type=int, default=15, help="Nombre d'imports les plus lents affichés")
+    parser.add_argument("--json", action="store_true", help="Affiche le résultat en JSON")
+    parser.add_argument("--max-ms", type=float, default=None, help="Seuil au-delà duquel le code de sortie vaut 1")
+    args = parser.parse_args(argv)
+
+    report = measure(args.module, args.runs, args.top)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(f"Import de {report['module']} : {report['total_ms']} ms (médiane de {report['runs']} : {report['all_runs_ms']})")
+        print("Imports les plus lents :")
+        for name, duration in report["slowest_imports_ms"].items():
+            print(f"  {duration:8.1f} ms  {name}")
+        print("Modules lourds chargés au démarrage (hors dépendances de Streamlit) : " + (", ".join(report["heavy_modules_loaded"]) or "aucun"))
+
+    if args.max_ms is not None and report["total_ms"] > args.max_ms:
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,19 @@
+"""Configuration commune des tests : caches disque isolés et serveur HTTP local"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+from fake_server import FakeHTTPServer
+
+# Avant tout import du paquet : CACHE_DIR est lu à l'import de diagnostic_urbain.config
+os.environ.setdefault("DIAGNOSTIC_CACHE_DIR", tempfile.mkdtemp(prefix="diagnostic-urbain-tests-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def fake_server():
+    """Serveur HTTP local scripté (voir fake_server.py), arrêté après le test"""
+    server = FakeHTTPServer()
+    yield server
+    server.close()
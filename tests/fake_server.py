@@ -0,0 +1,122 @@
+"""Serveur HTTP local scripté, utilisé à la place des API Groq, OpenAI et MediaWiki
+
+Chaque chemin reçoit une liste de réponses servies dans l'ordre (la dernière est
+répétée). Une réponse est un dictionnaire (statut, en-têtes, JSON ou texte, délai)
+ou une fonction des paramètres de la requête qui renvoie un tel dictionnaire.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Chemins des API compatibles OpenAI (l'URL de base de Groq se termine par /openai/v1)
+GROQ_PATH = "/openai/v1/chat/completions"
+OPENAI_PATH = "/v1/chat/completions"
+
+def chat_completion(content, status=200):
+    """Réponse d'une API de chat en mode bloquant"""
+    return {
+        "status": status,
+        "json": {
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "fake-model",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+        }
+    }
+
+def chat_stream(parts):
+    """Réponse d'une API de chat en streaming (Server-Sent Events), un événement par fragment"""
+    events = []
+    for part in parts:
+        chunk = {
+            "id": "chatcmpl-test",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "fake-model",
+            "choices": [{"index": 0, "delta": {"content": part}, "finish_reason": None}]
+        }
+        events.append(f"data: {json.dumps(chunk)}\n\n")
+    events.append("data: [DONE]\n\n")
+    return {"status": 200, "headers": {"Content-Type": "text/event-stream"}, "body": "".join(events)}
+
+def api_error(status, headers=None):
+    """Réponse d'erreur d'une API de chat"""
+    return {"status": status, "headers": headers or {}, "json": {"error": {"message": f"erreur {status}", "type": "test"}}}
+
+class FakeHTTPServer:
+    """Serveur HTTP local exécuté dans un thread ; enregistre les requêtes reçues"""
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []  # (chemin, paramètres, instant)
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server._handle(self)
+
+            def do_POST(self):
+                server._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        self.thread.start()
+
+    def add(self, path, *responses):
+        """Programme les réponses d'un chemin, servies dans l'ordre"""
+        with self._lock:
+            self.routes[path] = list(responses)
+
+    def calls(self, path):
+        """Instants des requêtes reçues sur un chemin"""
+        with self._lock:
+            return [at for request_path, _, at in self.requests if request_path == path]
+
+    def _handle(self, handler):
+        url = urlsplit(handler.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        length = int(handler.headers.get("Content-Length") or 0)
+        if length:
+            handler.rfile.read(length)
+
+        with self._lock:
+            self.requests.append((url.path, params, time.monotonic()))
+            responses = self.routes.get(url.path)
+            if not responses:
+                response = {"status": 404, "json": {"error": "route inconnue"}}
+            else:
+                response = responses.pop(0) if len(responses) > 1 else responses[0]
+        if callable(response):
+            response = response(params)
+
+        if response.get("delay"):
+            time.sleep(response["delay"])
+        body = response.get("body")
+        if body is None:
+            body = json.dumps(response.get("json", {}))
+        payload = body.encode("utf-8")
+        headers = {"Content-Type": "application/json", **response.get("headers", {})}
+        try:
+            handler.send_response(response.get("status", 200))
+            for name, value in headers.items():
+                handler.send_header(name, value)
+            handler.send_header("Content-Length", str(len(payload)))
+            handler.end_headers()
+            handler.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # Client parti (délai dépassé côté client)
+            pass
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
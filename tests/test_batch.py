@@ -0,0 +1,13 @@
+"""Tests du mode batch"""
+from batch import city_slug, city_slugs
+from diagnostic_urbain.prompts import DEFAULT_FORM
+
+def test_duplicate_cities_get_distinct_slugs():
+    forms = [
+        dict(DEFAULT_FORM, city_name="Dakar", country="Sénégal"),
+        dict(DEFAULT_FORM, city_name="Nouakchott", country="Mauritanie"),
+        dict(DEFAULT_FORM, city_name="Dakar", country="Senegal"),
+        dict(DEFAULT_FORM, city_name="DAKAR", country="Sénégal")
+    ]
+    assert city_slug(forms[0]) == city_slug(forms[2]) == "dakar_senegal"
+    assert city_slugs(forms) == ["dakar_senegal", "nouakchott_mauritanie", "dakar_senegal_2", "dakar_senegal_3"]
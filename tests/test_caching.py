@@ -0,0 +1,78 @@
+"""Tests des caches : éviction des caches en fichiers et cache SQLite des réponses LLM"""
+import os
+import time
+import uuid
+from types import SimpleNamespace
+
+from diagnostic_urbain.caching import LLMResponseCache, evict_file_cache, get_llm_cache, touch_cache_file
+from diagnostic_urbain.config import GROQ_MODEL
+from diagnostic_urbain.llm import generate_enhanced_content_with_docs_and_web
+
+def write_file(directory, name, size, age):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+    return path
+
+def test_expired_files_are_removed(tmp_path):
+    write_file(tmp_path, "old.json", 10, age=100)
+    write_file(tmp_path, "new.json", 10, age=1)
+    
+    assert evict_file_cache(tmp_path, ttl=50, max_bytes=1000) == 1
+    assert sorted(os.listdir(tmp_path)) == ["new.json"]
+
+def test_least_recently_used_files_are_removed_beyond_max_bytes(tmp_path):
+    write_file(tmp_path, "a.png", 40, age=30)
+    used = write_file(tmp_path, "b.png", 40, age=20)
+    write_file(tmp_path, "c.png", 40, age=10)
+    write_file(tmp_path, "d.png.123.tmp", 500, age=40)
+    touch_cache_file(used)
+    
+    assert evict_file_cache(tmp_path, ttl=3600, max_bytes=100) == 1
+    assert sorted(os.listdir(tmp_path)) == ["b.png", "c.png", "d.png.123.tmp"]
+
+def test_missing_directory_is_ignored(tmp_path):
+    assert evict_file_cache(tmp_path / "absent", ttl=1, max_bytes=1) == 0
+
+class StubRouter:
+    """Routeur factice qui tient lieu de fournisseur LLM et compte les appels"""
+    
+    def __init__(self):
+        self.calls = 0
+    
+    def complete(self, messages, max_tokens):
+        self.calls += 1
+        message = SimpleNamespace(content=f"Réponse {self.calls}")
+        return GROQ_MODEL, SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+def test_identical_prompts_are_served_from_the_llm_cache():
+    router = StubRouter()
+    clients = {"groq": object(), "router": router}
+    prompt = f"Prompt du test de cache {uuid.uuid4()}"
+    
+    first = generate_enhanced_content_with_docs_and_web(prompt, clients, max_tokens=100)
+    hits = get_llm_cache().stats()["hits"]
+    assert generate_enhanced_content_with_docs_and_web(prompt, clients, max_tokens=100) == first
+    assert router.calls == 1
+    assert get_llm_cache().stats()["hits"] == hits + 1
+    
+    # Autre plafond de réponse ou recherche web fraîche : nouvel appel
+    generate_enhanced_content_with_docs_and_web(prompt, clients, max_tokens=200)
+    generate_enhanced_content_with_docs_and_web(prompt, clients, max_tokens=100, include_Web_Search=True)
+    assert router.calls == 3
+
+def test_llm_cache_expires_and_evicts_least_recently_used(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "llm.sqlite"), ttl=3600, max_entries=2)
+    cache.set("a", "A")
+    cache.set("b", "B")
+    assert cache.get("a") == "A"
+    cache.set("c", "C")
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("A", "C")
+    
+    expired = LLMResponseCache(str(tmp_path / "expired.sqlite"), ttl=0)
+    expired.set("a", "A")
+    time.sleep(0.01)
+    assert expired.get("a") is None
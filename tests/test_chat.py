@@ -0,0 +1,74 @@
+"""Tests du chatbot : cache des réponses (quasi-doublons) et filtre thématique"""
+import pytest
+
+from chat_gate_benchmark import LABELLED_QUESTIONS, evaluate, legacy_classify_question
+from diagnostic_urbain.chat import CHAT_CACHE_SIMILARITY, ChatAnswerCache, classify_question, normalize_question
+
+WATER_QUESTION = "Quelles sont les meilleures stratégies pour améliorer l'accès à l'eau potable en milieu urbain africain ?"
+HOUSING_QUESTION = "Comment améliorer l'accès au logement décent ?"
+
+# Questions différentes malgré une similarité de n-grammes au-dessus du seuil
+DIFFERENT_QUESTIONS = [
+    ("Quelle était la population de Nouakchott en 2024 ?", "Quelle était la population de Nouakchott en 2014 ?"),
+    ("Quel était le taux d'accès à l'eau potable en 2010 ?", "Quel était le taux d'accès à l'eau potable en 2015 ?"),
+    ("Comment planifier une ville de 1000000 habitants ?", "Comment planifier une ville de 100000 habitants ?"),
+    ("Comment gérer la croissance urbaine ?", "Comment gérer la décroissance urbaine ?"),
+    (WATER_QUESTION, WATER_QUESTION.replace("urbain", "rural")),
+    (HOUSING_QUESTION, "Comment améliorer l'accès au logement indécent ?")
+]
+
+# Même question, aux mots vides, accents, ponctuation et fautes de frappe près
+SAME_QUESTIONS = [
+    (HOUSING_QUESTION, "Comment peut-on améliorer l'accès au logement décent ?"),
+    (HOUSING_QUESTION, "Comment améliorer l'accès au logemnt décent ?"),
+    (HOUSING_QUESTION, "Comment ameliorer l'acces au logement decent svp ?"),
+    (WATER_QUESTION, WATER_QUESTION.replace("meilleures", "meilleurs").replace("à l'eau", "a l'eau"))
+]
+
+def similarity(question, other):
+    vectorize = ChatAnswerCache.vectorize
+    return float(vectorize(normalize_question(question)) @ vectorize(normalize_question(other)))
+
+@pytest.mark.parametrize("cached, asked", DIFFERENT_QUESTIONS)
+def test_different_question_is_not_served_from_cache(cached, asked):
+    # La similarité seule les confondrait : c'est bien la comparaison des termes qui les distingue
+    assert similarity(cached, asked) >= CHAT_CACHE_SIMILARITY
+    cache = ChatAnswerCache()
+    cache.set(cached, "Réponse en cache")
+    
+    assert cache.get(asked) is None
+    assert cache.get(cached)[0] == "Réponse en cache"
+
+@pytest.mark.parametrize("cached, asked", SAME_QUESTIONS)
+def test_near_duplicate_is_served_from_cache(cached, asked):
+    cache = ChatAnswerCache()
+    cache.set(cached, "Réponse en cache")
+    
+    answer, cached_question, score = cache.get(asked)
+    assert (answer, cached_question) == ("Réponse en cache", cached)
+    assert CHAT_CACHE_SIMILARITY <= score < 1.0
+
+def test_closest_candidate_with_same_terms_is_chosen():
+    cache = ChatAnswerCache()
+    cache.set("Comment améliorer l'accès au logement indécent ?", "Mauvaise réponse")
+    cache.set(HOUSING_QUESTION, "Bonne réponse")
+    
+    assert cache.get("Comment améliorer l'accès au logemnt décent ?")[0] == "Bonne réponse"
+
+def test_exact_question_ignores_case_and_accents():
+    cache = ChatAnswerCache()
+    cache.set(HOUSING_QUESTION, "Réponse en cache")
+    
+    assert cache.get("COMMENT AMELIORER L'ACCES AU LOGEMENT DECENT") == ("Réponse en cache", HOUSING_QUESTION, 1.0)
+
+@pytest.mark.parametrize("question, urban, recent", LABELLED_QUESTIONS)
+def test_gate_classifies_labelled_questions(question, urban, recent):
+    assert classify_question(question) == (urban, recent)
+
+def test_gate_benchmark_reports_accuracy():
+    report = evaluate(classify_question, number=10)
+    legacy = evaluate(legacy_classify_question, number=10)
+    assert report["errors"] == []
+    assert report["timed_classification"] == {"court": [False, False], "long": [True, False]}
+    # Sur le même jeu de questions, le filtre actuel fait mieux que l'ancien
+    assert report["correct"] > legacy["correct"]
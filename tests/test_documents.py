@@ -0,0 +1,49 @@
+"""Tests de l'extraction des documents PDF et de son cache"""
+import io
+import uuid
+
+from diagnostic_urbain import documents, extraction
+from diagnostic_urbain.documents import extract_documents
+
+def pdf_with_scanned_pages(scanned_pages=2):
+    """PDF d'une page de texte (contenu unique) suivie de pages sans couche texte"""
+    from reportlab.pdfgen import canvas
+    
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer)
+    pdf.drawString(72, 720, f"Plan de mobilité urbaine {uuid.uuid4()}")
+    pdf.showPage()
+    for _ in range(scanned_pages):
+        pdf.rect(72, 72, 200, 200)
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+def test_failed_ocr_page_is_cached_and_retried_alone(monkeypatch):
+    calls = []
+    
+    def ocr_page(pdf_path, page_index):
+        calls.append(page_index)
+        if page_index == 2 and calls.count(2) == 1:
+            raise TimeoutError("OCR hors délai")
+        return f"Texte scanné {page_index}"
+    
+    monkeypatch.setattr(extraction, "ocr_page", ocr_page)
+    data = pdf_with_scanned_pages()
+    
+    first = extract_documents([("scan.pdf", data)])[0]
+    assert first['result']['ocr_failed_pages'] == [2]
+    assert "Texte scanné 1" in first['result']['text']
+    assert sorted(calls) == [1, 2]
+    
+    # Relance : seule la page en échec repasse par l'OCR, la couche texte n'est pas relue
+    monkeypatch.setattr(documents, "extract_pdf_text", None)
+    second = extract_documents([("scan.pdf", data)])[0]
+    assert calls[2:] == [2]
+    assert second['result']['ocr_failed_pages'] == []
+    assert second['result']['text'].endswith("Texte scanné 1\nTexte scanné 2")
+    assert second['result']['ocr_pages'] == 2
+    
+    # Résultat complet : servi depuis le cache
+    assert extract_documents([("scan.pdf", data)])[0]['cache_status'] == "mémoire"
+    assert calls[3:] == []
@@ -0,0 +1,223 @@
+"""Tests des appels LLM : génération des sections et routeur des fournisseurs"""
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from diagnostic_urbain.config import GROQ_MODEL, LLM_POOL_DEFAULTS, LLM_ROUTER_DEFAULTS, OPENAI_MODEL
+from diagnostic_urbain.llm import (
+    CircuitBreaker, FailedGeneration, TokenBucket, build_ai_clients, error_status,
+    generate_enhanced_content_with_docs_and_web, generate_sections_parallel, stream_chat_messages
+)
+from fake_server import GROQ_PATH, OPENAI_PATH, api_error, chat_completion, chat_stream
+
+def groq_chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))], x_groq=None)
+
+class BrokenStreamRouter:
+    """Routeur factice dont le flux s'interrompt après deux fragments"""
+    
+    def open_stream(self, messages, max_tokens):
+        def chunks():
+            yield groq_chunk("Début ")
+            yield groq_chunk("du texte")
+            raise ConnectionError("connexion perdue")
+        return "groq", "fake-model", chunks()
+
+def test_interrupted_stream_drops_partial_text():
+    clients = {"groq": object(), "router": BrokenStreamRouter()}
+    sections = generate_sections_parallel(
+        {"demo": ("Prompt de test interrompu", 100)}, clients, on_section_progress=lambda key, text: None
+    )
+    
+    assert isinstance(sections["demo"], FailedGeneration)
+    assert sections["demo"] == "Erreur de génération pour: Prompt de test interrompu..."
+
+# --- Routeur des fournisseurs, contre un serveur HTTP local (fake_server.py) ---
+
+MESSAGES = [{"role": "user", "content": "Bonjour"}]
+
+def build_test_clients(fake_server, monkeypatch, groq=True, openai_key=True, **settings):
+    """Clients Groq et OpenAI réels pointés vers le serveur local, avec des délais courts"""
+    import openai
+    
+    monkeypatch.setenv("GROQ_BASE_URL", fake_server.url)
+    # build_ai_clients modifie ces réglages globaux du SDK OpenAI : ils sont restaurés après le test
+    monkeypatch.setattr(openai, "api_base", f"{fake_server.url}/v1")
+    monkeypatch.setattr(openai, "api_key", None)
+    monkeypatch.setattr(openai, "requestssession", None)
+    settings = {
+        **LLM_POOL_DEFAULTS, **LLM_ROUTER_DEFAULTS,
+        "LLM_CONNECT_TIMEOUT": 1, "LLM_READ_TIMEOUT": 0.5,
+        "GROQ_REQUESTS_PER_MINUTE": 6000, "OPENAI_REQUESTS_PER_MINUTE": 6000,
+        "LLM_MAX_RETRIES": 3, "LLM_BACKOFF_BASE": 0.05, "LLM_BACKOFF_MAX": 0.2,
+        **settings
+    }
+    return build_ai_clients("sk-test" if openai_key else None, "gsk-test" if groq else None, settings)
+
+def complete(clients):
+    model, response = clients["router"].complete(MESSAGES, 50)
+    return model, response.choices[0].message.content
+
+def test_token_bucket_limits_bursts():
+    bucket = TokenBucket(60, burst=2)
+    assert bucket.acquire(timeout=0) and bucket.acquire(timeout=0)
+    # Un jeton par seconde : le troisième n'est pas disponible dans les 0,1 s
+    assert not bucket.acquire(timeout=0.1)
+
+def test_token_bucket_pause_delays_every_caller():
+    bucket = TokenBucket(6000)
+    bucket.pause(0.2)
+    start = time.monotonic()
+    assert bucket.acquire()
+    assert time.monotonic() - start >= 0.19
+
+def test_circuit_breaker_opens_then_allows_one_trial():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.1)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.11)
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.allow()
+
+def test_rate_limit_waits_for_retry_after(fake_server, monkeypatch):
+    fake_server.add(GROQ_PATH, api_error(429, {"Retry-After": "0.3"}), chat_completion("après la pause"))
+    clients = build_test_clients(fake_server, monkeypatch, openai_key=False)
+    
+    assert complete(clients) == (GROQ_MODEL, "après la pause")
+    first, second = fake_server.calls(GROQ_PATH)
+    assert second - first >= 0.29
+
+def test_server_errors_are_retried_with_backoff(fake_server, monkeypatch):
+    fake_server.add(GROQ_PATH, api_error(503), api_error(502), chat_completion("troisième essai"))
+    clients = build_test_clients(fake_server, monkeypatch, openai_key=False)
+    
+    assert complete(clients) == (GROQ_MODEL, "troisième essai")
+    first, second, third = fake_server.calls(GROQ_PATH)
+    # Backoff exponentiel : 0,05 s puis 0,1 s (à ±20 % près)
+    assert second - first >= 0.04
+    assert third - second >= 0.08
+
+def test_server_error_fails_over_to_openai(fake_server, monkeypatch):
+    fake_server.add(GROQ_PATH, api_error(503))
+    fake_server.add(OPENAI_PATH, chat_completion("réponse OpenAI"))
+    clients = build_test_clients(fake_server, monkeypatch)
+    
+    assert complete(clients) == (OPENAI_MODEL, "réponse OpenAI")
+    assert len(fake_server.calls(GROQ_PATH)) == 1
+
+def test_timeout_fails_over_to_openai(fake_server, monkeypatch):
+    fake_server.add(GROQ_PATH, {**chat_completion("trop tard"), "delay": 1.5})
+    fake_server.add(OPENAI_PATH, chat_completion("réponse OpenAI"))
+    clients = build_test_clients(fake_server, monkeypatch)
+    
+    assert complete(clients) == (OPENAI_MODEL, "réponse OpenAI")
+
+def test_auth_error_fails_over_without_retry(fake_server, monkeypatch):
+    fake_server.add(GROQ_PATH, api_error(401))
+    fake_server.add(OPENAI_PATH, chat_completion("réponse OpenAI"))
+    clients = build_test_clients(fake_server, monkeypatch, LLM_BACKOFF_BASE=5)
+    
+    start = time.monotonic()
+    assert complete(clients) == (OPENAI_MODEL, "réponse OpenAI")
+    assert time.monotonic() - start < 1
+    assert len(fake_server.calls(GROQ_PATH)) == 1
+
+def test_auth_error_without_alternative_fails_at_once(fake_server, monkeypatch):
+    fake_server.add(GROQ_PATH, api_error(403))
+    clients = build_test_clients(fake_server, monkeypatch, openai_key=False, LLM_BACKOFF_BASE=5)
+    
+    start = time.monotonic()
+    with pytest.raises(Exception) as error:
+        complete(clients)
+    assert error_status(error.value) == 403
+    assert time.monotonic() - start < 1
+    assert len(fake_server.calls(GROQ_PATH)) == 1
+
+def test_circuit_breaker_skips_failing_provider(fake_server, monkeypatch):
+    fake_server.add(GROQ_PATH, api_error(500))
+    fake_server.add(OPENAI_PATH, chat_completion("réponse OpenAI"))
+    clients = build_test_clients(fake_server, monkeypatch, LLM_CIRCUIT_FAILURE_THRESHOLD=2)
+    
+    for _ in range(4):
+        assert complete(clients) == (OPENAI_MODEL, "réponse OpenAI")
+    # Coupe-circuit ouvert après deux pannes : Groq n'est plus appelé
+    assert len(fake_server.calls(GROQ_PATH)) == 2
+
+def test_stream_fails_over_before_first_chunk(fake_server, monkeypatch):
+    fake_server.add(GROQ_PATH, api_error(429, {"Retry-After": "5"}))
+    fake_server.add(OPENAI_PATH, chat_stream(["Texte ", "diffusé"]))
+    clients = build_test_clients(fake_server, monkeypatch)
+    
+    chunks = list(stream_chat_messages(MESSAGES, clients, GROQ_MODEL, 50))
+    assert "".join(chunks) == "Texte diffusé"
+    assert len(fake_server.calls(GROQ_PATH)) == 1
+
+def test_open_circuit_breakers_fail_at_once(fake_server, monkeypatch):
+    fake_server.add(GROQ_PATH, api_error(500))
+    clients = build_test_clients(
+        fake_server, monkeypatch, openai_key=False, LLM_CIRCUIT_FAILURE_THRESHOLD=1,
+        LLM_BACKOFF_BASE=0.2, LLM_BACKOFF_MAX=2
+    )
+    with pytest.raises(Exception):
+        complete(clients)
+    
+    # Coupe-circuit ouvert : pas d'attente du calendrier de reprises
+    start = time.monotonic()
+    with pytest.raises(RuntimeError):
+        complete(clients)
+    assert time.monotonic() - start < 0.1
+    assert len(fake_server.calls(GROQ_PATH)) == 1
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_failover_answer_is_served_from_the_llm_cache(fake_server, monkeypatch, stream):
+    fake_server.add(GROQ_PATH, api_error(503))
+    fake_server.add(OPENAI_PATH, chat_stream(["réponse ", "OpenAI"]) if stream else chat_completion("réponse OpenAI"))
+    clients = build_test_clients(fake_server, monkeypatch, LLM_MAX_RETRIES=0)
+    prompt = f"Prompt du test de bascule {uuid.uuid4()}"
+    
+    def generate():
+        content = generate_enhanced_content_with_docs_and_web(prompt, clients, max_tokens=50, stream=stream)
+        return "".join(content) if stream else content
+    
+    assert generate() == "réponse OpenAI"
+    # La réponse obtenue après bascule est resservie sans nouvel appel
+    assert generate() == "réponse OpenAI"
+    assert len(fake_server.calls(OPENAI_PATH)) == 1
+
+def test_total_concurrency_cap_spans_providers(fake_server, monkeypatch):
+    in_flight = []
+    peak = []
+    lock = threading.Lock()
+    
+    def slow_completion(params):
+        with lock:
+            in_flight.append(1)
+            peak.append(len(in_flight))
+        time.sleep(0.2)
+        with lock:
+            in_flight.pop()
+        return chat_completion("réponse")
+    
+    fake_server.add(GROQ_PATH, slow_completion)
+    fake_server.add(OPENAI_PATH, slow_completion)
+    # Un seul jeton Groq : les autres appels basculent vers OpenAI sans attendre
+    clients = build_test_clients(
+        fake_server, monkeypatch, GROQ_REQUESTS_PER_MINUTE=2, LLM_MAX_QUEUE_WAIT=0.01,
+        LLM_MAX_CONCURRENT_CALLS=8, LLM_MAX_TOTAL_CALLS=2
+    )
+    threads = [threading.Thread(target=complete, args=(clients,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert len(fake_server.calls(GROQ_PATH)) == 1
+    assert len(fake_server.calls(OPENAI_PATH)) == 3
+    assert max(peak) == 2
@@ -0,0 +1,27 @@
+"""Tests de l'export PDF"""
+import io
+import threading
+
+from diagnostic_urbain.pdf import write_professional_pdf_report
+from diagnostic_urbain.prompts import SECTION_TITLES
+
+REPORT_DATA = {key: f"Texte de la section **{key}**.\n\n- premier point\n- second point" for key in SECTION_TITLES}
+
+def test_concurrent_memory_measures_are_not_mixed():
+    # Première construction : imports et caches de ReportLab, hors mesure
+    write_professional_pdf_report(io.BytesIO(), "Ville", REPORT_DATA, None)
+    alone = write_professional_pdf_report(io.BytesIO(), "Ville", REPORT_DATA, None, measure_memory=True)["peak_memory"]
+    
+    peaks = []
+    def build():
+        peaks.append(write_professional_pdf_report(io.BytesIO(), "Ville", REPORT_DATA, None, measure_memory=True)["peak_memory"])
+    
+    threads = [threading.Thread(target=build) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    # Sans sérialisation, un arrêt de tracemalloc par un thread ramène les mesures des autres à zéro
+    assert len(peaks) == 3
+    assert all(0.5 * alone < peak < 2 * alone for peak in peaks)
@@ -0,0 +1,49 @@
+"""Tests des prompts et de la régénération incrémentale"""
+from diagnostic_urbain.config import GROQ_MODEL, MESSAGE_OVERHEAD_TOKENS, OPENAI_MODEL, PROMPT_TOKEN_BUDGET
+from diagnostic_urbain.projections import current_density
+from diagnostic_urbain.prompts import (
+    DEFAULT_FORM, SECTION_DEPENDENCIES, SECTION_TITLES, SYSTEM_PROMPT, build_section_prompts,
+    plan_incremental_regeneration, prompt_token_budget
+)
+from diagnostic_urbain.tokens import count_tokens
+
+def previous_report(failed_sections=()):
+    return {
+        "form": dict(DEFAULT_FORM),
+        "documents_fp": "docs",
+        "web_fp": "web",
+        "sections": {key: "Texte" for key in SECTION_TITLES},
+        "failed_sections": list(failed_sections)
+    }
+
+def test_unchanged_report_is_reused():
+    assert plan_incremental_regeneration(previous_report(), dict(DEFAULT_FORM), "docs", "web") == ([], [])
+
+def test_failed_section_is_regenerated_whatever_its_text():
+    dirty, changed = plan_incremental_regeneration(previous_report(["housing_analysis"]), dict(DEFAULT_FORM), "docs", "web")
+    assert dirty == ["housing_analysis"]
+    assert changed == []
+
+def test_prompt_budget_includes_the_completion():
+    system_tokens = count_tokens(SYSTEM_PROMPT) + MESSAGE_OVERHEAD_TOKENS
+    for model in (GROQ_MODEL, OPENAI_MODEL):
+        assert prompt_token_budget(model, 800) + 800 + system_tokens == PROMPT_TOKEN_BUDGET
+
+def test_section_prompts_only_read_their_declared_fields():
+    # build_section_prompts ne transmet que SECTION_DEPENDENCIES : un champ manquant lèverait KeyError
+    prompts = build_section_prompts(dict(DEFAULT_FORM))
+    assert list(prompts) == list(SECTION_TITLES)
+
+def test_service_access_does_not_regenerate_demographic_section():
+    form = dict(DEFAULT_FORM, water_access=DEFAULT_FORM["water_access"] + 10)
+    dirty, changed = plan_incremental_regeneration(previous_report(), form, "docs", "web")
+    assert changed == ["water_access"]
+    assert "demographic_analysis" not in dirty
+    assert "housing_analysis" in dirty and "infrastructure_analysis" in dirty
+
+def test_demographic_prompt_uses_computed_density():
+    form = dict(DEFAULT_FORM, population=900000, urban_area=300)
+    prompt, _ = build_section_prompts(form, ["demographic_analysis"])["demographic_analysis"]
+    assert current_density(form) == 3000
+    assert "Densité actuelle: 3\u202f000 hab/km²" in prompt
+    assert "density" not in SECTION_DEPENDENCIES["demographic_analysis"]
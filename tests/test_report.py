@@ -0,0 +1,63 @@
+"""Tests de la file des rapports en arrière-plan"""
+import sqlite3
+import threading
+import time
+from types import SimpleNamespace
+
+from diagnostic_urbain import report
+from diagnostic_urbain.prompts import DEFAULT_FORM, SECTION_TITLES
+from diagnostic_urbain.report import ReportJobQueue, current_job_owner
+
+def fake_pipeline(runs):
+    """Pipeline factice : note chaque exécution et termine toutes les sections demandées"""
+    lock = threading.Lock()
+    
+    def run_report_pipeline(form, clients, documents_content=None, web_data=None, keys=None, on_section_done=None, **kwargs):
+        with lock:
+            runs.append(keys)
+        time.sleep(0.1)
+        for key in keys:
+            on_section_done(key, f"Texte {key}")
+    return run_report_pipeline
+
+def pending_job(path):
+    """Enregistre un rapport en attente sans l'exécuter ; renvoie son identifiant"""
+    queue = ReportJobQueue(path, clients={})
+    queue.executor.shutdown()
+    queue.executor = SimpleNamespace(submit=lambda *args: None)
+    return queue.submit(dict(DEFAULT_FORM), [], None, list(SECTION_TITLES), {}, "docs", "web")
+
+def wait(queue):
+    queue.executor.shutdown(wait=True)
+
+def test_pending_job_runs_once_across_processes(tmp_path, monkeypatch):
+    runs = []
+    monkeypatch.setattr(report, "run_report_pipeline", fake_pipeline(runs))
+    path = str(tmp_path / "jobs.sqlite")
+    job_id = pending_job(path)
+    
+    # Deux processus démarrent sur la même base : un seul réclame le rapport
+    first, second = ReportJobQueue(path, clients={}), ReportJobQueue(path, clients={})
+    wait(first)
+    wait(second)
+    
+    assert len(runs) == 1
+    assert first.get(job_id)["status"] == "terminé"
+
+def test_only_jobs_of_dead_processes_are_resumed(tmp_path, monkeypatch):
+    runs = []
+    monkeypatch.setattr(report, "run_report_pipeline", fake_pipeline(runs))
+    path = str(tmp_path / "jobs.sqlite")
+    orphan, running = pending_job(path), pending_job(path)
+    
+    host = current_job_owner().rpartition(":")[0]
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE report_jobs SET status = 'en cours', owner = ? WHERE id = ?", (f"{host}:999999999", orphan))
+        conn.execute("UPDATE report_jobs SET status = 'en cours', owner = ? WHERE id = ?", (current_job_owner(), running))
+    
+    queue = ReportJobQueue(path, clients={})
+    wait(queue)
+    
+    assert len(runs) == 1
+    assert queue.get(orphan)["status"] == "terminé"
+    assert queue.get(running)["status"] == "en cours"
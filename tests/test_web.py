@@ -0,0 +1,60 @@
+"""Tests du cache des données Wikipedia, avec une API MediaWiki factice (fake_server.py)"""
+import time
+import uuid
+
+import pytest
+
+from diagnostic_urbain import web
+from diagnostic_urbain.config import WEB_DATA_NEGATIVE_TTL
+
+API_PATHS = ("/fr/w/api.php", "/en/w/api.php")
+
+def mediawiki_page(title, extract):
+    return {"json": {"query": {"pages": [{"title": title, "extract": extract, "fullurl": f"https://fr.wikipedia.org/wiki/{title}"}]}}}
+
+@pytest.fixture
+def wikipedia(fake_server, monkeypatch):
+    """API MediaWiki locale ; renvoie le serveur et une ville au nom unique (cache partagé)"""
+    monkeypatch.setattr(web, "WIKIPEDIA_API_URL", f"{fake_server.url}/{{lang}}/w/api.php")
+    return fake_server, f"Ville{uuid.uuid4().hex[:8]}"
+
+def api_calls(server):
+    return sum(len(server.calls(path)) for path in API_PATHS)
+
+def test_found_page_is_cached_per_city(wikipedia):
+    server, city = wikipedia
+    for path in API_PATHS:
+        server.add(path, lambda params: mediawiki_page(params["gsrsearch"], "Capitale régionale."))
+    
+    first = web.get_web_urban_data(city, "Sénégal")
+    assert first["wikipedia_info"]["found"]
+    assert first["wikipedia_info"]["title"] == city
+    calls = api_calls(server)
+    
+    # Même ville, casse et espaces différents : servie par le cache
+    assert web.get_web_urban_data(f" {city.upper()} ", "sénégal") == first
+    assert api_calls(server) == calls
+
+def test_not_found_is_cached_with_a_shorter_ttl(wikipedia):
+    server, city = wikipedia
+    for path in API_PATHS:
+        server.add(path, {"json": {"batchcomplete": True}})
+    
+    assert not web.get_web_urban_data(city, "Mali")["wikipedia_info"]["found"]
+    calls = api_calls(server)
+    assert calls == 6  # trois variantes du nom, deux langues
+    web.get_web_urban_data(city, "Mali")
+    assert api_calls(server) == calls
+    
+    _, expires_at = web.get_web_data_cache()._data[(city.lower(), "mali", "fr")]
+    assert expires_at - time.monotonic() <= WEB_DATA_NEGATIVE_TTL
+
+def test_errors_are_not_cached(wikipedia):
+    server, city = wikipedia
+    for path in API_PATHS:
+        server.add(path, {"status": 503, "json": {}})
+    
+    assert web.get_web_urban_data(city, "Niger")["wikipedia_info"]["error"]
+    calls = api_calls(server)
+    web.get_web_urban_data(city, "Niger")
+    assert api_calls(server) == 2 * calls